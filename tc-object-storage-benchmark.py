@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import argparse
+import ConfigParser
+
+from tc_object_storage.benchmark import run_local, SCENARIOS, \
+    DEFAULT_OBJECTS, DEFAULT_OBJECT_SIZE, DEFAULT_LARGE_SIZE, \
+    DEFAULT_SEGMENT_SIZE, DEFAULT_PAGE_SIZE, DEFAULT_ROUNDS, DEFAULT_WORKERS
+from tc_object_storage.common import conf_get, parse_size
+from tc_object_storage.concurrency import ConcurrencyController
+from tc_object_storage.download import DEFAULT_DOWNLOAD_WORKERS
+from tc_object_storage.segments import MANIFEST_TYPES, \
+    DEFAULT_SEGMENT_WORKERS
+
+config_filename = "../setup.ini"
+
+
+def read_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the object storage client against a local "
+                    "in-memory Swift stand-in. The [connection], [upload] "
+                    "and [download] sections of setup.ini are honoured.")
+
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+        help="Scenarios to run, in order (default: %s)" % ' '.join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.0,
+        help="Milliseconds every request is held by the server")
+    parser.add_argument('--max-in-flight', dest='max_in_flight', type=int,
+        help="Requests the server serves at once before answering 429")
+    parser.add_argument('--adaptive', action='store_true',
+        help="Let the adaptive controller of [concurrency] set the "
+             "requests in flight, up to --workers")
+    parser.add_argument('--objects', type=int, default=DEFAULT_OBJECTS,
+        help="Number of small objects")
+    parser.add_argument('--object-size', dest='object_size', type=parse_size,
+        default=DEFAULT_OBJECT_SIZE, help="Size of the small objects")
+    parser.add_argument('--large-size', dest='large_size', type=parse_size,
+        default=DEFAULT_LARGE_SIZE, help="Size of the large object")
+    parser.add_argument('--segment-size', dest='segment_size',
+        type=parse_size, help="Segment and range size of the large object")
+    parser.add_argument('--segment-workers', dest='segment_workers',
+        type=int, help="Number of segments uploaded concurrently")
+    parser.add_argument('--download-workers', dest='download_workers',
+        type=int, help="Number of ranges downloaded concurrently")
+    parser.add_argument('--manifest', choices=MANIFEST_TYPES,
+        help="Large object manifest type")
+    parser.add_argument('--page-size', dest='page_size', type=int,
+        default=DEFAULT_PAGE_SIZE, help="Names per listing request")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+        help="Number of large uploads and downloads")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+        help="Small object requests kept in flight")
+    parser.add_argument('--json', action='store_true',
+        help="Print the results as JSON")
+
+    return parser.parse_args()
+
+
+def main():
+    args = read_args()
+
+    conf = ConfigParser.ConfigParser()
+    conf.read(config_filename)
+
+    segment_size = args.segment_size
+    if segment_size is None:
+        segment_size = conf_get(conf, 'upload', 'segment_size',
+            DEFAULT_SEGMENT_SIZE, parse_size)
+    segment_workers = args.segment_workers
+    if segment_workers is None:
+        segment_workers = conf_get(conf, 'upload', 'segment_workers',
+            DEFAULT_SEGMENT_WORKERS, int)
+    download_workers = args.download_workers
+    if download_workers is None:
+        download_workers = conf_get(conf, 'download', 'workers',
+            DEFAULT_DOWNLOAD_WORKERS, int)
+    manifest = args.manifest
+    if manifest is None:
+        manifest = conf_get(conf, 'upload', 'manifest', 'dlo')
+
+    controller = ConcurrencyController.from_config(conf,
+                                                   enabled=args.adaptive)
+
+    def progress(stats):
+        if not args.json:
+            print stats
+            sys.stdout.flush()
+
+    results, server = run_local(args.scenarios or SCENARIOS,
+        latency=args.latency / 1000.0,
+        conf=conf,
+        progress=progress,
+        max_in_flight=args.max_in_flight,
+        controller=controller,
+        objects=args.objects,
+        object_size=args.object_size,
+        large_size=args.large_size,
+        segment_size=segment_size,
+        segment_workers=segment_workers,
+        download_workers=download_workers,
+        manifest=manifest,
+        page_size=args.page_size,
+        rounds=args.rounds,
+        workers=args.workers)
+
+    if args.json:
+        data = {'results': [stats.as_dict() for stats in results],
+                'requests': server.requests}
+        if controller is not None:
+            data['concurrency'] = controller.as_dict()
+        print json.dumps(data, indent=2)
+    else:
+        print "requests:", ', '.join('%s %d' % item
+            for item in sorted(server.requests.items()))
+        if controller is not None:
+            print controller.report()
+
+    return 1 if any(stats.errors for stats in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,30 @@
 #!/usr/bin/python
 # -*- coding: utf8 -*-
 
+import argparse
+import collections
 import itertools
+import Queue
 import re
 import os
 import sys
+import threading
+import time
+
+""" Reference point of --startup-time, taken before the heavy imports """
+_started = time.time()
 
 import urwid
 
 import json
-import requests
 import ConfigParser
 
+""" tc_object_storage (and with it requests) is imported on first use of """
+""" the client, which happens on a listing thread after the first frame """
+
+""" Names per listing request, the browser fetches a page per scroll """
+PAGE_SIZE = 1000
+
 class TCObjectStorageClient:
     def __init__(self, config_filename='../setup.ini'):
         self.conf = ConfigParser.ConfigParser()
@@ -28,9 +41,60 @@ class TCObjectStorageClient:
         self.headers = dict()   
         self.headers['Content-Type'] = 'application/json; charset=utf-8'
         
-        token, self.tenant_id = self._get_token()
-        self.headers['X-Auth-Token'] = token
-        print token
+        from tc_object_storage.auth import TokenAuth, TokenCache
+        from tc_object_storage.bandwidth import BandwidthLimiter
+        from tc_object_storage.common import conf_get, parse_size
+        from tc_object_storage.concurrency import ConcurrencyController
+        from tc_object_storage.journal import DEFAULT_JOURNAL_DIR
+        from tc_object_storage.listing_cache import ListingCache
+        from tc_object_storage.metrics import Instrumentation
+        from tc_object_storage.segments import DEFAULT_SEGMENT_SIZE, \
+            DEFAULT_SEGMENT_WORKERS
+        from tc_object_storage.session import PooledSession
+        from tc_object_storage.transfers import DEFAULT_TRANSFER_WORKERS
+
+        self.session = PooledSession.from_config(self.conf)
+        controller = ConcurrencyController.from_config(self.conf)
+        if controller is not None:
+            self.session.set_controller(controller)
+        self.session.bandwidth = BandwidthLimiter.from_config(self.conf)
+        self.instrumentation = Instrumentation.from_config(self.conf)
+        self.instrumentation.attach(self.session)
+
+        self.token_cache = TokenCache.from_config(self.conf)
+        self.session.auth = TokenAuth(self)
+        self.login_lock = threading.Lock()
+
+        self.listing_cache = ListingCache.from_config(
+            self.conf, '\n'.join([self.swift_endpoint, self.username,
+                                  self.project_id]))
+
+        self.segment_size = conf_get(self.conf, 'upload', 'segment_size',
+            DEFAULT_SEGMENT_SIZE, parse_size)
+        self.segment_workers = conf_get(self.conf, 'upload',
+            'segment_workers', DEFAULT_SEGMENT_WORKERS, int)
+        self.manifest = conf_get(self.conf, 'upload', 'manifest', 'dlo')
+        self.segment_container = conf_get(self.conf, 'upload',
+            'segment_container')
+        self.send_etag = conf_get(self.conf, 'upload', 'send_etag', False,
+                                  bool)
+        self.transfer_workers = conf_get(self.conf, 'transfer', 'workers',
+            DEFAULT_TRANSFER_WORKERS, int)
+        """ Interrupted large uploads are resumed like the CLI's """
+        self.journal_dir = None
+        if conf_get(self.conf, 'journal', 'enabled', True, bool):
+            self.journal_dir = conf_get(self.conf, 'journal', 'dir',
+                DEFAULT_JOURNAL_DIR)
+        self.folder_sizes = conf_get(self.conf, 'browser', 'folder_sizes',
+            False, bool)
+
+    def ensure_login(self):
+        """ Keystone is only asked once the remote side is first used """
+        from tc_object_storage.auth import login
+
+        with self.login_lock:
+            if 'X-Auth-Token' not in self.headers:
+                login(self)
 
     def _get_token(self):
         request = dict()
@@ -43,53 +107,88 @@ class TCObjectStorageClient:
         request['auth'] = auth
 
         url = self.keystone_endpoint + '/identity/v2.0/tokens'
-        response = requests.post(url, data=json.dumps(request), headers=self.headers)
+        response = self.session.post(url, data=json.dumps(request), headers=self.headers)
+        response.raise_for_status()
 
         response_body = response.json()
         token = response_body['access']['token']['id'].encode('utf-8')
         tenant_id = response_body['access']['token']['tenant']['id'].encode('utf-8')
-
-        return token, tenant_id
+        expires = response_body['access']['token']['expires']
+
+        return token, tenant_id, expires
+
+    def iter_containers(self, full=False):
+        from tc_object_storage.listing import iter_listing
+
+        self.ensure_login()
+        return iter_listing(self, full=full)
+
+    def iter_objects(self, container, prefix=None, delimiter=None,
+                     full=False):
+        from tc_object_storage.listing import iter_listing
+
+        self.ensure_login()
+        return iter_listing(self, container, prefix=prefix,
+                            delimiter=delimiter, full=full)
+
+    def _listing_pages(self, container=None, prefix=None, delimiter=None,
+                       full=False):
+        from tc_object_storage.listing import iter_listing_pages
+
+        self.ensure_login()
+        return iter_listing_pages(self, container, prefix=prefix,
+                                  delimiter=delimiter, page_size=PAGE_SIZE,
+                                  full=full)
+
+    def iter_container_pages(self, cached=True):
+        return self.listing_cache.pages(None, None, None, self._listing_pages,
+                                        refresh=not cached)
+
+    def iter_object_pages(self, container, prefix=None, delimiter=None,
+                          cached=True):
+        return self.listing_cache.pages(
+            container, prefix, delimiter,
+            lambda: self._listing_pages(container, prefix, delimiter),
+            refresh=not cached)
+
+    def subfolder_usage(self, container, prefix=None):
+        """ The full listing of the nearest folder up is reused if cached """
+        from tc_object_storage.usage import subfolder_usage
+
+        prefix = prefix or ''
+        parents = [prefix[:end + 1] for end in range(len(prefix))
+                   if prefix[end] == '/']
+        for parent in reversed([''] + parents):
+            entries = self.listing_cache.get(container, parent or None,
+                                             full=True)
+            if entries is not None:
+                return subfolder_usage(self, container, prefix, entries=(
+                    entry for entry in entries
+                    if entry['name'].startswith(prefix)))
+
+        pages = self.listing_cache.pages(container, prefix or None, None,
+            lambda: self._listing_pages(container, prefix or None,
+                                        full=True),
+            full=True)
+        return subfolder_usage(self, container, prefix, entries=(
+            entry for page in pages for entry in page))
 
     def get_containers(self):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-
-        response = requests.get(url, headers=self.headers)
-        
-        """ If the request is failed, it raise HTTPError exceptions"""
-        """ If the status code is 200, then it does nothing"""
-        response.raise_for_status()
-
-        """ Convert plain text to container list """
-        containers = response.text.encode('utf-8').split('\n')
-        containers.remove('')
-
-        return containers
+        """ Pages are followed, so listings beyond 10,000 are complete """
+        return list(self.iter_containers())
 
     def get_objects(self, container):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + '/' + container
-
-        response = requests.get(url, headers=self.headers)
-
-        """ If the request is failed, it raise HTTPError exceptions"""
-        """ If the status code is 200, then it does nothing"""
-        response.raise_for_status()
-
-        """ Convert plain text to object list """
-        objects = response.text.encode('utf-8').split('\n')
-        objects.remove('')
-
-        return objects
+        return list(self.iter_objects(container))
 
     def get_object_metadata(self, container, object_name):
+        self.ensure_login()
         url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
         url = url + container  + '/' + object_name
 
         params = dict()
         params['format'] = 'json'
 
-        response = requests.head(url, headers=self.headers, params=params)
+        response = self.session.head(url, headers=self.headers, params=params)
         
         """ If the request is failed, it raise HTTPError exceptions """
         """ If the status code is 200, then it does nothing """
@@ -101,44 +200,44 @@ class TCObjectStorageClient:
         return is_folder, response.headers
 
     def get_objects_in_pseudo_folder(self, container, prefix):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + '/' + container
-
-        params = dict()
-        params['prefix'] = prefix
-        params['delimiter'] = '/'
-
-        response = requests.get(url, headers=self.headers, params=params)
-
-        """ If the request is failed, it raise HTTPError exceptions"""
-        """ If the status code is 200, then it does nothing"""
-        response.raise_for_status()
-
-        """ Convert plain text to object list """
-        objects = response.text.encode('utf-8').split('\n')
-        objects.remove('')
-        for each in objects:
-            if each == prefix:
-                objects.remove(each)
-
-        return objects
+        return [each for each in self.iter_objects(container, prefix, '/')
+                if each != prefix]
 
     def upload_object(self, path, filename):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + path + filename
-
-        fp = open(filename, 'r')
-        headers = self.headers
-        headers['Content-Type'] = 'multipart/formed-data'
+        """ The raw file is streamed, path is '/container/prefix/' """
+        from tc_object_storage.common import split_path
+
+        container, prefix = split_path(path)
+        return self.upload_file(container, prefix + filename, filename)
+
+    def upload_file(self, container, object_name, filename, progress=None):
+        """ Files above segment_size are stored as large objects """
+        from tc_object_storage.segments import SegmentedUploader
+        from tc_object_storage.sync import MTIME_HEADER
+        from tc_object_storage.upload import upload_file
+
+        self.ensure_login()
+        headers = {MTIME_HEADER: '%f' % os.path.getmtime(filename)}
+        if os.path.getsize(filename) > self.segment_size:
+            uploader = SegmentedUploader(self, self.segment_size,
+                                         self.segment_workers, self.manifest,
+                                         self.segment_container,
+                                         self.journal_dir)
+            result = uploader.upload(container, object_name, filename,
+                                     headers, progress)
+        else:
+            result = upload_file(self, container, object_name, filename,
+                                 headers, send_etag=self.send_etag,
+                                 progress=progress)
 
-        response = requests.put(url, headers=headers, files={'file':fp})
-        print response.status_code
-        print response.headers
+        self.listing_cache.invalidate(container, object_name)
+        return result
 
     def get_container_metadata(self, container):
+        self.ensure_login()
         url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
         url = url + container
-        response = requests.head(url, headers=self.headers)
+        response = self.session.head(url, headers=self.headers)
 
         """ If the request is failed, it raise HTTPError exceptions"""
         """ If the status code is 200, then it does nothing"""
@@ -147,24 +246,49 @@ class TCObjectStorageClient:
         return response.headers
 
     def create_container(self, container):
+        self.ensure_login()
         url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
         url = url + container
-        response = requests.put(url, headers=self.headers)
+        response = self.session.put(url, headers=self.headers)
+        self.listing_cache.invalidate(None)
 
         """ If the request is failed, it raise HTTPError exceptions"""
         """ If the status code is 200, then it does nothing"""
         response.raise_for_status()
 
     def delete_container(self, container):
+        self.ensure_login()
         url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
         url = url + container
-        response = requests.delete(url, headers=self.headers)
+        response = self.session.delete(url, headers=self.headers)
+        self.listing_cache.invalidate(None)
+        self.listing_cache.invalidate(container.strip('/'))
 
         """ If the request is failed, it raise HTTPError exceptions"""
         """ If the status code is 200, then it does nothing"""
         response.raise_for_status()
 
-objectstorageclient = TCObjectStorageClient()
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared client, creating it on first use"""
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TCObjectStorageClient()
+        return _client
+
+def remote_pages(method, *args, **kwargs):
+    """Listing pages of get_client().method(*args, **kwargs).
+
+    Nothing happens before the first page is asked for, so creating the
+    client, logging in and listing all run on the loader's thread.
+    """
+
+    for page in getattr(get_client(), method)(*args, **kwargs):
+        yield page
 
 class FlagFileWidget(urwid.TreeWidget):
     # apply an attribute to the expand/unexpand icons
@@ -177,7 +301,7 @@ class FlagFileWidget(urwid.TreeWidget):
         self.__super.__init__(node)
         # insert an extra AttrWrap for our own use
         self._w = urwid.AttrWrap(self._w, None)
-        self.flagged = False
+        self.flagged = is_flagged(node.get_value())
         self.update_w()
 
     def selectable(self):
@@ -197,6 +321,7 @@ class FlagFileWidget(urwid.TreeWidget):
         """
         if key == " ":
             self.flagged = not self.flagged
+            set_flagged(self.get_node().get_value(), self.flagged)
             self.update_w()
         else:
             return key
@@ -230,6 +355,12 @@ class EmptyWidget(urwid.TreeWidget):
         return ('flag', '(empty directory)')
 
 
+class LoadingWidget(urwid.TreeWidget):
+    """A marker for directories whose listing is still being fetched."""
+    def get_display_text(self):
+        return ('flag', '(loading...)')
+
+
 class ErrorWidget(urwid.TreeWidget):
     """A marker for errors reading directories."""
 
@@ -247,11 +378,20 @@ class DirectoryWidget(FlagFileWidget):
         self.update_expanded_icon()
 
     def get_display_text(self):
+        from tc_object_storage.common import format_size
+
         node = self.get_node()
         if node.get_depth() == 0:
             return "/"
-        else:
+
+        usage = getattr(node, 'usage', None)
+        if usage is None:
             return node.get_key()
+        return [node.get_key(), ('flag', "  %s, %d objects" % (
+            format_size(usage.bytes), usage.objects))]
+
+    def update_text(self):
+        self.get_inner_widget().set_text(self.get_display_text())
 
 
 class FileNode(urwid.TreeNode):
@@ -282,6 +422,11 @@ class ErrorNode(urwid.TreeNode):
         return ErrorWidget(self)
 
 
+class LoadingNode(urwid.TreeNode):
+    def load_widget(self):
+        return LoadingWidget(self)
+
+
 class DirectoryNode(urwid.ParentNode):
     """Metadata storage for directories"""
 
@@ -349,8 +494,9 @@ class DirectoryNode(urwid.ParentNode):
         return DirectoryWidget(self)
 
 class ObjectNode(urwid.TreeNode):
-    def __init__(self, path, parent, depth):
-        key = path.split('/')[-1]
+    def __init__(self, path, parent, depth, key=None):
+        if key is None:
+            key = path.split('/')[-1]
         urwid.TreeNode.__init__(self, path, key=key, parent=parent, depth=depth)
 
     def load_parent(self):
@@ -359,35 +505,262 @@ class ObjectNode(urwid.TreeNode):
     def load_widget(self):
         return FileTreeWidget(self)
 
-class FolderNode(urwid.ParentNode):
-    def __init__(self, value, key, depth, parent):
+LOADING_KEY = object()
+MAX_OBJECT_NODES = 500
+
+class ListingLoader:
+    """Fetch remote listing pages on background threads.
+
+    Every page is queued and the urwid main loop is woken up through a
+    watch_pipe, so nodes are only ever changed from the loop's own
+    thread.  Until attach() is called, listings are read synchronously.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.pipe = None
+        self.on_change = None
+        self.messages = Queue.Queue()
+
+    def attach(self, loop, on_change=None):
+        self.loop = loop
+        self.on_change = on_change
+        self.pipe = loop.watch_pipe(self.deliver)
+
+    def start(self, node, generation, pages):
+        thread = threading.Thread(target=self.fetch,
+                                  args=(node, generation, pages))
+        thread.daemon = True
+        thread.start()
+
+    def fetch(self, node, generation, pages):
+        """ Read one page, None marks the end of the listing """
+        try:
+            page = next(pages, None)
+        except Exception, e:
+            self.post(node, generation, lambda: node.finish_loading(e))
+        else:
+            if page is None:
+                self.post(node, generation, node.finish_loading)
+            else:
+                self.post(node, generation, lambda: node.add_page(page))
+
+    def compute(self, node, generation, function, apply):
+        """Run function() in the background, then apply(result) in the loop"""
+        def run():
+            try:
+                result = function()
+            except Exception:
+                return
+            self.post(node, generation, lambda: apply(result))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def post(self, *message):
+        self.messages.put(message)
+        try:
+            os.write(self.pipe, '.')
+        except OSError:
+            pass
+
+    def deliver(self, data):
+        changed = set()
+        while True:
+            try:
+                node, generation, apply = self.messages.get_nowait()
+            except Queue.Empty:
+                break
+
+            """ Drop pages of a listing that was restarted meanwhile """
+            if generation != node.generation:
+                continue
+            apply()
+            changed.add(node)
+
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+        return True
+
+listing_loader = ListingLoader()
+
+class RemoteTreeWalker(urwid.TreeWalker):
+    """Asks for the next listing page once its placeholder is reached"""
+
+    def more(self, node):
+        if node is not None and node.get_key() is LOADING_KEY:
+            node.get_parent().more()
+
+    def get_next(self, start_from):
+        widget, node = urwid.TreeWalker.get_next(self, start_from)
+        self.more(node)
+        return widget, node
+
+    def set_focus(self, focus):
+        urwid.TreeWalker.set_focus(self, focus)
+        self.more(focus)
+
+class RemoteNode(urwid.ParentNode):
+    """A tree level whose children come from a Swift listing.
+
+    Subclasses give iter_pages(), returning the listing pages, and
+    convert_keys(), turning a page of names into child keys.  Pages are
+    fetched in the background one at a time: the first on expansion,
+    the next once the (loading...) placeholder after the keys received
+    so far is scrolled into view.  Only the most recently used object
+    nodes (and so widgets) are kept, so a level with a huge number of
+    objects costs little more than its list of names.
+    """
+
+    def __init__(self, value, key, parent, depth):
         urwid.ParentNode.__init__(self, value=value, key=key, parent=parent, depth=depth)
+        self.generation = 0
+        self.loading = False
+        self.pages = None
+        self.loaded_keys = []
+        self.positions = {}
+        self.seen = set()
+        self.cached = True
+        self.recent = collections.OrderedDict()
+        self.sizes = {}
 
     def load_parent(self):
         return self.get_parent()
 
     def load_child_keys(self):
+        self.generation += 1
+        self.loaded_keys = []
+        self.positions = {}
+        self.seen = set()
+        self.recent.clear()
+
+        if listing_loader.loop is None:
+            for page in self.iter_pages():
+                self.extend_keys(self.convert_keys(page))
+            return self.finished_keys()
+
+        self.pages = self.iter_pages()
+        self.add_marker(LoadingNode, LOADING_KEY)
+        self.more()
+        return [LOADING_KEY]
+
+    def more(self):
+        """Fetch the next page unless one is on its way already"""
+        if self.loading or self.pages is None:
+            return
+        self.loading = True
+        listing_loader.start(self, self.generation, self.pages)
+
+    def refresh(self):
+        """List the children again, bypassing the listing cache"""
+        self._children = {}
+        self.loading = False
+        self.cached = False
+        try:
+            self.get_child_keys(reload=True)
+        finally:
+            self.cached = True
+
+    def add_marker(self, node_class, key):
+        depth = self.get_depth() + 1
+        self._children[key] = node_class(self, parent=self, key=key, depth=depth)
+
+    def extend_keys(self, keys):
+        for key in keys:
+            self.positions[key] = len(self.loaded_keys)
+            self.loaded_keys.append(key)
+
+    def finished_keys(self, error=None):
+        if error is not None:
+            self.add_marker(ErrorNode, None)
+            return [None]
+
+        if len(self.loaded_keys) == 0:
+            self.add_marker(EmptyNode, None)
+            return [None]
+
+        return list(self.loaded_keys)
+
+    def add_page(self, page):
+        """ The page goes in before the loading marker, the list is kept """
+        self.loading = False
+        keys = self.convert_keys(page)
+        self.extend_keys(keys)
+        self._child_keys[-1:] = keys + [LOADING_KEY]
+
+    def finish_loading(self, error=None):
+        self.loading = False
+        self.pages = None
+        self._children.pop(LOADING_KEY, None)
+        self._child_keys = self.finished_keys(error)
+        if error is None and get_client().folder_sizes:
+            self.load_sizes()
+
+    def load_sizes(self):
+        """Total the subfolders in the background, see set_sizes()"""
+
+    def set_sizes(self, sizes):
+        """Show the totals of the subfolders next to their names"""
+        self.sizes = sizes
+        for key, usage in sizes.items():
+            child = self._children.get(key)
+            if isinstance(child, FolderNode):
+                child.usage = usage
+                if child._widget is not None:
+                    child._widget.update_text()
+
+    def get_child_index(self, key):
+        """ A dict lookup instead of list.index() on every sibling step """
+        if key is None:
+            return 0
+        if key is LOADING_KEY:
+            return len(self.loaded_keys)
+        return self.positions[key]
+
+    def get_child_node(self, key, reload=False):
+        node = urwid.ParentNode.get_child_node(self, key, reload)
+
+        """ Forget the least recently shown objects, folders are kept """
+        if isinstance(node, ObjectNode):
+            self.recent.pop(key, None)
+            self.recent[key] = True
+            while len(self.recent) > MAX_OBJECT_NODES:
+                evicted, _ = self.recent.popitem(last=False)
+                self._children.pop(evicted, None)
+        return node
+
+    def load_widget(self):
+        return DirectoryWidget(self)
+
+class FolderNode(RemoteNode):
+    def __init__(self, value, key, depth, parent):
+        RemoteNode.__init__(self, value=value, key=key, parent=parent, depth=depth)
+
+    def iter_pages(self):
         container = self.get_value().split('/', 1)[0]
         prefix = self.get_value().split('/', 1)[1]
-        keys = objectstorageclient.get_objects_in_pseudo_folder(container, prefix)
+        return remote_pages('iter_object_pages', container, prefix, '/',
+                            cached=self.cached)
 
-        if len(keys) == 0:
-            depth = self.get_depth() + 1
-            self._children[None] = EmptyNode(self, parent=self, key=None, depth=depth)
-            keys = [None]
-            return keys
+    def load_sizes(self):
+        container, prefix = self.get_value().split('/', 1)
+        listing_loader.compute(self, self.generation,
+            lambda: get_client().subfolder_usage(container, prefix),
+            self.set_sizes)
+
+    def convert_keys(self, keys):
+        prefix = self.get_value().split('/', 1)[1]
 
         converted_keys = []
         for key in keys:
-            postfix = key.split('/', self.get_depth()-1)[-1]
+            if key == prefix:
+                continue
 
-            is_folder = bool(re.search('.*\/', postfix))
-            if is_folder is True:
-                key = postfix.split('/', 1)[0] + '/'
-            else:
-                key = postfix
-            
-            if key not in converted_keys:
+            """ delimiter='/' leaves only 'object' and 'folder/' below prefix """
+            key = key[len(prefix):]
+            if key not in self.seen:
+                self.seen.add(key)
                 converted_keys.append(key)
 
         return converted_keys
@@ -402,41 +775,37 @@ class FolderNode(urwid.ParentNode):
         is_folder = bool(re.search('.*\/', key))
         if is_folder is True:
             path = self.get_value() + key
-            return FolderNode(path, key, parent=self, depth=self.get_depth()+1)
+            node = FolderNode(path, key, parent=self, depth=self.get_depth()+1)
+            node.usage = self.sizes.get(key)
+            return node
         else:
-            return ObjectNode(key, parent=self, depth=self.get_depth()+1)
-
-    def load_widget(self):
-        return DirectoryWidget(self)
+            path = self.get_value() + key
+            return ObjectNode(path, parent=self, depth=self.get_depth()+1,
+                              key=key)
 
-class ContainerNode(urwid.ParentNode):
+class ContainerNode(RemoteNode):
     def __init__(self, name, parent):
         depth = 1
         path = name
-        urwid.ParentNode.__init__(self, value=path, key=name, parent=parent, depth=depth)
-
-    def load_parent(self):
-        return self.get_parent()
+        RemoteNode.__init__(self, value=path, key=name, parent=parent, depth=depth)
 
-    def load_child_keys(self):
-        keys = objectstorageclient.get_objects(self.get_key())
+    def iter_pages(self):
+        """ Only the top level: objects and 'folder1/' common prefixes """
+        return remote_pages('iter_object_pages', self.get_key(),
+                            delimiter='/', cached=self.cached)
 
-        if len(keys) == 0:
-            depth = self.get_depth() + 1
-            self._children[None] = EmptyNode(self, parent=self, key=None, depth=depth)
-            keys = [None]
-            return keys
+    def load_sizes(self):
+        container = self.get_key()
+        listing_loader.compute(self, self.generation,
+            lambda: get_client().subfolder_usage(container),
+            self.set_sizes)
 
+    def convert_keys(self, keys):
+        """ A 'folder1/' marker object is listed next to its prefix """
         converted_keys = []
         for key in keys:
-            #is_folder = '/' in key
-            is_folder = bool(re.search('.*\/', key))
-            if is_folder is True:
-                """ Example) key = folder1/folder2/.../object """
-                """ name = folder1/ """
-                key = key.split('/', 1)[0] + '/'
-
-            if key not in converted_keys:
+            if key not in self.seen:
+                self.seen.add(key)
                 converted_keys.append(key)
 
         return converted_keys
@@ -457,21 +826,24 @@ class ContainerNode(urwid.ParentNode):
             """ name = folder1 """
             """ path = container/folder1 """
             path = self.get_value() + '/' + key
-            return FolderNode(value=path, key=key, parent=self, depth=self.get_depth()+1)
+            node = FolderNode(value=path, key=key, parent=self, depth=self.get_depth()+1)
+            node.usage = self.sizes.get(key)
+            return node
         else:
-            return ObjectNode(key, parent=self, depth=self.get_depth()+1)
-
-    def load_widget(self):
-        return DirectoryWidget(self)
+            path = self.get_value() + '/' + key
+            return ObjectNode(path, parent=self, depth=self.get_depth()+1,
+                              key=key)
  
-class AccountNode(urwid.ParentNode):
+class AccountNode(RemoteNode):
     def __init__(self):
         depth = 0
         path = '/'
-        urwid.ParentNode.__init__(self, value=path, key=path, depth=depth)
+        RemoteNode.__init__(self, value=path, key=path, parent=None, depth=depth)
 
-    def load_child_keys(self):
-        keys = objectstorageclient.get_containers()
+    def iter_pages(self):
+        return remote_pages('iter_container_pages', cached=self.cached)
+
+    def convert_keys(self, keys):
         return keys
 
     def load_child_node(self, key):
@@ -479,9 +851,6 @@ class AccountNode(urwid.ParentNode):
             return EmptyNode(None)
 
         return ContainerNode(key, parent=self)
-
-    def load_widget(self):
-        return DirectoryWidget(self)
           
 class DirectoryBrowser:
     palette = [
@@ -511,6 +880,8 @@ class DirectoryBrowser:
         ('key', "HOME"), "  ",
         ('key', "END"), "  ",
         ('key', "TAB"), "  ",
+        ('key', "R"), "  ",
+        ('key', "U"), "  ",
         ('key', "Q"),
         ]
 
@@ -528,41 +899,192 @@ class DirectoryBrowser:
         self.left_listbox.offset_rows = 1
 
         #self.right_listbox = urwid.TreeListBox(urwid.TreeWalker(DirectoryNode(cwd)))
-        self.right_listbox = urwid.TreeListBox(urwid.TreeWalker(AccountNode()))
+        self.account = AccountNode()
+        self.right_listbox = urwid.TreeListBox(RemoteTreeWalker(self.account))
         self.right_listbox.offset_rows = 1
         self.listbox = urwid.Columns([
                         self.left_listbox,
                         self.right_listbox
                         ])
-        self.footer = urwid.AttrWrap(urwid.Text(self.footer_text), 'foot')
+        self.footer_label = urwid.Text(self.footer_text)
+        self.footer = urwid.AttrWrap(self.footer_label, 'foot')
         self.view = urwid.Frame(
             urwid.AttrWrap(self.listbox, 'body'),
             header=urwid.AttrWrap(self.header, 'head'),
             footer=self.footer)
 
-    def main(self):
+        self.timings = None
+        self.transfers = None
+        self.transfer_alarm = None
+        self.upload_targets = set()
+        self.quit_pending = False
+
+    def main(self, startup_time=False):
         """Run the program."""
 
         self.loop = urwid.MainLoop(self.view, self.palette,
             unhandled_input=self.unhandled_input)
+        listing_loader.attach(self.loop, self.listing_changed)
+        if startup_time:
+            self.measure_startup()
         self.loop.run()
+        self.finish_transfers()
+
+        """ Only a client that was used has metrics to export """
+        if _client is not None:
+            _client.instrumentation.export(_client.session)
+
+        if startup_time:
+            for name, seconds in self.timings:
+                print "%-16s %8.1f ms" % (name + ':', seconds * 1000)
+            return
 
         # on exit, write the flagged filenames to the console
         names = [escape_filename_sh(x) for x in get_flagged_names()]
         print " ".join(names)
 
+    def measure_startup(self):
+        """Time the first frame and the account listing, then exit"""
+        self.timings = []
+        draw_screen = self.loop.draw_screen
+
+        def timed_draw_screen():
+            draw_screen()
+            if not self.timings:
+                self.timings.append(('first frame', time.time() - _started))
+        self.loop.draw_screen = timed_draw_screen
+
+    def listing_changed(self, nodes):
+        """Redraw the remote pane after listing pages arrived"""
+        if self.timings is not None and self.account in nodes and \
+                len(self.timings) == 1:
+            self.timings.append(('account listed', time.time() - _started))
+            self.loop.set_alarm_in(0, self.exit)
+
+        walker = self.right_listbox.body
+        focus_widget, focus_node = walker.get_focus()
+
+        """ The placeholder is gone once a listing is complete """
+        if focus_node is not None and focus_node.get_key() is LOADING_KEY:
+            parent = focus_node.get_parent()
+            if parent in nodes and not parent.loading:
+                walker.set_focus(parent)
+
+        walker._modified()
+
+    def upload_target(self):
+        """Return the focused remote ContainerNode/FolderNode, or None"""
+        node = self.right_listbox.body.get_focus()[1]
+        while node is not None and not isinstance(node, (ContainerNode, FolderNode)):
+            if isinstance(node, AccountNode):
+                return None
+            node = node.get_parent()
+        return node
+
+    def upload_flagged(self):
+        """Queue the flagged local files and directories for upload"""
+        from tc_object_storage.sync import walk_local
+        from tc_object_storage.transfers import TransferQueue
+
+        target = self.upload_target()
+        if target is None:
+            self.footer_label.set_text(('error',
+                "Focus a remote container or folder to upload into"))
+            return
+
+        """ 'container' or 'container/folder/' """
+        container, _, prefix = target.get_value().partition('/')
+        paths = [path for path in get_flagged_names()
+                 if os.path.isabs(path) and path != dir_sep() and
+                 os.path.exists(path)]
+        if not paths:
+            self.footer_label.set_text(('error',
+                "Flag local files or directories with SPACE first"))
+            return
+
+        if self.transfers is None:
+            client = get_client()
+            self.transfers = TransferQueue(client.upload_file,
+                                           workers=client.transfer_workers)
+
+        queued = set()
+        for path in paths:
+            name = os.path.basename(path.rstrip(dir_sep()))
+            if os.path.isdir(path):
+                files = [(name + '/' + local.name, local.path)
+                         for local in walk_local(path)]
+            else:
+                files = [(name, path)]
+
+            for object_name, filename in files:
+                if (object_name, filename) not in queued:
+                    queued.add((object_name, filename))
+                    self.transfers.enqueue(container, prefix + object_name,
+                                           filename)
+            unflag(path)
+
+        self.upload_targets.add(target)
+        if self.transfer_alarm is None:
+            self.show_transfers()
+
+    def finish_transfers(self):
+        """Let the queued uploads complete before the process ends"""
+        if self.transfers is None:
+            return
+        status = self.transfers.status()
+        if not status.idle:
+            sys.stderr.write("waiting for the uploads: %s\n" % status)
+        self.transfers.close()
+        self.transfers.join()
+        if not status.idle:
+            sys.stderr.write("%s\n" % self.transfers.status())
+
+    def show_transfers(self, *args):
+        """Show the transfer queue in the footer until it runs dry"""
+        status = self.transfers.status()
+        text = [('title', "Transfers"), "  ", str(status)]
+        if self.quit_pending:
+            text = [('error', "Q again quits once the uploads are done"),
+                    "  "] + text
+        self.footer_label.set_text(text)
+        if not status.idle:
+            self.transfer_alarm = self.loop.set_alarm_in(0.5, self.show_transfers)
+            return
+        self.transfer_alarm = None
+
+        """ The new objects are only listed after a refresh """
+        for node in self.upload_targets:
+            node.refresh()
+        self.upload_targets.clear()
+        self.right_listbox.body._modified()
+
+    def exit(self, *args):
+        raise urwid.ExitMainLoop()
+
     def unhandled_input(self, k):
         # update display of focus directory
         if k in ('q','Q'):
+            """ Queued uploads would die with the process, ask first """
+            if self.transfers is not None and not self.quit_pending and \
+                    not self.transfers.status().idle:
+                self.quit_pending = True
+                self.footer_label.set_text(('error',
+                    "Q again quits once the uploads are done"))
+                return
             raise urwid.ExitMainLoop()
         elif k in ('u', 'U'):
-            focus_column = self.listbox.get_focus_column()
-            if focus_column == 0:
-                file_focus_widget, file_focus_position = self.left_listbox.get_focus()
-                object_focus_widget, object_focus_position = self.right_listbox.get_focus()
-                print file_focus_widget.get_node().get_value()
-                print object_focus_widget.get_node().get_value()
-                #objectstorageclient.upload_object(path, file)
+            self.upload_flagged()
+        elif k in ('r', 'R') and self.listbox.get_focus_column() == 1:
+            """ Re-list the focused remote folder (or the one holding it) """
+            walker = self.right_listbox.body
+            focus_widget, focus_node = walker.get_focus()
+            node = focus_node
+            while node is not None and not isinstance(node, RemoteNode):
+                node = node.get_parent()
+            if node is not None:
+                node.refresh()
+                walker.set_focus(node)
+                walker._modified()
         elif k == 'tab':
             focus_column = self.listbox.get_focus_column()
             if focus_column == 0:
@@ -571,26 +1093,52 @@ class DirectoryBrowser:
                 self.listbox.set_focus_column(focus_column - 1)
 
 def main():
-    DirectoryBrowser().main()
+    parser = argparse.ArgumentParser(description='TOAST Cloud Object Storage browser')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='print the time to the first frame and to the '
+                             'account listing, then exit')
+    args = parser.parse_args()
+
+    DirectoryBrowser().main(startup_time=args.startup_time)
 
 
 #######
-# global cache of widgets
-_widget_cache = {}
+# global cache of widgets, only the most recently created are kept
+WIDGET_CACHE_SIZE = 1000
+_widget_cache = collections.OrderedDict()
 
 def add_widget(path, widget):
     """Add the widget for a given path"""
 
+    _widget_cache.pop(path, None)
     _widget_cache[path] = widget
+    while len(_widget_cache) > WIDGET_CACHE_SIZE:
+        _widget_cache.popitem(last=False)
+
+#######
+# flags outlive the widgets, which may be evicted
+_flagged = set()
+
+def is_flagged(path):
+    return path in _flagged
+
+def set_flagged(path, flagged):
+    if flagged:
+        _flagged.add(path)
+    else:
+        _flagged.discard(path)
+
+def unflag(path):
+    set_flagged(path, False)
+    widget = _widget_cache.get(path)
+    if widget is not None:
+        widget.flagged = False
+        widget.update_w()
 
 def get_flagged_names():
     """Return a list of all filenames marked as flagged."""
 
-    l = []
-    for w in _widget_cache.values():
-        if w.flagged:
-            l.append(w.get_node().get_value())
-    return l
+    return sorted(_flagged)
 
 
 
@@ -1,13 +1,97 @@
 #!/usr/bin/env python
 
 import os
+import sys
 import json
-import requests
+import shlex
+import hashlib
 import argparse
+import threading
 import ConfigParser
 
+import requests
+
+from tc_object_storage.auth import TokenAuth, TokenCache, login
+from tc_object_storage.bandwidth import BandwidthLimiter, parse_rate
+from tc_object_storage.bulk import BulkDeleter, DEFAULT_DELETE_WORKERS
+from tc_object_storage.common import conf_get, format_size, parse_size, \
+    split_path
+from tc_object_storage.concurrency import ConcurrencyController
+from tc_object_storage.download import download_object, stream_object, \
+    DownloadError, ParallelDownloader, DEFAULT_DOWNLOAD_WORKERS, DEFAULT_RANGE_SIZE
+from tc_object_storage.index import ListingIndex, DEFAULT_INDEX_PATH
+from tc_object_storage.journal import list_journals, clean_journals, \
+    DEFAULT_JOURNAL_DIR, DEFAULT_MAX_AGE
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.metrics import Instrumentation
+from tc_object_storage.pipeline import PipelinedClient, DEFAULT_CONCURRENCY, \
+    head_object, head_container, create_container, delete_container, \
+    delete_object
+from tc_object_storage.segments import SegmentedUploader, UploadError, \
+    MANIFEST_TYPES, DEFAULT_SEGMENT_SIZE, DEFAULT_SEGMENT_WORKERS
+from tc_object_storage.server_copy import ServerSideCopier, \
+    DEFAULT_COPY_WORKERS
+from tc_object_storage.session import PooledSession
+from tc_object_storage.sync import DirectorySync, DEFAULT_SYNC_WORKERS
+from tc_object_storage.upload import upload_file, upload_stream
+from tc_object_storage.usage import FolderUsage, iter_usage, \
+    manifest_sizes
+from tc_object_storage.workers import imap_unordered
+
 config_filename = "../setup.ini"
 
+DEFAULT_BATCH_WORKERS = 8
+""" Commands that never talk to Swift, they run without logging in """
+LOCAL_COMMANDS = ('journals',)
+
+
+class BatchLineError(Exception):
+    pass
+
+
+class BatchParser(argparse.ArgumentParser):
+    """Parser of batch lines: errors are raised, not fatal to the batch"""
+
+    def error(self, message):
+        raise BatchLineError(message)
+
+
+class LineWriter(object):
+    """File-like stdout wrapper keeping lines printed by threads whole.
+
+    Every thread's output is held back until it ends a line, then whole
+    lines are written out under a lock.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @property
+    def softspace(self):
+        """ Kept by print on the file, must not leak between threads """
+        return getattr(self.local, 'softspace', 0)
+
+    @softspace.setter
+    def softspace(self, value):
+        self.local.softspace = value
+
+    def write(self, text):
+        pending = getattr(self.local, 'pending', '') + text
+        lines, newline, self.local.pending = pending.rpartition('\n')
+        if newline:
+            with self.lock:
+                self.out.write(lines + newline)
+
+    def flush(self):
+        pending = getattr(self.local, 'pending', '')
+        self.local.pending = ''
+        with self.lock:
+            self.out.write(pending)
+            self.out.flush()
+
+
 class SwiftClient:
     def __init__(self):
         self._read_args()
@@ -22,22 +106,293 @@ class SwiftClient:
 
         self.username = self.conf.get('default', 'username')
         self.password = self.conf.get('object_storage', 'password')
+
+        self.controller = ConcurrencyController.from_config(self.conf,
+            enabled=self.args.adaptive)
+
+        self.segment_size = self.args.segment_size
+        if self.segment_size is None:
+            self.segment_size = conf_get(self.conf, 'upload', 'segment_size',
+                DEFAULT_SEGMENT_SIZE, parse_size)
+        self.segment_workers = self.args.segment_workers
+        if self.segment_workers is None:
+            self.segment_workers = conf_get(self.conf, 'upload',
+                'segment_workers',
+                self._default_workers(DEFAULT_SEGMENT_WORKERS), int)
+        self.manifest = self.args.manifest
+        if self.manifest is None:
+            self.manifest = conf_get(self.conf, 'upload', 'manifest', 'dlo')
+        self.segment_container = conf_get(self.conf, 'upload',
+            'segment_container')
+        self.send_etag = self.args.send_etag or conf_get(self.conf,
+            'upload', 'send_etag', False, bool)
+
+        self.download_workers = self.args.download_workers
+        if self.download_workers is None:
+            self.download_workers = conf_get(self.conf, 'download',
+                'workers', self._default_workers(DEFAULT_DOWNLOAD_WORKERS),
+                int)
+        self.range_size = self.args.range_size
+        if self.range_size is None:
+            self.range_size = conf_get(self.conf, 'download', 'range_size',
+                DEFAULT_RANGE_SIZE, parse_size)
+
+        self.delete_workers = self.args.delete_workers
+        if self.delete_workers is None:
+            self.delete_workers = conf_get(self.conf, 'delete', 'workers',
+                self._default_workers(DEFAULT_DELETE_WORKERS), int)
+        self.delete_rate = self.args.delete_rate
+        if self.delete_rate is None:
+            self.delete_rate = conf_get(self.conf, 'delete', 'rate',
+                None, float)
+
+        self.copy_workers = self.args.copy_workers
+        if self.copy_workers is None:
+            self.copy_workers = conf_get(self.conf, 'copy', 'workers',
+                self._default_workers(DEFAULT_COPY_WORKERS), int)
+
+        self.concurrency = self.args.concurrency
+        if self.concurrency is None:
+            self.concurrency = conf_get(self.conf, 'connection',
+                'concurrency', self._default_workers(DEFAULT_CONCURRENCY),
+                int)
+
+        self.index_path = conf_get(self.conf, 'index', 'path',
+            DEFAULT_INDEX_PATH)
+
+        self.journal_dir = conf_get(self.conf, 'journal', 'dir',
+            DEFAULT_JOURNAL_DIR)
+        self.use_journal = not self.args.no_journal and conf_get(self.conf,
+            'journal', 'enabled', True, bool)
+
+        self.sync_workers = self.args.sync_workers
+        if self.sync_workers is None:
+            self.sync_workers = conf_get(self.conf, 'sync', 'workers',
+                self._default_workers(DEFAULT_SYNC_WORKERS), int)
+
+        self.batch_workers = conf_get(self.conf, 'batch', 'workers',
+            DEFAULT_BATCH_WORKERS, int)
         
         self.headers = dict()   
         self.headers['Content-Type'] = 'application/json'
         
-        token, self.tenant_id = self._get_token()
-        print token
-        self.headers['X-Auth-Token'] = token
+        self.session = PooledSession.from_config(self.conf)
+        if self.controller is not None:
+            self.session.set_controller(self.controller)
+        self.session.bandwidth = BandwidthLimiter.from_config(self.conf,
+            rate=self.args.limit_rate,
+            transfer_rate=self.args.transfer_limit)
+        self.instrumentation = Instrumentation.from_config(self.conf,
+            json_path=self.args.metrics_json,
+            prometheus_path=self.args.metrics_prometheus,
+            trace_path=self.args.trace,
+            enabled=self.args.stats)
+        self.instrumentation.attach(self.session)
+
+        self.token_cache = TokenCache.from_config(self.conf)
+        self.session.auth = TokenAuth(self)
+
+        if self.args.command not in LOCAL_COMMANDS:
+            login(self)
+
+    def _default_workers(self, default):
+        """ Adaptive, the controller decides how many of the workers run """
+        if self.controller is None:
+            return default
+        return self.controller.maximum
 
     def _read_args(self):
-        self.parser = argparse.ArgumentParser()
+        self.parser = argparse.ArgumentParser(
+            description="TOAST Cloud Object Storage client. Paths are "
+                        "'/container/object' or '/container/prefix/'.")
 
         self.parser.add_argument('-p', '--project-id', dest='project_id', 
             help="TOAST Cloud Project ID")
+        self.parser.add_argument('--segment-size', dest='segment_size',
+            type=parse_size, help="Segment size of large uploads, e.g. 100M, 1G")
+        self.parser.add_argument('--segment-workers', dest='segment_workers',
+            type=int, help="Number of segments uploaded concurrently")
+        self.parser.add_argument('--manifest', dest='manifest',
+            choices=MANIFEST_TYPES, help="Large object manifest type")
+        self.parser.add_argument('--send-etag', dest='send_etag',
+            action='store_true',
+            help="Hash files before upload so Swift verifies the ETag")
+        self.parser.add_argument('--download-workers', dest='download_workers',
+            type=int, help="Number of ranges/segments downloaded concurrently")
+        self.parser.add_argument('--range-size', dest='range_size',
+            type=parse_size, help="Byte range size of parallel downloads")
+        self.parser.add_argument('--delete-workers', dest='delete_workers',
+            type=int, help="Number of concurrent delete requests")
+        self.parser.add_argument('--delete-rate', dest='delete_rate',
+            type=float, help="Maximum delete requests per second")
+        self.parser.add_argument('--copy-workers', dest='copy_workers',
+            type=int, help="Number of concurrent server side copies")
+        self.parser.add_argument('--sync-workers', dest='sync_workers',
+            type=int, help="Number of files synchronized concurrently")
+        self.parser.add_argument('--concurrency', dest='concurrency',
+            type=int, help="Requests kept in flight by metadata sweeps")
+        self.parser.add_argument('--limit-rate', dest='limit_rate',
+            type=parse_rate, metavar='RATE',
+            help="Bytes per second all transfers share, e.g. 10M")
+        self.parser.add_argument('--transfer-limit', dest='transfer_limit',
+            type=parse_rate, metavar='RATE',
+            help="Bytes per second of every single transfer")
+        self.parser.add_argument('--adaptive', dest='adaptive',
+            action='store_true',
+            help="Adapt the requests in flight to latency and throttling")
+        self.parser.add_argument('--no-journal', dest='no_journal',
+            action='store_true',
+            help="Do not checkpoint large transfers for resuming")
+        self.parser.add_argument('--stats', dest='stats',
+            action='store_true',
+            help="Print request statistics to stderr at exit")
+        self.parser.add_argument('--metrics-json', dest='metrics_json',
+            metavar='FILE',
+            help="Write a JSON request summary at exit, '-' for stderr")
+        self.parser.add_argument('--metrics-prometheus',
+            dest='metrics_prometheus', metavar='FILE',
+            help="Write the request metrics at exit for Prometheus")
+        self.parser.add_argument('--trace', dest='trace', metavar='FILE',
+            help="Append every request as a JSON line to FILE")
+
+        self._add_commands(self.parser, batch=True)
+
+        """ Lines of a batch take the same commands, except batch itself """
+        self.batch_parser = BatchParser(prog='batch line')
+        self._add_commands(self.batch_parser, batch=False)
 
         self.args = self.parser.parse_args()
 
+    def _add_commands(self, parser, batch):
+        commands = parser.add_subparsers(dest='command', metavar='command')
+
+        command = commands.add_parser('list',
+            help="List the account, a container or a prefix")
+        command.add_argument('path', nargs='?', default='/')
+        command.add_argument('--full', action='store_true',
+            help="Print the complete JSON entries")
+        command.add_argument('--delimiter',
+            help="List one level only, e.g. '/'")
+        command.set_defaults(func=self.command_list)
+
+        command = commands.add_parser('du',
+            help="Bytes and objects per pseudo-folder, or per container")
+        command.add_argument('path', nargs='?', default='/')
+        command.add_argument('-d', '--max-depth', dest='max_depth',
+            type=int, help="Only print folders down to this depth")
+        command.add_argument('--use-index', dest='use_index',
+            action='store_true',
+            help="Read the local listing index instead of listing")
+        command.add_argument('--manifests', action='store_true',
+            help="HEAD empty objects so DLO manifests count with their "
+                 "real size instead of 0 bytes (not for '/')")
+        command.set_defaults(func=self.command_du)
+
+        command = commands.add_parser('stat',
+            help="Show the metadata of a container or an object")
+        command.add_argument('path')
+        command.add_argument('-r', '--recursive', action='store_true',
+            help="Stat every object under the path")
+        command.set_defaults(func=self.command_stat)
+
+        command = commands.add_parser('upload',
+            help="Upload files to a '/container/prefix/', '-' for stdin")
+        command.add_argument('path')
+        command.add_argument('filenames', nargs='+', metavar='file')
+        command.set_defaults(func=self.command_upload)
+
+        command = commands.add_parser('download',
+            help="Download an object to a file, or to stdout")
+        command.add_argument('path')
+        command.add_argument('filename', nargs='?')
+        command.add_argument('--resume', action='store_true',
+            help="Continue a partial download")
+        command.add_argument('--parallel', action='store_true',
+            help="Download ranges/segments over several connections")
+        command.set_defaults(func=self.command_download)
+
+        command = commands.add_parser('delete',
+            help="Delete an object, or every object under a prefix")
+        command.add_argument('path')
+        command.add_argument('-r', '--recursive', action='store_true',
+            help="Delete every object under the path")
+        command.set_defaults(func=self.command_delete)
+
+        command = commands.add_parser('mkdir', help="Create a container")
+        command.add_argument('container')
+        command.set_defaults(func=self.command_mkdir)
+
+        command = commands.add_parser('rmdir',
+            help="Delete an empty container")
+        command.add_argument('container')
+        command.set_defaults(func=self.command_rmdir)
+
+        for name, move, help in (
+                ('copy', False, "Copy objects server side"),
+                ('move', True, "Move objects server side (copy, delete)")):
+            command = commands.add_parser(name, help=help)
+            command.add_argument('source')
+            command.add_argument('destination')
+            command.add_argument('-r', '--recursive', action='store_true',
+                help="Every object under a prefix, or a whole container")
+            command.add_argument('--flatten', action='store_true',
+                help="Turn large object manifests into plain objects")
+            command.set_defaults(func=self.command_copy, move=move)
+
+        command = commands.add_parser('purge',
+            help="Delete a container and all of its objects")
+        command.add_argument('container')
+        command.set_defaults(func=self.command_purge)
+
+        command = commands.add_parser('sync',
+            help="Upload the changed files of a local directory")
+        command.add_argument('local_dir')
+        command.add_argument('path')
+        command.add_argument('--delete-orphans', dest='delete_orphans',
+            action='store_true',
+            help="Delete remote objects missing from the local tree")
+        command.add_argument('--checksum', action='store_true',
+            help="Always compare MD5 checksums, not only mtimes")
+        command.add_argument('--use-index', dest='use_index',
+            action='store_true',
+            help="Compare against the local listing index")
+        command.set_defaults(func=self.command_sync)
+
+        command = commands.add_parser('index',
+            help="Bring the local listing index of a container up to date")
+        command.add_argument('container')
+        command.add_argument('--full', action='store_true',
+            help="Rebuild the index from scratch")
+        command.set_defaults(func=self.command_index)
+
+        command = commands.add_parser('search',
+            help="Search the local listing index with a glob pattern")
+        command.add_argument('container')
+        command.add_argument('pattern')
+        command.set_defaults(func=self.command_search)
+
+        command = commands.add_parser('journals',
+            help="List or clean the journals of interrupted transfers")
+        command.add_argument('action', nargs='?', default='list',
+            choices=('list', 'clean'))
+        command.add_argument('--max-age', dest='max_age', type=float,
+            default=DEFAULT_MAX_AGE / 86400.0,
+            help="Clean journals older than this many days")
+        command.add_argument('--all', action='store_true',
+            help="Clean every journal, whatever its age")
+        command.set_defaults(func=self.command_journals)
+
+        if not batch:
+            return
+
+        command = commands.add_parser('batch',
+            help="Run one command per line of a file or stdin")
+        command.add_argument('filename', nargs='?', default='-',
+            help="File of commands, '-' (default) for stdin")
+        command.add_argument('-j', '--jobs', type=int,
+            help="Number of commands run concurrently")
+        command.set_defaults(func=self.command_batch)
+
     def _read_conf(self):
         self.conf = ConfigParser.ConfigParser()
         self.conf.read(config_filename)
@@ -53,165 +408,493 @@ class SwiftClient:
         request['auth'] = auth
 
         url = self.keystone_endpoint + '/identity/v2.0/tokens'
-        response = requests.post(url, data=json.dumps(request), headers=self.headers)
+        response = self.session.post(url, data=json.dumps(request), headers=self.headers)
+        response.raise_for_status()
 
         response_body = response.json()
         token = response_body['access']['token']['id']
         tenant_id = response_body['access']['token']['tenant']['id']
+        expires = response_body['access']['token']['expires']
 
-        return token, tenant_id
-
-    def get_object_metadata(self, container, object_name):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + container
-        url = url + '/' + object_name
-        print url
-
-        response = requests.head(url, headers=self.headers) 
-        response.raise_for_status()
-
-        print response.status_code
-        print response.headers
+        return token, tenant_id, expires
 
-    def get_objects(self, container):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + container
+    def _print_headers(self, headers):
+        for key, value in sorted(headers.items()):
+            print "%s: %s" % (key, value)
 
-        #params = dict()
-        #params['format'] = 'json'
+    def get_object_metadata(self, container, object_name):
+        headers = head_object(self, container.strip('/'), object_name)
+        self._print_headers(headers)
+        return headers
 
-        response = requests.get(url, headers=self.headers)  
-        response.raise_for_status()
+    def get_objects(self, path, full=False, delimiter=None):
+        """List a '/container/prefix', or the account when path is '/'"""
+        container, prefix = split_path(path)
 
-        print response.status_code
-        print response.text
-        #print response.json()
-        #object_list = response.text.split('\n')
-        #for each_object in object_list:
-        #   print "object: " + each_object
+        for entry in iter_listing(self, container or None, prefix=prefix,
+                                  delimiter=delimiter, full=full):
+            if full:
+                print json.dumps(entry)
+            else:
+                print entry
 
     def upload_object(self, path, filename):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + path + filename
-
-        fp = open(filename, 'r')
-        headers = self.headers
-        headers['Content-Type'] = 'multipart/formed-data'
-
-        response = requests.put(url, headers=headers, files={'file':fp})
-        print response.status_code
-        print response.headers
-
-    def upload_object_deprecated(self, path, filename):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + path + filename
+        """Upload filename as '/container/prefix/' path + filename
+
+        The raw file is streamed from disk.  With filename '-' stdin is
+        uploaded instead and path names the object itself; stdin, pipes
+        and other files without a size are sent chunked.
+        """
+        if filename == '-':
+            container, object_name = split_path(path)
+            result = upload_stream(self, container, object_name, sys.stdin)
+        else:
+            container, prefix = split_path(path)
+            object_name = prefix + filename
+            if os.path.isfile(filename):
+                result = upload_file(self, container, object_name, filename,
+                                     send_etag=self.send_etag)
+            else:
+                fp = open(filename, 'rb')
+                try:
+                    result = upload_stream(self, container, object_name, fp)
+                finally:
+                    fp.close()
+
+        print result
+        return result
+
+    def upload_large_object(self, path, filename):
+        container, prefix = split_path(path)
+
+        uploader = SegmentedUploader(self,
+            segment_size=self.segment_size,
+            workers=self.segment_workers,
+            manifest=self.manifest,
+            segment_container=self.segment_container,
+            journal_dir=self.journal_dir if self.use_journal else None)
+        result = uploader.upload(container, prefix + filename, filename)
+
+        print result
+        return result
+
+    def _print_sync_progress(self, summary):
+        sys.stderr.write("\ruploaded %d, unchanged %d, failed %d" % (
+            summary.uploaded, summary.unchanged, len(summary.failures)))
+
+    def sync_directory(self, local_dir, path, delete=False, checksum=False,
+                       use_index=False):
+        """Upload the changed files of local_dir to a '/container/prefix'"""
+        container, prefix = split_path(path)
+
+        index = None
+        if use_index:
+            index = ListingIndex(self, self.index_path)
+
+        sync = DirectorySync(self,
+            workers=self.sync_workers,
+            delete=delete,
+            checksum=checksum,
+            segment_size=self.segment_size,
+            segment_workers=self.segment_workers,
+            manifest=self.manifest,
+            segment_container=self.segment_container,
+            index=index,
+            progress=self._print_sync_progress,
+            journal_dir=self.journal_dir if self.use_journal else None)
+        summary = sync.sync(local_dir, container, prefix)
+        sys.stderr.write("\n")
+
+        print summary
+        for name, error in summary.failures:
+            print "%s: %s" % (name, error)
+        return summary
+
+    def stat_objects(self, path):
+        """HEAD every object under a '/container/prefix' path concurrently"""
+        container, prefix = split_path(path)
+
+        with PipelinedClient(self, self.concurrency) as pipeline:
+            for (_, name), headers, exc_info in pipeline.head_all(container,
+                                                                 prefix):
+                if exc_info is not None:
+                    print "%s: %s" % (name, exc_info[1])
+                    continue
+
+                metadata = ' '.join('%s=%s' % (key[len('X-Object-Meta-'):],
+                                               value)
+                    for key, value in sorted(headers.items())
+                    if key.lower().startswith('x-object-meta-'))
+                print "%s\t%s\t%s\t%s\t%s" % (name,
+                    headers.get('Content-Length'), headers.get('ETag'),
+                    headers.get('Last-Modified'), metadata)
+
+    def disk_usage(self, path, max_depth=None, use_index=False,
+                   manifests=False):
+        """Print bytes and objects under every pseudo-folder of a path
+
+        The account ('/') is reported per container, from the account
+        listing alone.  Otherwise the listing is read once, as JSON
+        pages, and folders are printed as they are completed, deepest
+        first, with the total of the path last.  Sizes are the listed
+        ones, where DLO manifests are 0 bytes; with manifests set, they
+        are HEADed for the size of their segments.
+        """
+        container, prefix = split_path(path)
+
+        if not container:
+            total = FolderUsage('/', 0)
+            for entry in iter_listing(self, full=True):
+                usage = FolderUsage(entry['name'], 1)
+                usage.objects = entry.get('count', 0)
+                usage.bytes = entry.get('bytes', 0)
+                total.add(usage)
+                print usage
+            print total
+            return total
+
+        if use_index:
+            index = ListingIndex(self, self.index_path)
+            index.refresh(container)
+            entries = index.iter_objects(container, prefix)
+        else:
+            entries = iter_listing(self, container, prefix=prefix, full=True)
+        if manifests:
+            entries = manifest_sizes(self, container, entries)
+
+        for usage in iter_usage(entries, prefix, max_depth=max_depth):
+            usage.path = '/%s/%s' % (container, usage.path)
+            print usage
+        return usage
+
+    def index_container(self, container, full=False):
+        """Bring the local listing index of a container up to date"""
+        container = container.strip('/')
+
+        index = ListingIndex(self, self.index_path)
+        mode = index.refresh(container, full=full)
+        count, size = index.usage(container)
+
+        print "%s: %s refresh, %d objects, %s" % (container, mode, count,
+            format_size(size))
+
+    def search_index(self, container, pattern):
+        """Print indexed objects of a container matching a glob pattern"""
+        container = container.strip('/')
+
+        index = ListingIndex(self, self.index_path)
+        index.refresh(container)
+        for entry in index.search(container, pattern):
+            print "%s\t%d\t%s" % (entry['name'], entry['bytes'],
+                entry['last_modified'])
+
+    def download_object(self, path, filename=None, resume=False):
+        """Stream an object to a local file, or to stdout without filename"""
+        container, object_name = split_path(path)
+
+        if filename is None:
+            stream_object(self, container, object_name, sys.stdout,
+                md5=hashlib.md5())
+            return None
+
+        result = download_object(self, container, object_name, filename,
+            resume=resume)
+
+        print result
+        return result
+
+    def download_large_object(self, path, filename):
+        """Download an object over several connections into filename"""
+        container, object_name = split_path(path)
+
+        downloader = ParallelDownloader(self,
+            workers=self.download_workers,
+            range_size=self.range_size,
+            journal_dir=self.journal_dir if self.use_journal else None)
+        result = downloader.download(container, object_name, filename)
+
+        print result
+        return result
+
+    def list_journals(self):
+        """Print the interrupted transfers that can be resumed"""
+        journals = list_journals(self.journal_dir)
+        for journal in journals:
+            print journal
+        return journals
+
+    def clean_journals(self, max_age=DEFAULT_MAX_AGE):
+        """Remove journals untouched for max_age seconds, None for all"""
+        removed = clean_journals(self.journal_dir, max_age)
+        for journal in removed:
+            print "removed", journal
+        return removed
 
-        print url
+    def delete_object(self, path):
+        container, object_name = split_path(path)
+        delete_object(self, container, object_name)
+        print "deleted", path
+
+    def _server_side_copier(self, flatten=False):
+        return ServerSideCopier(self,
+            workers=self.copy_workers,
+            flatten=flatten,
+            progress=self._print_copy_progress)
+
+    def _print_copy_progress(self, summary):
+        sys.stderr.write("\r%s %d, failed %d" % (
+            'moved' if summary.move else 'copied', summary.copied,
+            len(summary.failures)))
+
+    def copy_object(self, source, destination, move=False, flatten=False):
+        """Copy (or move) a '/container/object' server side
+
+        A destination ending in '/' keeps the name of the source object.
+        The destination container is created if need be, as by copy -r.
+        """
+        container, object_name = split_path(source)
+        dest_container, dest_name = split_path(destination)
+        if not dest_name or dest_name.endswith('/'):
+            dest_name += object_name.rsplit('/', 1)[-1]
+
+        create_container(self, dest_container)
+        self._server_side_copier(flatten).copy_one(container, object_name,
+            dest_container, dest_name, move)
+        print "%s %s to /%s/%s" % ('moved' if move else 'copied', source,
+            dest_container, dest_name)
+
+    def copy_objects(self, source, destination, move=False, flatten=False):
+        """Copy (or move) everything under a '/container/prefix' path
+
+        Names keep their part after the source prefix.  Moving a whole
+        container deletes it once it is empty.
+        """
+        container, prefix = split_path(source)
+        dest_container, dest_prefix = split_path(destination)
+
+        copier = self._server_side_copier(flatten)
+        if prefix or dest_prefix:
+            summary = copier.copy_prefix(container, prefix, dest_container,
+                dest_prefix, move)
+        else:
+            summary = copier.copy_container(container, dest_container, move)
+        sys.stderr.write("\n")
 
-        fp = open(filename, 'r')
-        headers = self.headers
-        headers['Content-Type'] = 'text/plain'
-        print headers
+        print summary
+        for name, error in summary.failures:
+            print "%s: %s" % (name, error)
+        return summary
 
-        size = os.path.getsize(filename)
-        if size < 1024:
-            buf = fp.read(1024)
+    def _print_delete_progress(self, summary):
+        sys.stderr.write("\rdeleted %d, not found %d, failed %d" % (
+            summary.deleted, summary.not_found, len(summary.failures)))
 
-            response = requests.put(url, headers=headers, data=buf)
-            response.raise_for_status()
+    def _bulk_deleter(self):
+        return BulkDeleter(self,
+            workers=self.delete_workers,
+            rate=self.delete_rate,
+            progress=self._print_delete_progress)
 
-            print response.status_code
-        else:
-            """ Upload segments """
-            segment_number = 0
-            digit = len(str(int(round(size / 1024) + 1)))
-            
-            while True:
-                buf = fp.read(1024)
-                if buf:
-                    segment_url = url + '/' + str(segment_number).zfill(digit)
-                    print segment_url
-                    response = requests.put(segment_url, headers=headers, data=buf)
-                    response.raise_for_status()
-                    segment_number = segment_number + 1
-                else:
-                    break
-
-            """ Create a manifest file """
-            manifest = path + filename
-            manifest = manifest.split('/', 1)[1]
-            headers['X-Object-Manifest'] = manifest
-            print headers['X-Object-Manifest']
-            print url
-            response = requests.put(url, headers=headers, data='')
-            response.raise_for_status()
-    
-    def download_object(self, path):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + path
-
-        print url
-
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
+    def delete_objects(self, path):
+        """Delete every object under a '/container/prefix' path"""
+        container, prefix = split_path(path)
 
-        print response.text
+        summary = self._bulk_deleter().delete_prefix(container, prefix)
+        sys.stderr.write("\n")
 
-    def delete_object(self, path):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + path
+        print summary
+        for name, error in summary.failures:
+            print "%s: %s" % (name, error)
+        return summary
 
-        print url
+    def purge_container(self, container):
+        """Delete a container together with all of its objects"""
+        container = container.strip('/')
 
-        response = requests.delete(url, headers=self.headers)
-        response.raise_for_status()
+        summary = self._bulk_deleter().purge_container(container)
+        sys.stderr.write("\n")
 
-        print response.status_code
+        print summary
+        for name, error in summary.failures:
+            print "%s: %s" % (name, error)
+        return summary
 
     def get_container_metadata(self, container):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + container
-        print url
-        response = requests.head(url, headers=self.headers)
-
-        print response.status_code
-        print response.text
-        print response.headers
-
-        #print response.headers['x-account-object-count']
+        headers = head_container(self, container.strip('/'))
+        self._print_headers(headers)
+        return headers
 
     def create_container(self, container):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + container
-        response = requests.put(url, headers=self.headers)
-
-        print response.status_code
+        create_container(self, container.strip('/'))
+        print "created", container
 
     def delete_container(self, container):
-        url = self.swift_endpoint + '/v1/AUTH_' + self.tenant_id
-        url = url + container
-        response = requests.delete(url, headers=self.headers)
-
-        print response.status_code
+        delete_container(self, container.strip('/'))
+        print "deleted", container
+
+    def command_list(self, args):
+        self.get_objects(args.path, full=args.full, delimiter=args.delimiter)
+
+    def command_du(self, args):
+        self.disk_usage(args.path, max_depth=args.max_depth,
+            use_index=args.use_index, manifests=args.manifests)
+
+    def command_stat(self, args):
+        container, object_name = split_path(args.path)
+        if args.recursive:
+            self.stat_objects(args.path)
+        elif object_name:
+            self.get_object_metadata(container, object_name)
+        else:
+            self.get_container_metadata(container)
+
+    def command_upload(self, args):
+        for filename in args.filenames:
+            if filename != '-' and os.path.isfile(filename) and \
+                    os.path.getsize(filename) > self.segment_size:
+                self.upload_large_object(args.path, filename)
+            else:
+                self.upload_object(args.path, filename)
+
+    def command_download(self, args):
+        if args.parallel and args.filename is not None:
+            self.download_large_object(args.path, args.filename)
+        else:
+            self.download_object(args.path, args.filename,
+                resume=args.resume)
+
+    def command_delete(self, args):
+        container, object_name = split_path(args.path)
+        if args.recursive:
+            summary = self.delete_objects(args.path)
+            return 1 if summary.failures else 0
+        elif object_name and not object_name.endswith('/'):
+            self.delete_object(args.path)
+        else:
+            raise ValueError("%s is not an object, use -r to delete "
+                             "everything under it" % args.path)
+
+    def command_mkdir(self, args):
+        self.create_container(args.container)
+
+    def command_rmdir(self, args):
+        self.delete_container(args.container)
+
+    def command_copy(self, args):
+        if args.recursive:
+            summary = self.copy_objects(args.source, args.destination,
+                move=args.move, flatten=args.flatten)
+            return 1 if summary.failures else 0
+        self.copy_object(args.source, args.destination, move=args.move,
+            flatten=args.flatten)
+
+    def command_purge(self, args):
+        summary = self.purge_container(args.container)
+        return 1 if summary.failures else 0
+
+    def command_sync(self, args):
+        summary = self.sync_directory(args.local_dir, args.path,
+            delete=args.delete_orphans, checksum=args.checksum,
+            use_index=args.use_index)
+        return 1 if summary.failures else 0
+
+    def command_index(self, args):
+        self.index_container(args.container, full=args.full)
+
+    def command_search(self, args):
+        self.search_index(args.container, args.pattern)
+
+    def command_journals(self, args):
+        if args.action == 'list':
+            self.list_journals()
+        else:
+            self.clean_journals(None if args.all else args.max_age * 86400)
+
+    def command_batch(self, args):
+        workers = args.jobs
+        if workers is None:
+            workers = self.batch_workers
+
+        if args.filename == '-':
+            return self.run_batch(sys.stdin, workers)
+        fp = open(args.filename)
+        try:
+            return self.run_batch(fp, workers)
+        finally:
+            fp.close()
+
+    def run_batch(self, lines, workers=DEFAULT_BATCH_WORKERS):
+        """Run one command per line over this client's session.
+
+        Lines are read lazily and parsed like the command line ('#'
+        starts a comment); up to `workers` of them run at once, so their
+        order is only kept with a single worker.  A failing line, one that
+        raises or returns a nonzero exit status, is reported on stderr and
+        does not stop the batch.  Returns the exit status: 0 when every
+        line succeeded.
+        """
+
+        total = [0]
+        failed = [0]
+
+        def report(number, line, error):
+            failed[0] += 1
+            sys.stderr.write("line %d: %s: %s\n" % (number, line, error))
+
+        def operations():
+            for number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                total[0] += 1
+                try:
+                    args = self.batch_parser.parse_args(shlex.split(line))
+                except (BatchLineError, ValueError) as e:
+                    report(number, line, e)
+                    continue
+                yield number, line, args
+
+        def run(operation):
+            args = operation[2]
+            return args.func(args)
+
+        self.session.ensure_pool_size(workers)
+        stdout = sys.stdout
+        sys.stdout = LineWriter(stdout)
+        try:
+            for (number, line, _), status, exc_info in imap_unordered(run,
+                    operations(), workers):
+                if exc_info is not None:
+                    report(number, line, exc_info[1])
+                elif status:
+                    report(number, line, "exit status %d" % status)
+        finally:
+            sys.stdout.flush()
+            sys.stdout = stdout
+
+        sys.stderr.write("batch: %d commands, %d failed\n" % (
+            total[0], failed[0]))
+        return 1 if failed[0] else 0
 
     def run(self):
         return None 
 
 def main():
     swiftclient = SwiftClient()
-    swiftclient.get_objects('/')
-    #swiftclient.get_container_metadata('/backup')
-    #swiftclient.create_container('/joonghyunlee')
-    swiftclient.get_objects('/backup_segments')
-    swiftclient.get_object_metadata('/backup_segments', 'joonghyunlee/')
-    swiftclient.get_container_metadata('/backup_segments/joonghyunlee')
-    #swiftclient.upload_object('/backup_segments/joonghyunlee/', 'test.file')
-    #swiftclient.upload_object('/backup_segments/joonghyunlee/', 'err.out')
-    #swiftclient.delete_object('/backup_segments/joonghyunlee//test.file')
-    swiftclient.download_object('/backup_segments/joonghyunlee/err.out')
-    #swiftclient.delete_container('/joonghyunlee')
-    #swiftclient.get_objects('/')
-    #swiftclient.create_container('TT/Fuck')
+    try:
+        return swiftclient.args.func(swiftclient.args)
+    except (requests.RequestException, UploadError, DownloadError,
+            EnvironmentError, ValueError) as e:
+        sys.stderr.write("error: %s\n" % e)
+        return 1
+    finally:
+        if swiftclient.args.stats:
+            sys.stderr.write("%s\n%s\n" % (
+                swiftclient.instrumentation.metrics.report(),
+                swiftclient.session.stats()))
+            if swiftclient.controller is not None:
+                sys.stderr.write("%s\n" % swiftclient.controller.report())
+        swiftclient.instrumentation.export(swiftclient.session)
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
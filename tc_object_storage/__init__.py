@@ -0,0 +1 @@
+"""Shared helpers for the TOAST Cloud Object Storage (Swift) tools."""
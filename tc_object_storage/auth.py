@@ -0,0 +1,210 @@
+import calendar
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from requests.auth import AuthBase
+
+from tc_object_storage.common import conf_get
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'),
+                                 '.tc-object-storage', 'tokens')
+DEFAULT_REFRESH_MARGIN = 300
+
+
+def parse_expires(expires):
+    """Convert Keystone's '2016-01-01T00:00:00[.000000]Z' to epoch seconds."""
+
+    expires = expires.rstrip('Z').split('.', 1)[0]
+    return calendar.timegm(time.strptime(expires, '%Y-%m-%dT%H:%M:%S'))
+
+
+class TokenCache(object):
+    """Keystone tokens shared between processes through the filesystem.
+
+    Every (keystone endpoint, username, project) has its own JSON file in
+    cache_dir holding the token, tenant id and expiry time.  The directory
+    is created 0700 and files are written 0600, atomically.  A token is
+    only handed out while it is valid for more than refresh_margin
+    seconds, so it is replaced before Swift starts rejecting it.  Without
+    cache_dir tokens are only kept for the life of the process.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+                 refresh_margin=DEFAULT_REFRESH_MARGIN):
+        self.cache_dir = cache_dir
+        self.refresh_margin = refresh_margin
+        self._memory = {}
+
+    @classmethod
+    def from_config(cls, conf):
+        """Build a cache from the optional [auth] section of setup.ini"""
+
+        cache_dir = conf_get(conf, 'auth', 'token_cache_dir',
+                             DEFAULT_CACHE_DIR)
+        if not conf_get(conf, 'auth', 'token_cache', True, bool):
+            cache_dir = None
+
+        return cls(cache_dir=cache_dir,
+                   refresh_margin=conf_get(conf, 'auth', 'refresh_margin',
+                                           DEFAULT_REFRESH_MARGIN, int))
+
+    @staticmethod
+    def key(keystone_endpoint, username, project_id):
+        return hashlib.sha1('\n'.join([keystone_endpoint, username,
+                                       project_id])).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def is_fresh(self, expires):
+        return expires - time.time() > self.refresh_margin
+
+    def get(self, key):
+        """Return (token, tenant_id, expires) or None if missing/expiring"""
+
+        entry = self._memory.get(key)
+        if entry is None and self.cache_dir is not None:
+            try:
+                fp = open(self._path(key))
+                try:
+                    data = json.load(fp)
+                finally:
+                    fp.close()
+                entry = (data['token'].encode('utf-8'),
+                         data['tenant_id'].encode('utf-8'),
+                         data['expires'])
+            except (IOError, ValueError, KeyError):
+                return None
+
+        if entry is None or not self.is_fresh(entry[2]):
+            return None
+
+        self._memory[key] = entry
+        return entry
+
+    def put(self, key, token, tenant_id, expires):
+        self._memory[key] = (token, tenant_id, expires)
+        if self.cache_dir is None:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        """ mkstemp creates the file 0600, rename makes it visible at once """
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            os.write(fd, json.dumps({'token': token, 'tenant_id': tenant_id,
+                                     'expires': expires}))
+        finally:
+            os.close(fd)
+        os.rename(tmp, self._path(key))
+
+    def invalidate(self, key):
+        self._memory.pop(key, None)
+        if self.cache_dir is None:
+            return
+
+        try:
+            os.remove(self._path(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def login(client, force=False):
+    """Set client's token and tenant id, from the cache when possible.
+
+    client needs keystone_endpoint, username, project_id, headers,
+    token_cache and a _get_token() returning (token, tenant_id, expires).
+    """
+
+    cache = client.token_cache
+    key = cache.key(client.keystone_endpoint, client.username,
+                    client.project_id)
+
+    entry = None if force else cache.get(key)
+    if entry is None:
+        if force:
+            cache.invalidate(key)
+        token, tenant_id, expires = client._get_token()
+        entry = (token, tenant_id, parse_expires(expires))
+        cache.put(key, *entry)
+
+    token, client.tenant_id, client.token_expires = entry
+    client.headers['X-Auth-Token'] = token
+    return token
+
+
+class TokenAuth(AuthBase):
+    """requests auth hook keeping a client's Keystone token valid.
+
+    Installed as session.auth, it re-authenticates before a request when
+    the token is about to expire, and re-authenticates and resends a
+    request once when Swift answers 401 anyway (token revoked, clock
+    skew).  The resent request goes through the client's session, so its
+    observers and concurrency controller see it like any other; a body
+    that cannot be rewound (a generator, a pipe) is not resent and the
+    401 is returned.  Requests to Keystone itself are left alone.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+
+    def _refresh(self, rejected_token=None):
+        with self.lock:
+            current = self.client.headers.get('X-Auth-Token')
+            if rejected_token is not None and rejected_token != current:
+                """ Another thread already replaced the rejected token """
+                return current
+            if rejected_token is None and \
+                    self.client.token_cache.is_fresh(self.client.token_expires):
+                return current
+            return login(self.client, force=rejected_token is not None)
+
+    def __call__(self, request):
+        if request.url.startswith(self.client.keystone_endpoint +
+                                  '/identity/'):
+            return request
+
+        if not self.client.token_cache.is_fresh(self.client.token_expires):
+            self._refresh()
+
+        request.headers['X-Auth-Token'] = self.client.headers['X-Auth-Token']
+        request.register_hook('response', self.handle_401)
+        return request
+
+    def handle_401(self, response, **kwargs):
+        request = response.request
+        if response.status_code != 401 or getattr(request, 'reauthenticated',
+                                                   False):
+            return response
+
+        body = request.body
+        if body is not None and not isinstance(body, basestring):
+            """ A streamed body that cannot be rewound is not resent """
+            if not hasattr(body, 'seek'):
+                return response
+            body.seek(0)
+
+        response.content
+        response.close()
+
+        token = self._refresh(request.headers.get('X-Auth-Token'))
+
+        retry = request.copy()
+        retry.headers['X-Auth-Token'] = token
+        retry.reauthenticated = True
+
+        new_response = self.client.session.send(retry, **kwargs)
+        new_response.history.append(response)
+        new_response.request = retry
+        return new_response
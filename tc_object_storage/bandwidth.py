@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+
+from tc_object_storage.common import conf_get, parse_size
+
+DEFAULT_BURST = 256 * 1024
+UNLIMITED = ('', '0', 'none', 'off', 'unlimited')
+
+PERIOD_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*='
+                       r'\s*(\S+)\s*$')
+
+
+def parse_rate(value):
+    """Bytes per second from '512K', '10M', ...; None for unlimited"""
+
+    if value is None or str(value).strip().lower() in UNLIMITED:
+        return None
+    rate = parse_size(str(value).strip())
+    return rate or None
+
+
+class Schedule(object):
+    """Bandwidth limits by local time of day.
+
+    Periods are (start, end, rate) with start and end in minutes after
+    midnight; a period whose end comes before its start runs over
+    midnight.  The first period the time falls in gives the rate, the
+    default applies outside of them all.
+    """
+
+    def __init__(self, periods=(), default=None):
+        self.periods = list(periods)
+        self.default = default
+
+    @classmethod
+    def parse(cls, text, default=None):
+        """'08:00-18:00=1M, 18:00-23:00=unlimited' to a Schedule"""
+
+        periods = []
+        for period in (text or '').split(','):
+            if not period.strip():
+                continue
+            match = PERIOD_RE.match(period)
+            if match is None:
+                raise ValueError("invalid bandwidth period: %r" % period)
+            start_hour, start_minute, end_hour, end_minute, rate = \
+                match.groups()
+            periods.append((int(start_hour) * 60 + int(start_minute),
+                            int(end_hour) * 60 + int(end_minute),
+                            parse_rate(rate)))
+        return cls(periods, default)
+
+    def rate_at(self, now=None):
+        moment = time.localtime(now)
+        minute = moment.tm_hour * 60 + moment.tm_min
+        for start, end, rate in self.periods:
+            if start <= end:
+                if start <= minute < end:
+                    return rate
+            elif minute >= start or minute < end:
+                return rate
+        return self.default
+
+
+class TokenBucket(object):
+    """`rate` bytes per second with bursts of up to `burst` bytes.
+
+    reserve() takes the bytes right away, going into debt if the bucket
+    is short, and returns how long the caller must wait before sending
+    them; concurrent callers so queue up in the order they came.
+    """
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+            return max(-self.tokens / self.rate, 0.0)
+
+
+class TransferThrottle(object):
+    """The bandwidth one transfer (a file, all its segments or ranges) uses.
+
+    Its streams call consume() with every chunk before it is sent, or
+    once it was received; the transfer's own cap, if any, is applied
+    first, then the share of the global limit.
+    """
+
+    def __init__(self, limiter, rate=None):
+        self.limiter = limiter
+        self.bucket = None
+        if rate:
+            self.bucket = TokenBucket(rate, limiter.burst)
+        self.finish = 0.0
+
+    def consume(self, size):
+        if not size:
+            return
+        if self.bucket is not None:
+            delay = self.bucket.reserve(size)
+            if delay > 0:
+                time.sleep(delay)
+        self.limiter.consume(self, size)
+
+
+class BandwidthLimiter(object):
+    """Global token bucket shared by every upload and download stream.
+
+    The global rate is taken from `schedule` at the time of each chunk,
+    so limits follow the time of day; transfers get a TransferThrottle
+    from transfer(), capped at transfer_rate each.  Chunks waiting for
+    the global bucket go out in start-time fair queueing order: every
+    transfer is charged the bytes it sent, whatever the number of its
+    concurrent streams, so parallel transfers split the bandwidth
+    evenly and a transfer on its own may use all of it.
+    """
+
+    def __init__(self, schedule=None, transfer_rate=None,
+                 burst=DEFAULT_BURST):
+        self.schedule = schedule or Schedule()
+        self.transfer_rate = transfer_rate
+        self.burst = burst
+
+        self.condition = threading.Condition()
+        self.tokens = burst
+        self.updated = time.time()
+        self.virtual = 0.0
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    @classmethod
+    def from_config(cls, conf, rate=None, transfer_rate=None):
+        """A limiter after the optional [bandwidth] section, or None
+
+        rate and transfer_rate (from the command line) override limit and
+        transfer_limit there; None comes back when nothing is limited.
+        """
+
+        if rate is None:
+            rate = conf_get(conf, 'bandwidth', 'limit', None, parse_rate)
+        if transfer_rate is None:
+            transfer_rate = conf_get(conf, 'bandwidth', 'transfer_limit',
+                                     None, parse_rate)
+        schedule = Schedule.parse(conf_get(conf, 'bandwidth', 'schedule'),
+                                  rate)
+        if not (rate or transfer_rate or schedule.periods):
+            return None
+        return cls(schedule, transfer_rate,
+                   conf_get(conf, 'bandwidth', 'burst', DEFAULT_BURST,
+                            parse_size))
+
+    def transfer(self):
+        return TransferThrottle(self, self.transfer_rate)
+
+    def consume(self, throttle, size):
+        with self.condition:
+            tag = max(self.virtual, throttle.finish) + size
+            throttle.finish = tag
+            entry = (tag, next(self.sequence))
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    now = time.time()
+                    rate = self.schedule.rate_at(now)
+                    if rate:
+                        self.tokens = min(self.burst, self.tokens +
+                                          (now - self.updated) * rate)
+                    else:
+                        self.tokens = self.burst
+                    self.updated = now
+
+                    """ A chunk larger than a burst leaves a debt """
+                    if self.waiting[0] != entry:
+                        timeout = 1
+                    elif self.tokens >= min(size, self.burst):
+                        break
+                    else:
+                        timeout = (min(size, self.burst) - self.tokens) / rate
+                    self.condition.wait(timeout)
+
+                self.tokens -= size
+                self.virtual = tag
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+
+def transfer_throttle(client):
+    """A TransferThrottle for a new transfer of client, None if unlimited"""
+
+    limiter = client.session.bandwidth
+    if limiter is None:
+        return None
+    return limiter.transfer()
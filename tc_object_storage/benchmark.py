@@ -0,0 +1,323 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from tc_object_storage.auth import TokenAuth, TokenCache, login
+from tc_object_storage.common import format_size
+from tc_object_storage.download import ParallelDownloader, \
+    DEFAULT_DOWNLOAD_WORKERS
+from tc_object_storage.fake_swift import FakeSwift
+from tc_object_storage.listing import iter_listing_pages
+from tc_object_storage.pipeline import create_container, delete_object, \
+    get_object, put_object
+from tc_object_storage.segments import SegmentedUploader, \
+    DEFAULT_SEGMENT_WORKERS
+from tc_object_storage.session import PooledSession
+from tc_object_storage.workers import imap_unordered
+
+SCENARIOS = ('put', 'list', 'get', 'upload', 'download', 'delete')
+
+DEFAULT_OBJECTS = 1000
+DEFAULT_OBJECT_SIZE = 4 * 1024
+DEFAULT_LARGE_SIZE = 64 * 1024 * 1024
+DEFAULT_SEGMENT_SIZE = 8 * 1024 * 1024
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_ROUNDS = 3
+DEFAULT_WORKERS = 16
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list, 0 for an empty one"""
+
+    if not values:
+        return 0.0
+    rank = int(round(fraction * len(values) + 0.5)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class BenchmarkStats(object):
+    """Latencies and bytes of the operations of one scenario.
+
+    record() may be called from several threads; seconds is the wall
+    clock time of the whole scenario, set by the Benchmark.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.bytes = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def record(self, seconds, size=0):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.bytes += size
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+    @property
+    def operations(self):
+        return len(self.latencies)
+
+    @property
+    def ops_per_second(self):
+        if self.seconds <= 0:
+            return 0.0
+        return self.operations / self.seconds
+
+    @property
+    def throughput(self):
+        """Bytes per second over the wall clock time of the scenario"""
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / self.seconds
+
+    def latency(self, fraction):
+        return percentile(sorted(self.latencies), fraction)
+
+    def as_dict(self):
+        return {'scenario': self.name,
+                'operations': self.operations,
+                'errors': self.errors,
+                'seconds': self.seconds,
+                'ops_per_second': self.ops_per_second,
+                'p50': self.latency(0.50),
+                'p99': self.latency(0.99),
+                'bytes': self.bytes,
+                'bytes_per_second': self.throughput}
+
+    def __str__(self):
+        text = "%-9s %6d ops %9.1f ops/s  p50 %8.2f ms  p99 %8.2f ms" % (
+            self.name, self.operations, self.ops_per_second,
+            self.latency(0.50) * 1000, self.latency(0.99) * 1000)
+        if self.bytes:
+            text += "  %s/s" % format_size(self.throughput)
+        if self.errors:
+            text += "  %d errors" % self.errors
+        return text
+
+
+class BenchmarkClient(object):
+    """The client state the tc_object_storage operations run on.
+
+    Set up like SwiftClient and TCObjectStorageClient: a PooledSession
+    built from the [connection] section of conf, kept authenticated by
+    TokenAuth.  Tokens are not cached on disk.  A ConcurrencyController,
+    if given, gates the requests of the session.
+    """
+
+    def __init__(self, endpoint, conf=None, username='bench',
+                 password='bench', project_id='bench', controller=None):
+        self.keystone_endpoint = endpoint
+        self.swift_endpoint = endpoint
+        self.username = username
+        self.password = password
+        self.project_id = project_id
+
+        self.headers = dict()
+        self.headers['Content-Type'] = 'application/json'
+
+        if conf is None:
+            self.session = PooledSession()
+        else:
+            self.session = PooledSession.from_config(conf)
+        if controller is not None:
+            self.session.set_controller(controller)
+        self.token_cache = TokenCache(cache_dir=None)
+        self.session.auth = TokenAuth(self)
+        login(self)
+
+    def _get_token(self):
+        request = {'auth': {'passwordCredentials': {
+                                'username': self.username,
+                                'password': self.password},
+                            'tenantName': self.project_id}}
+
+        url = self.keystone_endpoint + '/identity/v2.0/tokens'
+        response = self.session.post(url, data=json.dumps(request),
+                                     headers=self.headers)
+        response.raise_for_status()
+
+        token = response.json()['access']['token']
+        return token['id'], token['tenant']['id'], token['expires']
+
+
+class Benchmark(object):
+    """Time the client operations against a Swift endpoint.
+
+    The scenarios, in the order they depend on each other:
+
+      put       PUT `objects` small objects, `workers` at a time
+      list      read the container listing, page_size names per request
+      get       GET every small object back, `workers` at a time
+      upload    segmented upload of a large_size file, `rounds` times
+      download  parallel download of that large object, `rounds` times
+      delete    DELETE every small object, `workers` at a time
+
+    Every operation's latency is recorded in the scenario's
+    BenchmarkStats.  Scratch files are written to a temporary directory
+    removed by close().
+    """
+
+    def __init__(self, client, container='benchmark',
+                 objects=DEFAULT_OBJECTS, object_size=DEFAULT_OBJECT_SIZE,
+                 large_size=DEFAULT_LARGE_SIZE,
+                 segment_size=DEFAULT_SEGMENT_SIZE,
+                 segment_workers=DEFAULT_SEGMENT_WORKERS,
+                 download_workers=DEFAULT_DOWNLOAD_WORKERS,
+                 manifest='dlo', page_size=DEFAULT_PAGE_SIZE,
+                 rounds=DEFAULT_ROUNDS, workers=DEFAULT_WORKERS):
+        self.client = client
+        self.container = container
+        self.objects = objects
+        self.object_size = object_size
+        self.large_size = large_size
+        self.segment_size = segment_size
+        self.segment_workers = segment_workers
+        self.download_workers = download_workers
+        self.manifest = manifest
+        self.page_size = page_size
+        self.rounds = rounds
+        self.workers = workers
+        self.scratch = tempfile.mkdtemp(prefix='tc-object-storage-bench-')
+
+        client.session.ensure_pool_size(max(workers, segment_workers,
+                                            download_workers))
+
+    def close(self):
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def _names(self):
+        return ['small/%08d' % number for number in xrange(self.objects)]
+
+    def _concurrently(self, stats, operation, items):
+        def timed(item):
+            started = time.time()
+            size = operation(item)
+            stats.record(time.time() - started, size)
+
+        for _, _, exc_info in imap_unordered(timed, items, self.workers):
+            if exc_info is not None:
+                stats.error()
+
+    def run_put(self, stats):
+        data = os.urandom(self.object_size)
+
+        def put(name):
+            put_object(self.client, self.container, name, data)
+            return len(data)
+
+        self._concurrently(stats, put, self._names())
+
+    def run_list(self, stats):
+        pages = iter_listing_pages(self.client, self.container,
+                                   page_size=self.page_size)
+        while True:
+            started = time.time()
+            try:
+                pages.next()
+            except StopIteration:
+                return
+            stats.record(time.time() - started)
+
+    def run_get(self, stats):
+        def get(name):
+            return len(get_object(self.client, self.container, name))
+
+        self._concurrently(stats, get, self._names())
+
+    def _large_file(self):
+        filename = os.path.join(self.scratch, 'large')
+        if not os.path.exists(filename):
+            fp = open(filename, 'wb')
+            try:
+                written = 0
+                while written < self.large_size:
+                    chunk = os.urandom(min(1024 * 1024,
+                                           self.large_size - written))
+                    fp.write(chunk)
+                    written += len(chunk)
+            finally:
+                fp.close()
+        return filename
+
+    def run_upload(self, stats):
+        filename = self._large_file()
+        uploader = SegmentedUploader(self.client,
+                                     segment_size=self.segment_size,
+                                     workers=self.segment_workers,
+                                     manifest=self.manifest)
+        for _ in xrange(self.rounds):
+            started = time.time()
+            result = uploader.upload(self.container, 'large', filename)
+            stats.record(time.time() - started, result.size)
+
+    def run_download(self, stats):
+        downloader = ParallelDownloader(self.client,
+                                        workers=self.download_workers,
+                                        range_size=self.segment_size)
+        filename = os.path.join(self.scratch, 'downloaded')
+        for _ in xrange(self.rounds):
+            started = time.time()
+            result = downloader.download(self.container, 'large', filename)
+            stats.record(time.time() - started, result.size)
+            os.remove(filename)
+
+    def run_delete(self, stats):
+        def delete(name):
+            delete_object(self.client, self.container, name)
+            return 0
+
+        self._concurrently(stats, delete, self._names())
+
+    def run(self, scenarios=SCENARIOS, progress=None):
+        """Run the scenarios in order, return their BenchmarkStats"""
+
+        create_container(self.client, self.container)
+
+        results = []
+        for name in scenarios:
+            if name not in SCENARIOS:
+                raise ValueError("unknown scenario %r, choose from %s" %
+                                 (name, ', '.join(SCENARIOS)))
+            stats = BenchmarkStats(name)
+            started = time.time()
+            getattr(self, 'run_' + name)(stats)
+            stats.seconds = time.time() - started
+            results.append(stats)
+            if progress is not None:
+                progress(stats)
+        return results
+
+
+def run_local(scenarios=SCENARIOS, latency=0.0, conf=None, progress=None,
+              max_in_flight=None, controller=None, **options):
+    """Run a Benchmark against a FakeSwift started for the occasion.
+
+    latency is the time in seconds every request is held by the server,
+    max_in_flight the requests it serves at once before answering 429,
+    and controller an optional ConcurrencyController for the client; the
+    other options are passed to Benchmark.  Returns (results, server),
+    the server being stopped already; its `requests` counters tell how
+    many requests of each method were sent.
+    """
+
+    server = FakeSwift(latency=latency, max_in_flight=max_in_flight).start()
+    try:
+        client = BenchmarkClient(server.url, conf, controller=controller)
+        benchmark = Benchmark(client, **options)
+        try:
+            results = benchmark.run(scenarios, progress)
+        finally:
+            benchmark.close()
+            client.session.close()
+    finally:
+        server.stop()
+    return results, server
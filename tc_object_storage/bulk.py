@@ -0,0 +1,183 @@
+import itertools
+import time
+
+import requests
+
+from tc_object_storage.common import account_url, cluster_info, \
+    container_url, object_url, quote
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.workers import RateLimiter, imap_unordered
+
+DEFAULT_DELETE_WORKERS = 8
+DEFAULT_BULK_BATCH_SIZE = 1000
+
+
+class DeleteSummary(object):
+    def __init__(self):
+        self.deleted = 0
+        self.not_found = 0
+        self.failures = []
+        self.started = time.time()
+        self.seconds = 0.0
+
+    @property
+    def processed(self):
+        return self.deleted + self.not_found + len(self.failures)
+
+    def finish(self):
+        self.seconds = time.time() - self.started
+        return self
+
+    def __str__(self):
+        return "deleted %d, not found %d, failed %d in %.2f s" % (
+            self.deleted, self.not_found, len(self.failures), self.seconds)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkDeleter(object):
+    """Delete many objects at once.
+
+    When the cluster advertises the bulk-delete middleware in /info (or
+    use_bulk is forced on), names are sent in batches of up to batch_size
+    per POST ?bulk-delete; otherwise every object gets its own DELETE.
+    Either way `workers` requests run concurrently, and at most `rate`
+    requests per second are started.  progress, if given, is called with
+    the running DeleteSummary after every request.
+    """
+
+    def __init__(self, client, workers=DEFAULT_DELETE_WORKERS, rate=None,
+                 use_bulk=None, batch_size=DEFAULT_BULK_BATCH_SIZE,
+                 progress=None):
+        self.client = client
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.use_bulk = use_bulk
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def bulk_batch_size(self):
+        """Return the batch size to use, or None without bulk-delete"""
+
+        info = cluster_info(self.client).get('bulk_delete')
+        if self.use_bulk is False or (info is None and not self.use_bulk):
+            return None
+
+        limit = (info or {}).get('max_deletes_per_request', self.batch_size)
+        return min(self.batch_size, limit)
+
+    def delete_one(self, container, name):
+        """Return 'deleted' or 'not_found', raise on any other answer"""
+
+        self.limiter.wait()
+        response = self.client.session.delete(
+            object_url(self.client, container, name),
+            headers=self.client.headers)
+        if response.status_code == 404:
+            return 'not_found'
+        response.raise_for_status()
+        return 'deleted'
+
+    def delete_batch(self, container, names):
+        """Return (deleted, not_found, [(name, error), ...]) of one POST"""
+
+        self.limiter.wait()
+        headers = dict(self.client.headers)
+        headers['Content-Type'] = 'text/plain'
+        headers['Accept'] = 'application/json'
+        body = '\n'.join(quote('/' + container + '/' + name)
+                         for name in names)
+
+        response = self.client.session.post(
+            account_url(self.client) + '?bulk-delete', headers=headers,
+            data=body)
+        response.raise_for_status()
+
+        result = response.json()
+        errors = [(name, status) for name, status in result.get('Errors', [])]
+        status = result.get('Response Status', '200 OK')
+        if not errors and not status.startswith('2'):
+            errors = [(name, status) for name in names]
+
+        return (result.get('Number Deleted', 0),
+                result.get('Number Not Found', 0), errors)
+
+    def _record(self, summary):
+        if self.progress is not None:
+            self.progress(summary)
+
+    def delete_objects(self, container, names, summary=None):
+        """Delete every name of the (possibly lazy) iterable names"""
+
+        if summary is None:
+            summary = DeleteSummary()
+
+        batch_size = self.bulk_batch_size()
+        if batch_size is not None:
+            def delete(batch):
+                try:
+                    return self.delete_batch(container, batch)
+                except requests.HTTPError as e:
+                    """ Middleware not deployed after all """
+                    if e.response.status_code not in (400, 404, 405, 412):
+                        raise
+                    results = {'deleted': 0, 'not_found': 0}
+                    errors = []
+                    for name in batch:
+                        try:
+                            results[self.delete_one(container, name)] += 1
+                        except requests.RequestException as error:
+                            errors.append((name, str(error)))
+                    return results['deleted'], results['not_found'], errors
+
+            for batch, result, exc_info in imap_unordered(
+                    delete, _batches(names, batch_size), self.workers):
+                if exc_info is not None:
+                    summary.failures.extend((name, str(exc_info[1]))
+                                            for name in batch)
+                else:
+                    summary.deleted += result[0]
+                    summary.not_found += result[1]
+                    summary.failures.extend(result[2])
+                self._record(summary)
+        else:
+            def delete(name):
+                return self.delete_one(container, name)
+
+            for name, result, exc_info in imap_unordered(delete, names,
+                                                         self.workers):
+                if exc_info is not None:
+                    summary.failures.append((name, str(exc_info[1])))
+                elif result == 'deleted':
+                    summary.deleted += 1
+                else:
+                    summary.not_found += 1
+                self._record(summary)
+
+        return summary.finish()
+
+    def delete_prefix(self, container, prefix=None):
+        """Delete every object of container whose name starts with prefix"""
+
+        names = iter_listing(self.client, container, prefix=prefix)
+        return self.delete_objects(container, names)
+
+    def purge_container(self, container):
+        """Delete every object of container, then the container itself"""
+
+        summary = self.delete_prefix(container)
+
+        response = self.client.session.delete(
+            container_url(self.client, container),
+            headers=self.client.headers)
+        if response.status_code >= 400:
+            summary.failures.append((container, "%d %s" % (
+                response.status_code, response.reason)))
+        return summary.finish()
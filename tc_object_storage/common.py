@@ -0,0 +1,113 @@
+import ConfigParser
+import re
+import urllib
+
+import requests
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+
+
+def conf_get(conf, section, option, default=None, type=str):
+    """Read an optional setting from setup.ini, falling back to default."""
+
+    try:
+        if type is bool:
+            return conf.getboolean(section, option)
+        return type(conf.get(section, option))
+    except (ConfigParser.NoSectionError, ConfigParser.NoOptionError):
+        return default
+
+
+def parse_size(value):
+    """Convert '512', '100M', '1.5G' or '2GiB' to a number of bytes."""
+
+    if isinstance(value, (int, long)):
+        return value
+
+    match = SIZE_RE.match(value)
+    if match is None:
+        raise ValueError("invalid size: %r" % value)
+
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size):
+    """Return a human readable representation of a number of bytes."""
+
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(size) < 1024:
+            return "%.1f %s" % (size, unit)
+        size = size / 1024.0
+    return "%.1f TiB" % size
+
+
+class TransferResult(object):
+    def __init__(self, object_name, size, seconds, etag=None):
+        self.object_name = object_name
+        self.size = size
+        self.seconds = seconds
+        self.etag = etag
+
+    @property
+    def throughput(self):
+        """Bytes per second"""
+        if self.seconds <= 0:
+            return 0.0
+        return self.size / self.seconds
+
+    def __str__(self):
+        return "%s: %s in %.2f s, %s/s" % (
+            self.object_name, format_size(self.size), self.seconds,
+            format_size(self.throughput))
+
+
+def quote(name):
+    """URL-quote a container or object name, keeping '/' separators."""
+
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+    return urllib.quote(name, safe='/')
+
+
+def account_url(client):
+    """Return the Swift account URL of an authenticated client."""
+
+    return client.swift_endpoint + '/v1/AUTH_' + client.tenant_id
+
+
+def container_url(client, container):
+    return account_url(client) + '/' + quote(container)
+
+
+def object_url(client, container, object_name):
+    return container_url(client, container) + '/' + quote(object_name)
+
+
+def split_path(path):
+    """Split '/container/some/object' into ('container', 'some/object')."""
+
+    parts = path.lstrip('/').split('/', 1)
+    if len(parts) == 1:
+        return parts[0], ''
+    return parts[0], parts[1]
+
+
+def cluster_info(client):
+    """Return the cluster's /info capabilities, or {} if not published.
+
+    The answer is remembered on the client, it does not change while the
+    process runs.
+    """
+
+    info = getattr(client, '_cluster_info', None)
+    if info is None:
+        try:
+            response = client.session.get(client.swift_endpoint + '/info')
+            response.raise_for_status()
+            info = response.json()
+        except (requests.RequestException, ValueError):
+            info = {}
+        client._cluster_info = info
+    return info
@@ -0,0 +1,273 @@
+import email.utils
+import threading
+import time
+
+from tc_object_storage.common import conf_get
+
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_WINDOW = 1.0
+DEFAULT_DECREASE = 0.5
+DEFAULT_LATENCY_TOLERANCE = 2.0
+MAX_RETRY_AFTER = 60.0
+THROTTLE_STATUSES = (429, 503)
+
+""" Throughput this much below the previous window does not count as kept """
+THROUGHPUT_SLACK = 0.05
+""" Weight of each window in the smoothed latency of an operation """
+LATENCY_SMOOTHING = 0.2
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header, a delay or an HTTP date"""
+
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(email.utils.mktime_tz(parsed) - now, 0.0)
+
+
+class ConcurrencyController(object):
+    """AIMD limit on the requests a PooledSession has in flight.
+
+    Every request of the session takes a slot with acquire() before it
+    is sent and gives it back when its response arrived, or, for
+    streamed responses, once the response is closed; the worker pools
+    of the bulk operations can then all be sized to `maximum` and the
+    controller decides how many of their requests actually run.
+
+    As a session observer it looks at every completed request.  Each
+    `window` seconds the limit grows by one if the limit was reached in
+    the window and throughput (bytes, or requests when none moved, per
+    second) did not fall; until the first backoff, and while throughput
+    keeps rising with it, the limit doubles instead (slow start).  It is
+    multiplied by `decrease`, at most once per window, when a response
+    is 429 or 503 (retried ones included), when a request fails without
+    response, or when the window's mean latency rises above `tolerance`
+    times the latency of the earlier windows, smoothed per operation;
+    unlike the lowest latency ever seen, the usual latency at a limit
+    the cluster serves well does not count as congestion.  A Retry-After
+    also holds back every new request for that long.  The limit stays
+    between minimum and maximum; its changes are kept in `history` as
+    (time, limit, reason).
+    """
+
+    def __init__(self, initial=DEFAULT_INITIAL_CONCURRENCY,
+                 minimum=DEFAULT_MIN_CONCURRENCY,
+                 maximum=DEFAULT_MAX_CONCURRENCY, window=DEFAULT_WINDOW,
+                 decrease=DEFAULT_DECREASE,
+                 tolerance=DEFAULT_LATENCY_TOLERANCE):
+        self.minimum = max(int(minimum), 1)
+        self.maximum = max(int(maximum), self.minimum)
+        self.limit = float(min(max(int(initial), self.minimum),
+                               self.maximum))
+        self.window = window
+        self.decrease = decrease
+        self.tolerance = tolerance
+
+        self.condition = threading.Condition()
+        self.local = threading.local()
+        self.in_flight = 0
+        self.hold_until = 0.0
+        self.smoothed = {}
+        self.previous_rate = None
+        self.slow_start = True
+        self.last_decrease = 0.0
+        self.backoffs = 0
+        self.throttled = 0
+
+        self.started = time.time()
+        self.history = [(self.started, self.level, 'start')]
+        self._new_window(self.started)
+
+    @classmethod
+    def from_config(cls, conf, enabled=False):
+        """A controller after the optional [concurrency] section, or None
+
+        None unless `enabled` is forced or adaptive is set there.
+        """
+
+        if not (enabled or conf_get(conf, 'concurrency', 'adaptive', False,
+                                    bool)):
+            return None
+        return cls(
+            initial=conf_get(conf, 'concurrency', 'initial',
+                             DEFAULT_INITIAL_CONCURRENCY, int),
+            minimum=conf_get(conf, 'concurrency', 'min',
+                             DEFAULT_MIN_CONCURRENCY, int),
+            maximum=conf_get(conf, 'concurrency', 'max',
+                             DEFAULT_MAX_CONCURRENCY, int),
+            window=conf_get(conf, 'concurrency', 'window',
+                            DEFAULT_WINDOW, float),
+            decrease=conf_get(conf, 'concurrency', 'decrease',
+                              DEFAULT_DECREASE, float),
+            tolerance=conf_get(conf, 'concurrency', 'latency_tolerance',
+                               DEFAULT_LATENCY_TOLERANCE, float))
+
+    @property
+    def level(self):
+        return int(self.limit)
+
+    def _new_window(self, now):
+        self.window_started = now
+        self.requests = 0
+        self.bytes = 0
+        self.latencies = {}
+        self.saturated = self.in_flight >= self.level
+
+    def acquire(self):
+        """Wait for a slot; a thread already holding one passes through"""
+
+        """ Re-authentication sends its request from inside another one """
+        depth = getattr(self.local, 'depth', 0)
+        self.local.depth = depth + 1
+        if depth:
+            return
+
+        with self.condition:
+            while True:
+                now = time.time()
+                if now < self.hold_until:
+                    self.condition.wait(self.hold_until - now)
+                elif self.in_flight >= self.level:
+                    """ A timeout keeps KeyboardInterrupt deliverable """
+                    self.condition.wait(1)
+                else:
+                    break
+            self.in_flight += 1
+            if self.in_flight >= self.level:
+                self.saturated = True
+
+    def release(self):
+        self.local.depth -= 1
+        if self.local.depth:
+            return
+
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def __call__(self, record):
+        now = time.time()
+        with self.condition:
+            statuses = [record.status] + record.retry_statuses
+            if any(status in THROTTLE_STATUSES for status in statuses):
+                self.throttled += 1
+                delay = parse_retry_after(record.retry_after, now)
+                if delay:
+                    self.hold_until = max(self.hold_until,
+                                          now + min(delay, MAX_RETRY_AFTER))
+                self._decrease(now, 'throttled')
+                return
+            if record.status is None:
+                self._decrease(now, 'error')
+                return
+
+            latency = self.latencies.setdefault(record.operation, [0.0, 0])
+            latency[0] += record.seconds
+            latency[1] += 1
+
+            self.requests += 1
+            self.bytes += record.bytes_sent + record.bytes_received
+
+            if now - self.window_started >= self.window:
+                self._adjust(now)
+
+    def _latency_ratio(self):
+        """Window latency over the smoothed one, weighted by requests"""
+
+        total = requests = 0
+        for operation, (seconds, count) in self.latencies.items():
+            mean = seconds / count
+            smoothed = self.smoothed.get(operation)
+            if smoothed is None:
+                """ The first window of an operation only sets its latency """
+                self.smoothed[operation] = mean
+                continue
+            self.smoothed[operation] = smoothed + \
+                LATENCY_SMOOTHING * (mean - smoothed)
+            total += count * mean / max(smoothed, 0.001)
+            requests += count
+        return total / requests if requests else 0.0
+
+    def _adjust(self, now):
+        """Close the window: grow, shrink or keep the limit"""
+
+        seconds = now - self.window_started
+        if self.bytes:
+            rate = ('bytes', self.bytes / seconds)
+        else:
+            rate = ('requests', self.requests / seconds)
+
+        if self._latency_ratio() > self.tolerance:
+            self._decrease(now, 'latency')
+        else:
+            comparable = self.previous_rate is not None and \
+                self.previous_rate[0] == rate[0]
+            if comparable and \
+                    rate[1] < self.previous_rate[1] * (1 + THROUGHPUT_SLACK):
+                self.slow_start = False
+            kept = not comparable or \
+                rate[1] >= self.previous_rate[1] * (1 - THROUGHPUT_SLACK)
+            if self.saturated and kept and self.limit < self.maximum:
+                if self.slow_start:
+                    self._change(now, min(self.limit * 2, self.maximum),
+                                 'slow start')
+                else:
+                    self._change(now, min(self.limit + 1, self.maximum),
+                                 'throughput')
+            self.previous_rate = rate
+            self._new_window(now)
+
+    def _decrease(self, now, reason):
+        """ One congestion event is answered once, not per request """
+        if now - self.last_decrease < self.window:
+            return
+        self.last_decrease = now
+        self.backoffs += 1
+        self.slow_start = False
+        self._change(now, max(self.limit * self.decrease, self.minimum),
+                     reason)
+        self.previous_rate = None
+        self._new_window(now)
+
+    def _change(self, now, limit, reason):
+        level = self.level
+        self.limit = limit
+        if self.level != level:
+            self.history.append((now, self.level, reason))
+            self.condition.notify_all()
+
+    def as_dict(self):
+        with self.condition:
+            return {'limit': self.level,
+                    'minimum': self.minimum,
+                    'maximum': self.maximum,
+                    'in_flight': self.in_flight,
+                    'backoffs': self.backoffs,
+                    'throttled': self.throttled,
+                    'history': [{'time': when, 'limit': limit,
+                                 'reason': reason}
+                                for when, limit, reason in self.history]}
+
+    def report(self):
+        """The limit over time, as printed by --stats"""
+
+        with self.condition:
+            history = list(self.history)
+            lines = ["concurrency %d (%d-%d), %d backoffs, %d throttled" % (
+                self.level, self.minimum, self.maximum, self.backoffs,
+                self.throttled)]
+        for when, limit, reason in history:
+            lines.append("  %8.2f s  %3d  %s" % (when - self.started, limit,
+                                                 reason))
+        return '\n'.join(lines)
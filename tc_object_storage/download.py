@@ -0,0 +1,358 @@
+import hashlib
+import os
+import time
+import urllib
+
+from requests.exceptions import ChunkedEncodingError, ConnectionError, \
+    Timeout
+
+from tc_object_storage.bandwidth import transfer_throttle
+from tc_object_storage.common import TransferResult, object_url, split_path
+from tc_object_storage.journal import Journal
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.workers import imap_unordered
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_RESUME_ATTEMPTS = 5
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+
+class DownloadError(Exception):
+    """The downloaded data does not match the object stored in Swift."""
+
+
+class _Truncated(Exception):
+    """The connection ended before the whole body was received."""
+
+
+def is_verifiable(headers):
+    """Return True if the ETag is the MD5 of the body (not a manifest)."""
+
+    if 'X-Object-Manifest' in headers or 'X-Static-Large-Object' in headers:
+        return False
+    etag = headers.get('ETag', '')
+    return len(etag) == 32 and not etag.startswith('"')
+
+
+def content_end(response, position):
+    """Return the offset one past the last byte this response will send."""
+
+    content_range = response.headers.get('Content-Range')
+    if content_range is not None:
+        first_last = content_range.split()[-1].split('/', 1)[0]
+        return int(first_last.split('-', 1)[1]) + 1
+
+    length = response.headers.get('Content-Length')
+    if length is None:
+        return None
+    return position + int(length)
+
+
+def stream_object(client, container, object_name, out, offset=0, length=None,
+                  md5=None, etag=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  attempts=DEFAULT_RESUME_ATTEMPTS, throttle=None):
+    """Copy an object into the file-like out, chunk_size bytes at a time.
+
+    Only one chunk is ever held in memory.  The download starts at byte
+    offset and, if length is given, stops after length bytes.  When the
+    connection drops it is resumed with a Range request pinned to the
+    object's ETag (If-Match), up to `attempts` times.  If md5 is a hashlib
+    object already fed with the first offset bytes, the body is verified
+    against the object's ETag once complete.  Chunks are paced by
+    throttle, the bandwidth.TransferThrottle of the transfer this stream
+    is part of; without one the stream is a transfer of its own.
+    Returns the number of bytes written.
+    """
+
+    if throttle is None:
+        throttle = transfer_throttle(client)
+
+    url = object_url(client, container, object_name)
+    position = offset
+    end = None if length is None else offset + length
+    first = True
+    failures = 0
+
+    while True:
+        headers = dict(client.headers)
+        if end is not None:
+            headers['Range'] = 'bytes=%d-%d' % (position, end - 1)
+        elif position > 0:
+            headers['Range'] = 'bytes=%d-' % position
+        if etag is not None:
+            headers['If-Match'] = etag
+
+        try:
+            if end is not None and position >= end:
+                break
+
+            response = client.session.get(url, headers=headers, stream=True)
+
+            """ Closed on every path: its connection goes back to the pool """
+            try:
+                """ The object is already complete on our side """
+                if response.status_code == 416 and first:
+                    response.close()
+                    head = client.session.head(url, headers=client.headers)
+                    head.raise_for_status()
+                    etag = head.headers.get('ETag')
+                    if not is_verifiable(head.headers):
+                        md5 = None
+                    break
+
+                response.raise_for_status()
+                if 'Range' in headers and response.status_code != 206:
+                    raise DownloadError(
+                        "%s: server ignored the Range request" % object_name)
+
+                if first:
+                    first = False
+                    etag = response.headers.get('ETag')
+                    if end is None:
+                        end = content_end(response, position)
+                    if not is_verifiable(response.headers):
+                        md5 = None
+
+                for chunk in response.iter_content(chunk_size):
+                    if throttle is not None:
+                        throttle.consume(len(chunk))
+                    out.write(chunk)
+                    if md5 is not None:
+                        md5.update(chunk)
+                    position += len(chunk)
+            finally:
+                response.close()
+
+            if end is not None and position < end:
+                raise _Truncated()
+            break
+        except (ChunkedEncodingError, ConnectionError, Timeout, _Truncated):
+            failures += 1
+            if failures > attempts:
+                raise
+            time.sleep(min(0.5 * 2 ** failures, 10))
+
+    if md5 is not None and md5.hexdigest() != etag:
+        raise DownloadError("%s: received MD5 %s, expected ETag %s" %
+                            (object_name, md5.hexdigest(), etag))
+
+    return position - offset
+
+
+def download_object(client, container, object_name, filename, resume=False,
+                    verify=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream an object into a local file.
+
+    With resume set, an existing partial file is continued from its current
+    size instead of being overwritten.
+    """
+
+    started = time.time()
+
+    offset = 0
+    md5 = hashlib.md5() if verify else None
+    mode = 'wb'
+    if resume and os.path.exists(filename):
+        offset = os.path.getsize(filename)
+        mode = 'ab'
+        if md5 is not None:
+            fp = open(filename, 'rb')
+            for chunk in iter(lambda: fp.read(chunk_size), ''):
+                md5.update(chunk)
+            fp.close()
+
+    fp = open(filename, mode)
+    try:
+        size = stream_object(client, container, object_name, fp,
+                             offset=offset, md5=md5, chunk_size=chunk_size)
+    finally:
+        fp.close()
+
+    return TransferResult(object_name, size, time.time() - started)
+
+
+class Part(object):
+    """A piece of the target file: a byte range, or a whole segment."""
+
+    def __init__(self, offset, size, container=None, object_name=None,
+                 etag=None):
+        self.offset = offset
+        self.size = size
+        self.container = container
+        self.object_name = object_name
+        self.etag = etag
+
+
+class ParallelDownloader(object):
+    """Download one object over several connections at once.
+
+    The object is HEADed first.  Segments of DLO and SLO manifests are
+    fetched directly, each verified against its own ETag; any other object
+    is cut into range_size byte ranges.  `workers` threads write their part
+    into a preallocated local file at the part's offset.
+
+    With journal_dir set, finished parts are checkpointed in a Journal.
+    Downloading the same object to the same file again after a failure
+    keeps the parts already written, as long as the HEAD still shows the
+    object's size, ETag and Last-Modified recorded for them.
+    """
+
+    def __init__(self, client, workers=DEFAULT_DOWNLOAD_WORKERS,
+                 range_size=DEFAULT_RANGE_SIZE, verify=True,
+                 chunk_size=DEFAULT_CHUNK_SIZE, journal_dir=None):
+        if range_size <= 0:
+            raise ValueError("range size must be positive")
+
+        self.client = client
+        self.workers = workers
+        self.range_size = range_size
+        self.verify = verify
+        self.chunk_size = chunk_size
+        self.journal_dir = journal_dir
+
+    def _segments(self, container, object_name, headers):
+        """Return the manifest's segments as (container, name, etag, size)"""
+
+        if 'X-Static-Large-Object' in headers:
+            response = self.client.session.get(
+                object_url(self.client, container, object_name),
+                headers=self.client.headers,
+                params={'multipart-manifest': 'get'})
+            response.raise_for_status()
+
+            segments = []
+            for entry in response.json():
+                """ Nested manifests and partial segments are read by range """
+                if entry.get('sub_slo') or 'range' in entry:
+                    return None
+                segment_container, name = split_path(entry['name'])
+                segments.append((segment_container, name, entry['hash'],
+                                 entry['bytes']))
+            return segments
+
+        if 'X-Object-Manifest' in headers:
+            manifest = urllib.unquote(headers['X-Object-Manifest'])
+            segment_container, prefix = split_path(manifest)
+            return [(segment_container, entry['name'], entry['hash'],
+                     entry['bytes'])
+                    for entry in iter_listing(self.client, segment_container,
+                                              prefix=prefix, full=True)]
+
+        return None
+
+    def plan(self, container, object_name):
+        """Return (parts, size, headers) for the object"""
+
+        response = self.client.session.head(
+            object_url(self.client, container, object_name),
+            headers=self.client.headers)
+        response.raise_for_status()
+
+        headers = response.headers
+        size = int(headers['Content-Length'])
+
+        segments = self._segments(container, object_name, headers)
+        if segments is not None and \
+                sum(segment[3] for segment in segments) == size:
+            parts = []
+            offset = 0
+            for segment_container, name, etag, segment_size in segments:
+                parts.append(Part(offset, segment_size, segment_container,
+                                  name, etag))
+                offset += segment_size
+            return parts, size, headers
+
+        parts = [Part(offset, min(self.range_size, size - offset))
+                 for offset in xrange(0, size, self.range_size)]
+        return parts, size, headers
+
+    def fetch(self, container, object_name, filename, part, etag,
+              throttle=None):
+        fp = open(filename, 'r+b')
+        try:
+            fp.seek(part.offset)
+            if part.object_name is not None:
+                md5 = hashlib.md5() if self.verify else None
+                written = stream_object(self.client, part.container,
+                                        part.object_name, fp, md5=md5,
+                                        etag=part.etag,
+                                        chunk_size=self.chunk_size,
+                                        throttle=throttle)
+            else:
+                written = stream_object(self.client, container, object_name,
+                                        fp, offset=part.offset,
+                                        length=part.size, etag=etag,
+                                        chunk_size=self.chunk_size,
+                                        throttle=throttle)
+        finally:
+            fp.close()
+
+        if written != part.size:
+            raise DownloadError("%s: expected %d bytes at offset %d, got %d" %
+                                (object_name, part.size, part.offset, written))
+        return part
+
+    def download(self, container, object_name, filename):
+        started = time.time()
+
+        parts, size, headers = self.plan(container, object_name)
+        etag = headers.get('ETag')
+        throttle = transfer_throttle(self.client)
+
+        journal = None
+        if self.journal_dir is not None:
+            journal = Journal.open(
+                self.journal_dir, 'download', '/' + container + '/' +
+                object_name, os.path.abspath(filename),
+                {'size': size, 'etag': etag,
+                 'last_modified': headers.get('Last-Modified'),
+                 'parts': len(parts), 'range_size': self.range_size})
+            if journal.completed and (not os.path.isfile(filename) or
+                                      os.path.getsize(filename) != size):
+                journal.restart()
+
+        if journal is None or not journal.completed:
+            fp = open(filename, 'wb')
+            fp.truncate(size)
+            fp.close()
+
+        def fetch(item):
+            index, part = item
+            if journal is not None and journal.is_done(index):
+                return part
+            self.fetch(container, object_name, filename, part, etag,
+                       throttle)
+            if journal is not None:
+                journal.record(index, part.etag)
+            return part
+
+        failures = []
+        try:
+            for (_, part), _, exc_info in imap_unordered(
+                    fetch, enumerate(parts), self.workers):
+                if exc_info is not None:
+                    failures.append((part, exc_info[1]))
+        finally:
+            if journal is not None:
+                journal.close()
+
+        if failures:
+            raise DownloadError("%d of %d part(s) failed, first: %s" %
+                                (len(failures), len(parts), failures[0][1]))
+
+        """ Whatever the check below finds, the parts are not reused """
+        if journal is not None:
+            journal.finish()
+
+        if self.verify and is_verifiable(headers):
+            md5 = hashlib.md5()
+            fp = open(filename, 'rb')
+            for chunk in iter(lambda: fp.read(self.chunk_size), ''):
+                md5.update(chunk)
+            fp.close()
+            if md5.hexdigest() != etag:
+                raise DownloadError("%s: received MD5 %s, expected ETag %s" %
+                                    (object_name, md5.hexdigest(), etag))
+
+        return TransferResult(object_name, size, time.time() - started)
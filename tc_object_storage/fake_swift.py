@@ -0,0 +1,459 @@
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import json
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+
+DEFAULT_MAX_PAGE_SIZE = 10000
+
+
+def _timestamp_header(timestamp):
+    return time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(timestamp))
+
+
+def _timestamp_listing(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000000', time.gmtime(timestamp))
+
+
+class FakeObject(object):
+    def __init__(self, data, headers):
+        self.data = data
+        self.headers = headers
+        self.etag = hashlib.md5(data).hexdigest()
+        self.timestamp = time.time()
+
+
+class FakeSwiftHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Just enough of Keystone v2 and Swift for the clients to run on.
+
+    Request bodies are always read to the end so that keep-alive
+    connections stay usable, as they do against a real proxy.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    """ Headers and body leave in one write, see handle_one_request() """
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body='', headers=None):
+        headers = headers or {}
+        self.send_response(status)
+        self.send_header('X-Trans-Id', 'tx' + uuid.uuid4().hex)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command == 'GET' and body and self.server.cut_body():
+            """ The connection drops halfway through the body """
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        elif self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return ''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _dispatch(self):
+        if not self.server.enter():
+            self._read_body()
+            self.server.count(self.command)
+            return self._send(429, '', {'Retry-After': '1'})
+        try:
+            self._handle()
+        finally:
+            self.server.leave()
+
+    def _handle(self):
+        time.sleep(self.server.latency)
+        self.server.count(self.command)
+
+        url = urlparse.urlparse(self.path)
+        self.query = dict(urlparse.parse_qsl(url.query,
+                                             keep_blank_values=True))
+        self.body = self._read_body()
+
+        if url.path == '/identity/v2.0/tokens' and self.command == 'POST':
+            return self._token()
+        if url.path == '/info' and self.command == 'GET':
+            return self._send(200, json.dumps(self.server.info()),
+                              {'Content-Type': 'application/json'})
+
+        """ /v1/AUTH_<tenant>[/container[/object]] """
+        parts = urllib.unquote(url.path).split('/', 4)[1:]
+        if len(parts) < 2 or parts[0] != 'v1':
+            return self._send(404)
+        if self.headers.get('X-Auth-Token') not in self.server.tokens:
+            return self._send(401)
+
+        container = parts[2] if len(parts) > 2 and parts[2] else None
+        object_name = parts[3] if len(parts) > 3 and parts[3] else None
+
+        if self.command == 'POST' and 'bulk-delete' in self.query:
+            return self._bulk_delete()
+        if container is None:
+            return self._account()
+        if object_name is None:
+            return self._container(container)
+        return self._object(container, object_name)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _dispatch
+
+    def _token(self):
+        token = self.server.new_token()
+        expires = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                time.gmtime(time.time() + 3600))
+        body = {'access': {'token': {'id': token, 'expires': expires,
+                                     'tenant': {'id': self.server.tenant_id}}}}
+        self._send(200, json.dumps(body), {'Content-Type': 'application/json'})
+
+    def _limit_refused(self):
+        """Swift refuses a limit above its listing limit, it never caps it"""
+
+        limit = int(self.query.get('limit', self.server.max_page_size))
+        if limit <= self.server.max_page_size:
+            return False
+        self._send(412, 'Maximum limit is %d' % self.server.max_page_size)
+        return True
+
+    def _listing(self, names, describe):
+        """Send one page of a listing, following Swift's query parameters"""
+
+        prefix = self.query.get('prefix', '')
+        delimiter = self.query.get('delimiter')
+        marker = self.query.get('marker', '')
+        end_marker = self.query.get('end_marker')
+        limit = int(self.query.get('limit', self.server.max_page_size))
+
+        entries = []
+        for name in sorted(names):
+            if len(entries) >= limit:
+                break
+            if name <= marker or not name.startswith(prefix):
+                continue
+            if end_marker and name >= end_marker:
+                break
+            if delimiter:
+                position = name.find(delimiter, len(prefix))
+                if position >= 0:
+                    subdir = name[:position + len(delimiter)]
+                    if subdir > marker and (not entries or
+                                            entries[-1][0] != subdir):
+                        entries.append((subdir, None))
+                    continue
+            entries.append((name, describe(name)))
+
+        if self.query.get('format') == 'json':
+            body = json.dumps([{'subdir': name} if entry is None else entry
+                               for name, entry in entries])
+            content_type = 'application/json; charset=utf-8'
+        else:
+            body = ''.join(name + '\n' for name, _ in entries)
+            content_type = 'text/plain; charset=utf-8'
+        return body if entries else '', content_type
+
+    def _account(self):
+        containers = self.server.containers
+        if self.command not in ('GET', 'HEAD'):
+            return self._send(405)
+
+        def describe(name):
+            objects = containers[name]
+            return {'name': name, 'count': len(objects),
+                    'bytes': sum(len(o.data) for o in objects.values())}
+
+        if self._limit_refused():
+            return
+        with self.server.lock:
+            body, content_type = self._listing(containers.keys(), describe)
+        self._send(200 if body else 204, body, {'Content-Type': content_type})
+
+    def _container(self, container):
+        server = self.server
+        if self.command == 'PUT':
+            with server.lock:
+                created = container not in server.containers
+                server.containers.setdefault(container, {})
+            return self._send(201 if created else 202)
+
+        objects = server.containers.get(container)
+        if objects is None:
+            return self._send(404)
+
+        if self.command == 'DELETE':
+            with server.lock:
+                empty = not objects
+                if empty:
+                    del server.containers[container]
+            return self._send(204 if empty else 409)
+
+        def describe(name):
+            stored = objects[name]
+            entry = {'name': name, 'bytes': len(stored.data),
+                     'hash': stored.etag,
+                     'last_modified': _timestamp_listing(stored.timestamp),
+                     'content_type': stored.headers.get(
+                         'content-type', 'application/octet-stream')}
+            if 'x-static-large-object' in stored.headers:
+                """ Swift marks SLO manifests in listings """
+                entry['slo_etag'] = '"%s"' % hashlib.md5(''.join(
+                    segment['hash'] for segment in
+                    json.loads(stored.data))).hexdigest()
+            return entry
+
+        if self._limit_refused():
+            return
+        with server.lock:
+            body, content_type = self._listing(objects.keys(), describe)
+            headers = {'Content-Type': content_type,
+                       'X-Container-Object-Count': str(len(objects)),
+                       'X-Container-Bytes-Used': str(sum(
+                           len(o.data) for o in objects.values()))}
+        self._send(200 if body else 204, body, headers)
+
+    def _bulk_delete(self):
+        deleted = not_found = 0
+        with self.server.lock:
+            for line in self.body.splitlines():
+                path = urllib.unquote(line.strip()).lstrip('/')
+                if not path:
+                    continue
+                container, _, object_name = path.partition('/')
+                objects = self.server.containers.get(container)
+                if objects is None or (object_name and
+                                       object_name not in objects):
+                    not_found += 1
+                elif object_name:
+                    del objects[object_name]
+                    deleted += 1
+                elif not objects:
+                    del self.server.containers[container]
+                    deleted += 1
+        body = {'Number Deleted': deleted, 'Number Not Found': not_found,
+                'Response Status': '200 OK', 'Errors': []}
+        self._send(200, json.dumps(body), {'Content-Type': 'application/json'})
+
+    def _segments(self, stored):
+        """Return the segments of a manifest, or None for a plain object"""
+
+        containers = self.server.containers
+        if 'x-object-manifest' in stored.headers:
+            container, _, prefix = urllib.unquote(
+                stored.headers['x-object-manifest']).partition('/')
+            objects = containers.get(container, {})
+            return [objects[name] for name in sorted(objects)
+                    if name.startswith(prefix)]
+        if 'x-static-large-object' in stored.headers:
+            segments = []
+            for entry in json.loads(stored.data):
+                container, _, name = entry['name'].encode(
+                    'utf-8').lstrip('/').partition('/')
+                segments.append(containers[container][name])
+            return segments
+        return None
+
+    def _object(self, container, object_name):
+        server = self.server
+        objects = server.containers.get(container)
+        if objects is None:
+            return self._send(404)
+
+        if self.command == 'PUT':
+            return self._put_object(objects, object_name)
+
+        with server.lock:
+            stored = objects.get(object_name)
+            if stored is not None and self.command == 'DELETE':
+                del objects[object_name]
+            segments = None if stored is None else self._segments(stored)
+        if stored is None:
+            return self._send(404)
+        if self.command == 'DELETE':
+            return self._send(204)
+        if self.command != 'GET' and self.command != 'HEAD':
+            return self._send(405)
+
+        headers = {'Content-Type': stored.headers.get(
+                       'content-type', 'application/octet-stream'),
+                   'Last-Modified': _timestamp_header(stored.timestamp),
+                   'X-Timestamp': '%.5f' % stored.timestamp,
+                   'Accept-Ranges': 'bytes'}
+        for key, value in stored.headers.items():
+            if key.startswith('x-object-meta-') or \
+                    key in ('x-object-manifest', 'x-static-large-object'):
+                headers[key.title()] = value
+
+        if segments is None:
+            data = stored.data
+            headers['ETag'] = stored.etag
+        elif self.query.get('multipart-manifest') == 'get' and \
+                'x-static-large-object' in stored.headers:
+            data = stored.data
+            headers['ETag'] = stored.etag
+        else:
+            """ Like Swift: the quoted MD5 of the segments' ETags """
+            data = ''.join(segment.data for segment in segments)
+            headers['ETag'] = '"%s"' % hashlib.md5(''.join(
+                segment.etag for segment in segments)).hexdigest()
+
+        byte_range = self.headers.get('Range')
+        if byte_range and self.command == 'GET':
+            first, last = byte_range.split('=', 1)[1].split('-', 1)
+            if not first:
+                first, last = max(len(data) - int(last), 0), len(data) - 1
+            first = int(first)
+            last = min(int(last), len(data) - 1) if last else len(data) - 1
+            if first >= len(data):
+                return self._send(416)
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (first, last,
+                                                           len(data))
+            return self._send(206, data[first:last + 1], headers)
+
+        headers['Content-Length'] = str(len(data))
+        self._send(200, data, headers)
+
+    def _put_object(self, objects, object_name):
+        headers = dict((key.lower(), value)
+                       for key, value in self.headers.items())
+        data = self.body
+
+        copy_from = headers.pop('x-copy-from', None)
+        if copy_from is not None:
+            container, _, name = urllib.unquote(copy_from).lstrip(
+                '/').partition('/')
+            with self.server.lock:
+                source = self.server.containers.get(container, {}).get(name)
+                segments = None if source is None else \
+                    self._segments(source)
+            if source is None:
+                return self._send(404)
+            if segments is None or \
+                    self.query.get('multipart-manifest') == 'get':
+                data = source.data
+                copied = dict(source.headers)
+            else:
+                data = ''.join(segment.data for segment in segments)
+                copied = dict((key, value)
+                              for key, value in source.headers.items()
+                              if key not in ('x-object-manifest',
+                                             'x-static-large-object'))
+            copied.update((key, value) for key, value in headers.items()
+                          if key.startswith('x-object-meta-'))
+            headers = copied
+        elif self.query.get('multipart-manifest') == 'put':
+            headers['x-static-large-object'] = 'True'
+            data = json.dumps([{'name': entry['path'], 'hash': entry['etag'],
+                                'bytes': entry['size_bytes']}
+                               for entry in json.loads(data)])
+        elif 'etag' in headers and \
+                headers['etag'].strip('"') != hashlib.md5(data).hexdigest():
+            return self._send(422)
+
+        stored = FakeObject(data, headers)
+        with self.server.lock:
+            objects[object_name] = stored
+        self._send(201, '', {'ETag': stored.etag})
+
+
+class FakeSwift(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """A Keystone + Swift stand-in serving from memory on 127.0.0.1.
+
+    Tokens (v2 API), account and container listings with marker
+    pagination, object HEAD/GET (with ranges)/PUT/DELETE, server side
+    copies, DLO and SLO manifests and bulk deletes are emulated; every
+    request is held for `latency` seconds to stand in for a remote
+    cluster.  With max_in_flight set, requests beyond that many at once
+    are rate limited (429 with Retry-After) as a proxy would.  While
+    `cut_bodies` is positive, each GET body is cut off halfway and the
+    count decreases.  keystone_endpoint and swift_endpoint are both
+    `url`.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0, max_page_size=DEFAULT_MAX_PAGE_SIZE,
+                 tenant_id='tenant', max_in_flight=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeSwiftHandler)
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.tenant_id = tenant_id
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.containers = {}
+        self.tokens = set()
+        self.requests = {}
+        self.cut_bodies = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def info(self):
+        return {'swift': {'version': 'fake'}, 'slo': {},
+                'bulk_delete': {'max_deletes_per_request': 10000}}
+
+    def new_token(self):
+        with self.lock:
+            token = 'token-%d' % len(self.tokens)
+            self.tokens.add(token)
+        return token
+
+    def enter(self):
+        """Admit a request unless max_in_flight are being served"""
+
+        with self.lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def cut_body(self):
+        with self.lock:
+            if self.cut_bodies <= 0:
+                return False
+            self.cut_bodies -= 1
+            return True
+
+    def count(self, method):
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
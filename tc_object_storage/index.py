@@ -0,0 +1,263 @@
+import errno
+import os
+import sqlite3
+import time
+
+from tc_object_storage.common import account_url, container_url
+from tc_object_storage.listing import iter_listing
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'),
+                                  '.tc-object-storage', 'index.sqlite')
+COMMIT_EVERY = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS containers (
+    account TEXT NOT NULL,
+    name TEXT NOT NULL,
+    object_count INTEGER,
+    bytes_used INTEGER,
+    put_timestamp TEXT,
+    generation INTEGER NOT NULL DEFAULT 0,
+    refreshed REAL,
+    PRIMARY KEY (account, name)
+);
+CREATE TABLE IF NOT EXISTS objects (
+    account TEXT NOT NULL,
+    container TEXT NOT NULL,
+    name TEXT NOT NULL,
+    bytes INTEGER,
+    hash TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    generation INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (account, container, name)
+);
+"""
+
+
+def _text(value):
+    """sqlite3 wants unicode for non-ASCII text, listings give utf-8"""
+
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def _prefix_range(prefix):
+    """SQL condition selecting names that start with prefix.
+
+    A range on the primary key instead of substr()/LIKE, so SQLite can
+    use its index.  Text compares as UTF-8 bytes, which sorts code points
+    in order, so bumping the last character gives the upper bound.
+    """
+
+    prefix = _text(prefix)
+    if not prefix:
+        return '', ()
+    upper = prefix[:-1] + unichr(ord(prefix[-1]) + 1)
+    return ' AND name >= ? AND name < ?', (prefix, upper)
+
+
+class ListingIndex(object):
+    """Local SQLite copy of container listings.
+
+    refresh() brings a container's rows up to date with as little listing
+    as possible: nothing when the container's object count, bytes used
+    and put timestamp are unchanged, only the names past the last indexed
+    one when objects were merely appended, and a full re-listing
+    otherwise.  An object overwritten in place with the same size leaves
+    those totals alone, so refresh(full=True) is needed to pick it up.
+
+    Queries (iter_objects, search, usage) run locally without touching
+    Swift and return the same dicts iter_listing(full=True) yields, names
+    in utf-8.
+    """
+
+    def __init__(self, client, path=DEFAULT_INDEX_PATH):
+        self.client = client
+        self.path = path
+        self.account = _text(account_url(client))
+
+        directory = os.path.dirname(path)
+        if directory:
+            try:
+                os.makedirs(directory, 0700)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        self.db = self._connect()
+        self.db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=60)
+        db.text_factory = str
+        db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    def close(self):
+        self.db.close()
+
+    def _container_row(self, container):
+        return self.db.execute(
+            'SELECT object_count, bytes_used, put_timestamp, generation '
+            'FROM containers WHERE account = ? AND name = ?',
+            (self.account, _text(container))).fetchone()
+
+    def _indexed_totals(self, container, generation):
+        return self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM objects '
+            'WHERE account = ? AND container = ? AND generation = ?',
+            (self.account, _text(container), generation)).fetchone()
+
+    def _store(self, container, entries, generation):
+        """Upsert listing entries, committing every COMMIT_EVERY rows"""
+
+        container = _text(container)
+        rows = 0
+        for entry in entries:
+            if 'subdir' in entry:
+                continue
+            self.db.execute(
+                'INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.account, container, _text(entry['name']),
+                 entry.get('bytes'), _text(entry.get('hash')),
+                 _text(entry.get('last_modified')),
+                 _text(entry.get('content_type')), generation))
+            rows += 1
+            if rows % COMMIT_EVERY == 0:
+                self.db.commit()
+        self.db.commit()
+        return rows
+
+    def _container_stats(self, container):
+        """HEAD the container, return (object count, bytes, put timestamp)"""
+
+        response = self.client.session.head(
+            container_url(self.client, container),
+            headers=self.client.headers)
+        response.raise_for_status()
+
+        return (int(response.headers.get('X-Container-Object-Count', 0)),
+                int(response.headers.get('X-Container-Bytes-Used', 0)),
+                response.headers.get('X-PUT-Timestamp',
+                                     response.headers.get('X-Timestamp')))
+
+    def _mark_fresh(self, container, stats, generation):
+        count, used, put_timestamp = stats
+        self.db.execute(
+            'INSERT OR REPLACE INTO containers VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.account, _text(container), count, used,
+             _text(put_timestamp), generation, time.time()))
+        self.db.commit()
+
+    def refresh(self, container, full=False):
+        """Update the container's rows, return 'fresh', 'append' or 'full'"""
+
+        count, used, put_timestamp = self._container_stats(container)
+        row = self._container_row(container)
+        generation = row[3] if row else 0
+
+        if not full and row is not None and \
+                (count, used, put_timestamp) == tuple(row[:3]):
+            return 'fresh'
+
+        mode = None
+        if not full and row is not None and count > row[0]:
+            """ Objects were probably only appended after the last name """
+            marker = self.db.execute(
+                'SELECT MAX(name) FROM objects WHERE account = ? AND '
+                'container = ? AND generation = ?',
+                (self.account, _text(container), generation)).fetchone()[0]
+            self._store(container, iter_listing(
+                self.client, container, marker=marker, full=True), generation)
+            if self._indexed_totals(container, generation) == (count, used):
+                mode = 'append'
+
+        if mode is None:
+            generation += 1
+            self._store(container, iter_listing(self.client, container,
+                                                full=True), generation)
+            self.db.execute(
+                'DELETE FROM objects WHERE account = ? AND container = ? '
+                'AND generation < ?',
+                (self.account, _text(container), generation))
+            mode = 'full'
+
+        self._mark_fresh(container, (count, used, put_timestamp), generation)
+        return mode
+
+    def settle(self, container):
+        """Mark the index fresh after record_upload()/record_delete() calls
+
+        Only done when the indexed rows add up to the container's totals;
+        otherwise the next refresh() re-lists.
+        """
+
+        row = self._container_row(container)
+        if row is None:
+            return False
+
+        stats = self._container_stats(container)
+        if self._indexed_totals(container, row[3]) != stats[:2]:
+            return False
+
+        self._mark_fresh(container, stats, row[3])
+        return True
+
+    def record_upload(self, container, name, size, etag, content_type=None):
+        """Reflect an upload made by this process without re-listing"""
+
+        row = self._container_row(container)
+        self._store(container, [{
+            'name': name, 'bytes': size, 'hash': etag,
+            'last_modified': time.strftime('%Y-%m-%dT%H:%M:%S.000000',
+                                           time.gmtime()),
+            'content_type': content_type}], row[3] if row else 0)
+
+    def record_delete(self, container, names):
+        for name in names:
+            self.db.execute(
+                'DELETE FROM objects WHERE account = ? AND container = ? '
+                'AND name = ?', (self.account, _text(container), _text(name)))
+        self.db.commit()
+
+    def _rows(self, query, args):
+        """Run a query on its own connection, safe to consume in a thread"""
+
+        db = self._connect()
+        try:
+            for name, size, etag, last_modified, content_type in \
+                    db.execute(query, args):
+                yield {'name': name, 'bytes': size, 'hash': etag,
+                       'last_modified': last_modified,
+                       'content_type': content_type}
+        finally:
+            db.close()
+
+    def iter_objects(self, container, prefix=''):
+        """Yield indexed objects under prefix in listing (name) order"""
+
+        condition, args = _prefix_range(prefix)
+        return self._rows(
+            'SELECT name, bytes, hash, last_modified, content_type '
+            'FROM objects WHERE account = ? AND container = ?' + condition +
+            ' ORDER BY name', (self.account, _text(container)) + args)
+
+    def search(self, container, pattern):
+        """Yield indexed objects whose name matches a shell glob pattern"""
+
+        return self._rows(
+            'SELECT name, bytes, hash, last_modified, content_type '
+            'FROM objects WHERE account = ? AND container = ? '
+            'AND name GLOB ? ORDER BY name',
+            (self.account, _text(container), _text(pattern)))
+
+    def usage(self, container, prefix=''):
+        """Return (object count, bytes) of the indexed objects under prefix"""
+
+        condition, args = _prefix_range(prefix)
+        return self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM objects '
+            'WHERE account = ? AND container = ?' + condition,
+            (self.account, _text(container)) + args).fetchone()
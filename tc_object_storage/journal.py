@@ -0,0 +1,183 @@
+import errno
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'),
+                                   '.tc-object-storage', 'journals')
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+class Journal(object):
+    """Checkpoints of one segmented upload or parallel download.
+
+    The journal is a file of JSON lines: a header naming the transfer and
+    fingerprinting both sides (sizes, mtime, ETag, ...), then one line per
+    completed part with its ETag.  Lines are appended and flushed as parts
+    finish, so a transfer killed at any point leaves a journal listing
+    exactly the parts that made it; a torn last line is ignored.  A
+    journal whose fingerprint does not match the transfer being resumed
+    is discarded.  finish() removes the journal once the transfer is done.
+    """
+
+    def __init__(self, path, header, completed):
+        self.path = path
+        self.header = header
+        self.completed = completed
+        self.lock = threading.Lock()
+        self.fp = None
+
+    @staticmethod
+    def path_for(directory, kind, source, target):
+        key = hashlib.sha1('\n'.join([kind, source, target])).hexdigest()
+        return os.path.join(directory, key + '.journal')
+
+    @classmethod
+    def open(cls, directory, kind, source, target, fingerprint):
+        """Return the journal of the transfer, resumed if it matches"""
+
+        path = cls.path_for(directory, kind, source, target)
+        header = {'kind': kind, 'source': source, 'target': target,
+                  'fingerprint': fingerprint, 'started': time.time()}
+
+        entries = read_journal(path)
+        if entries and entries[0].get('fingerprint') == fingerprint:
+            header = entries[0]
+            completed = dict((entry['part'], entry.get('etag'))
+                             for entry in entries[1:])
+        else:
+            completed = {}
+
+        try:
+            os.makedirs(directory, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        """ Rewritten rather than appended to, a torn line would stay """
+        journal = cls(path, header, completed)
+        journal.fp = open(path, 'w')
+        journal._append(header)
+        for part, etag in sorted(completed.items()):
+            journal._append({'part': part, 'etag': etag})
+        return journal
+
+    def restart(self):
+        """Forget every checkpoint, the transfer starts over"""
+
+        with self.lock:
+            self.close()
+            self.completed = {}
+            self.fp = open(self.path, 'w')
+            self._append(self.header)
+
+    def _append(self, entry):
+        self.fp.write(json.dumps(entry) + '\n')
+        self.fp.flush()
+
+    def is_done(self, part):
+        return part in self.completed
+
+    def record(self, part, etag=None):
+        with self.lock:
+            self.completed[part] = etag
+            self._append({'part': part, 'etag': etag})
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def finish(self):
+        """The transfer is complete, the journal is not needed any more"""
+
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def read_journal(path):
+    """Return the JSON entries of a journal file, [] if there is none"""
+
+    entries = []
+    try:
+        fp = open(path)
+    except IOError:
+        return entries
+
+    try:
+        for line in fp:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                """ Torn write of a killed process """
+                break
+    finally:
+        fp.close()
+    return entries
+
+
+class JournalInfo(object):
+    def __init__(self, path, header, parts, updated):
+        self.path = path
+        self.kind = header.get('kind')
+        self.source = header.get('source')
+        self.target = header.get('target')
+        self.parts = parts
+        self.updated = updated
+
+    def __str__(self):
+        return "%-8s %s -> %s: %d part(s) done, last update %s" % (
+            self.kind, self.source, self.target, self.parts,
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.updated)))
+
+
+def list_journals(directory=DEFAULT_JOURNAL_DIR):
+    """Return a JournalInfo for every unfinished transfer, oldest first"""
+
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return []
+
+    journals = []
+    for filename in filenames:
+        if not filename.endswith('.journal'):
+            continue
+        path = os.path.join(directory, filename)
+        entries = read_journal(path)
+        try:
+            updated = os.path.getmtime(path)
+        except OSError:
+            continue
+        header = entries[0] if entries else {}
+        journals.append(JournalInfo(path, header, len(entries[1:]), updated))
+
+    journals.sort(key=lambda journal: journal.updated)
+    return journals
+
+
+def clean_journals(directory=DEFAULT_JOURNAL_DIR, max_age=DEFAULT_MAX_AGE):
+    """Remove journals not updated for max_age seconds (None: all of them)
+
+    Returns the JournalInfo of every removed journal.
+    """
+
+    removed = []
+    now = time.time()
+    for journal in list_journals(directory):
+        if max_age is not None and now - journal.updated < max_age:
+            continue
+        try:
+            os.remove(journal.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            continue
+        removed.append(journal)
+    return removed
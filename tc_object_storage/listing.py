@@ -0,0 +1,98 @@
+from tc_object_storage.common import account_url, container_url
+
+DEFAULT_PAGE_SIZE = 10000
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def entry_name(entry):
+    """Return the name of a JSON listing entry, or its subdir prefix."""
+
+    if 'subdir' in entry:
+        return entry['subdir']
+    return entry['name']
+
+
+def iter_listing(client, container=None, prefix=None, delimiter=None,
+                 marker=None, end_marker=None, page_size=DEFAULT_PAGE_SIZE,
+                 full=False):
+    """Yield the entries of an account (container=None) or a container.
+
+    Pages of at most page_size entries are requested one after another,
+    following Swift's marker pagination, so only one page is ever held in
+    memory however large the listing is.  Plain listings yield utf-8 names;
+    with full set, format=json is used and dicts are yielded instead
+    ('name', 'bytes', 'hash', 'last_modified', ... for objects, 'name',
+    'count', 'bytes' for containers, or just 'subdir' for pseudo-folders
+    when a delimiter is given).
+    """
+
+    for page in iter_listing_pages(client, container, prefix, delimiter,
+                                   marker, end_marker, page_size, full):
+        for entry in page:
+            yield entry
+
+
+def iter_listing_pages(client, container=None, prefix=None, delimiter=None,
+                       marker=None, end_marker=None,
+                       page_size=DEFAULT_PAGE_SIZE, full=False):
+    """Like iter_listing(), but yield every page as one (non-empty) list.
+
+    A page shorter than page_size ends the listing without asking for
+    the next one.
+    """
+
+    if container is None:
+        url = account_url(client)
+    else:
+        url = container_url(client, container)
+
+    params = {'limit': page_size}
+    if prefix:
+        params['prefix'] = prefix
+    if delimiter:
+        params['delimiter'] = delimiter
+    if end_marker:
+        params['end_marker'] = end_marker
+    if full:
+        params['format'] = 'json'
+
+    while True:
+        if marker:
+            params['marker'] = marker
+
+        response = client.session.get(url, headers=client.headers,
+                                      params=params)
+
+        """ If the request is failed, it raise HTTPError exceptions"""
+        response.raise_for_status()
+        if response.status_code == 204:
+            return
+
+        if full:
+            page = response.json()
+            for entry in page:
+                for key in ('name', 'subdir', 'hash', 'last_modified',
+                            'content_type'):
+                    if key in entry:
+                        entry[key] = _encode(entry[key])
+            names = [entry_name(entry) for entry in page]
+        else:
+            page = names = response.content.split('\n')
+            if names and names[-1] == '':
+                names.pop()
+
+        if not names:
+            return
+
+        yield page
+
+        """ Swift refuses (412) a limit above its own instead of capping """
+        """ the page, so a short page is the last one """
+        if len(names) < page_size:
+            return
+        marker = names[-1]
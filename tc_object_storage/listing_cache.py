@@ -0,0 +1,225 @@
+import collections
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from tc_object_storage.common import conf_get
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'),
+                                 '.tc-object-storage', 'listings')
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 200000
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _encode_entry(entry):
+    """A name, or a JSON listing entry, with utf-8 strings like listing's"""
+
+    if isinstance(entry, dict):
+        return dict((_encode(key), _encode(value))
+                    for key, value in entry.items())
+    return _encode(entry)
+
+
+class ListingCache(object):
+    """Listings keyed by (container, prefix, delimiter, full).
+
+    Plain listings are lists of names; with full set, lists of the JSON
+    entries (name, bytes, ...) instead.  A container of None stands for
+    the account listing.  Entries are
+    served for ttl seconds.  In memory the least recently used listings
+    are evicted once they hold more than max_entries names in total;
+    with cache_dir set they are also written there (0700 directory, 0600
+    files, like the token cache) so a new process can reuse them.
+    invalidate() must be called for every change made through the client.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 cache_dir=None, account=''):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.account = account
+        self.lock = threading.Lock()
+        self._memory = collections.OrderedDict()
+        self._size = 0
+
+    @classmethod
+    def from_config(cls, conf, account=''):
+        """Build a cache from the optional [listing_cache] section"""
+
+        cache_dir = None
+        if conf_get(conf, 'listing_cache', 'persist', False, bool):
+            cache_dir = conf_get(conf, 'listing_cache', 'cache_dir',
+                                 DEFAULT_CACHE_DIR)
+
+        return cls(ttl=conf_get(conf, 'listing_cache', 'ttl', DEFAULT_TTL,
+                                int),
+                   max_entries=conf_get(conf, 'listing_cache', 'max_entries',
+                                        DEFAULT_MAX_ENTRIES, int),
+                   cache_dir=cache_dir, account=account)
+
+    def _container_dir(self, container):
+        digest = hashlib.sha1('\n'.join([self.account, container or '']))
+        return os.path.join(self.cache_dir, digest.hexdigest())
+
+    def _path(self, key):
+        container, prefix, delimiter, full = key
+        parts = [prefix or '', delimiter or '']
+        if full:
+            parts.append('full')
+        digest = hashlib.sha1('\n'.join(parts))
+        return os.path.join(self._container_dir(container),
+                            digest.hexdigest() + '.json')
+
+    def _remember(self, key, stored, names):
+        """Add to memory, evicting the least recently used listings"""
+
+        if len(names) > self.max_entries:
+            return
+        self._forget(key)
+        self._memory[key] = (stored, names)
+        self._size += len(names)
+        while self._size > self.max_entries:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _load(self, key):
+        try:
+            fp = open(self._path(key))
+            try:
+                data = json.load(fp)
+            finally:
+                fp.close()
+            return data['stored'], [_encode_entry(entry)
+                                    for entry in data['names']]
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def get(self, container, prefix=None, delimiter=None, full=False):
+        """Return the cached names, or None if missing or expired"""
+
+        key = (container, prefix, delimiter, full)
+        with self.lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory[key] = self._memory.pop(key)
+
+        if entry is None and self.cache_dir is not None:
+            entry = self._load(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                with self.lock:
+                    self._remember(key, *entry)
+
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, container, prefix, delimiter, names, full=False):
+        key = (container, prefix, delimiter, full)
+        stored = time.time()
+        with self.lock:
+            self._remember(key, stored, names)
+        if self.cache_dir is None:
+            return
+
+        directory = self._container_dir(container)
+        try:
+            os.makedirs(directory, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        """ mkstemp creates the file 0600, rename makes it visible at once """
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            os.write(fd, json.dumps({'prefix': prefix, 'delimiter': delimiter,
+                                     'stored': stored, 'names': names}))
+        finally:
+            os.close(fd)
+        os.rename(tmp, self._path(key))
+
+    def invalidate(self, container, name=None):
+        """Drop the listings of container that name appears in.
+
+        Without name, every listing of the container is dropped; a
+        container of None drops the account listing.
+        """
+
+        def affected(prefix):
+            return name is None or name.startswith(prefix or '')
+
+        with self.lock:
+            for key in list(self._memory):
+                if key[0] == container and affected(key[1]):
+                    self._forget(key)
+
+        if self.cache_dir is None:
+            return
+
+        directory = self._container_dir(container)
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            return
+
+        for filename in filenames:
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                fp = open(path)
+                try:
+                    prefix = json.load(fp).get('prefix')
+                finally:
+                    fp.close()
+            except (IOError, ValueError):
+                prefix = None
+            if affected(_encode(prefix)):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+
+    def pages(self, container, prefix, delimiter, fetch, refresh=False,
+              full=False):
+        """Yield the listing's pages, from the cache or from fetch().
+
+        fetch() returns an iterator of pages; a listing is only stored
+        once all of its pages have been read.  A listing that grows past
+        max_entries would not be kept anyway: its pages are passed on
+        without being collected.  With refresh set, the cached copy is
+        ignored and replaced.
+        """
+
+        names = None if refresh else self.get(container, prefix, delimiter,
+                                              full)
+        if names is not None:
+            if names:
+                yield names
+            return
+
+        names = []
+        for page in fetch():
+            if names is not None:
+                names.extend(page)
+                if len(names) > self.max_entries:
+                    names = None
+            yield page
+        if names is not None:
+            self.put(container, prefix, delimiter, names, full)
@@ -0,0 +1,425 @@
+import collections
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urlparse
+
+from tc_object_storage.common import conf_get, format_size
+
+""" Upper bounds (seconds) of the latency histogram buckets """
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 300.0, float('inf'))
+MAX_RECENT_ERRORS = 50
+PROMETHEUS_PREFIX = 'tc_object_storage'
+
+
+def classify(request):
+    """Name the Swift operation of a prepared request.
+
+    'object_get', 'container_put', 'account_get', ... after the level of
+    the URL and the method, with the requests that differ in cost told
+    apart: 'object_get_range', 'object_copy', 'manifest_put',
+    'bulk_delete', 'auth' and 'info'.
+    """
+
+    url = urlparse.urlsplit(request.url)
+    if url.path.endswith('/identity/v2.0/tokens'):
+        return 'auth'
+    if url.path.endswith('/info'):
+        return 'info'
+    if 'bulk-delete' in url.query:
+        return 'bulk_delete'
+
+    parts = url.path.partition('/v1/')[2].split('/', 2)
+    if len(parts) == 3 and parts[2]:
+        level = 'object'
+    elif len(parts) >= 2 and parts[1]:
+        level = 'container'
+    else:
+        level = 'account'
+
+    method = request.method.lower()
+    headers = request.headers
+    if level == 'object':
+        if method == 'copy' or 'X-Copy-From' in headers:
+            return 'object_copy'
+        if method == 'put' and ('multipart-manifest=put' in url.query or
+                                'X-Object-Manifest' in headers):
+            return 'manifest_put'
+        if method == 'get' and 'Range' in headers:
+            return 'object_get_range'
+    return '%s_%s' % (level, method)
+
+
+def _body_size(request):
+    length = request.headers.get('Content-Length')
+    if length is not None:
+        return int(length)
+    try:
+        return len(request.body or '')
+    except TypeError:
+        return None
+
+
+class RequestRecord(object):
+    """What one HTTP exchange of a PooledSession cost.
+
+    seconds runs until the whole response was read, or until its headers
+    arrived for streamed responses (downloads), whose bytes_received is
+    then the announced Content-Length.  retries counts the attempts
+    urllib3 repeated (resets, 5xx, 429), retry_statuses holds the
+    statuses that made it repeat them; status is None when no response
+    came back at all, error then holds the exception.
+    """
+
+    def __init__(self, request, response, started, seconds, stream=False,
+                 bytes_sent=None, error=None):
+        self.operation = classify(request)
+        self.method = request.method
+        self.url = request.url
+        self.started = started
+        self.seconds = seconds
+        self.bytes_sent = bytes_sent
+        if bytes_sent is None:
+            self.bytes_sent = _body_size(request) or 0
+        self.error = error
+
+        self.status = None
+        self.bytes_received = 0
+        self.retries = 0
+        self.retry_statuses = []
+        self.retry_after = None
+        self.trans_id = None
+        if response is not None:
+            self.status = response.status_code
+            self.trans_id = response.headers.get('X-Trans-Id') or \
+                response.headers.get('X-Openstack-Request-Id')
+            self.retry_after = response.headers.get('Retry-After')
+            if stream or request.method == 'HEAD':
+                if request.method != 'HEAD':
+                    self.bytes_received = int(
+                        response.headers.get('Content-Length') or 0)
+            else:
+                self.bytes_received = len(response.content)
+            retries = getattr(response.raw, 'retries', None)
+            if retries is not None:
+                self.retries = len(retries.history)
+                self.retry_statuses = [attempt.status
+                                       for attempt in retries.history
+                                       if attempt.status is not None]
+
+    @property
+    def failed(self):
+        return self.status is None or self.status >= 400
+
+    def as_dict(self):
+        return {'time': self.started, 'operation': self.operation,
+                'method': self.method, 'url': self.url,
+                'status': self.status, 'seconds': self.seconds,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'retries': self.retries, 'trans_id': self.trans_id,
+                'error': None if self.error is None else str(self.error)}
+
+
+class Histogram(object):
+    """Counts of observations per bucket of upper bounds"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the quantile, at most max"""
+
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """(bound, observations <= bound) pairs, as Prometheus wants them"""
+
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class OperationMetrics(object):
+    def __init__(self, name):
+        self.name = name
+        self.latency = Histogram()
+        self.statuses = collections.defaultdict(int)
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.slowest = None
+
+    def add(self, record):
+        self.latency.observe(record.seconds)
+        self.statuses[str(record.status or 'error')] += 1
+        if record.failed:
+            self.errors += 1
+        self.retries += record.retries
+        self.bytes_sent += record.bytes_sent
+        self.bytes_received += record.bytes_received
+        if self.slowest is None or record.seconds > self.slowest.seconds:
+            self.slowest = record
+
+    def as_dict(self):
+        return {'requests': self.latency.count,
+                'errors': self.errors,
+                'retries': self.retries,
+                'seconds': self.latency.sum,
+                'p50': self.latency.quantile(0.50),
+                'p90': self.latency.quantile(0.90),
+                'p99': self.latency.quantile(0.99),
+                'max': self.latency.max,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'statuses': dict(self.statuses),
+                'slowest': {'seconds': self.slowest.seconds,
+                            'url': self.slowest.url,
+                            'trans_id': self.slowest.trans_id}}
+
+    def __str__(self):
+        text = "%-18s %7d req %9.2f s  p50 %7.1f ms  p99 %7.1f ms" % (
+            self.name, self.latency.count, self.latency.sum,
+            self.latency.quantile(0.50) * 1000,
+            self.latency.quantile(0.99) * 1000)
+        if self.bytes_sent:
+            text += "  sent %s" % format_size(self.bytes_sent)
+        if self.bytes_received:
+            text += "  received %s" % format_size(self.bytes_received)
+        if self.errors:
+            text += "  %d errors" % self.errors
+        if self.retries:
+            text += "  %d retries" % self.retries
+        return text
+
+
+class Metrics(object):
+    """Aggregates RequestRecords per operation; a session observer.
+
+    The most recent failures are kept with their X-Trans-Id, which is
+    what Swift operators need to find a request in the proxy logs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.recent_errors = collections.deque(maxlen=MAX_RECENT_ERRORS)
+        self.started = time.time()
+
+    def __call__(self, record):
+        with self.lock:
+            operation = self.operations.get(record.operation)
+            if operation is None:
+                operation = self.operations[record.operation] = \
+                    OperationMetrics(record.operation)
+            operation.add(record)
+            if record.failed:
+                self.recent_errors.append(record)
+
+    def by_time(self):
+        """The operations, those the most time was spent in first"""
+
+        with self.lock:
+            return sorted(self.operations.values(),
+                          key=lambda operation: -operation.latency.sum)
+
+    def summary(self, session=None):
+        operations = self.by_time()
+        with self.lock:
+            summary = {'started': self.started,
+                       'seconds': time.time() - self.started,
+                       'operations': collections.OrderedDict(
+                           (operation.name, operation.as_dict())
+                           for operation in operations),
+                       'recent_errors': [record.as_dict()
+                                         for record in self.recent_errors]}
+        if session is not None:
+            summary['connections'] = session.stats()
+            if session.controller is not None:
+                summary['concurrency'] = session.controller.as_dict()
+        return summary
+
+    def report(self):
+        """One line per operation, as printed by --stats"""
+
+        return '\n'.join(str(operation) for operation in self.by_time())
+
+    def prometheus(self, session=None):
+        """The metrics in the Prometheus text exposition format"""
+
+        lines = []
+
+        def metric(name, kind, help):
+            name = PROMETHEUS_PREFIX + '_' + name
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            return name
+
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+        operations = self.by_time()
+
+        name = metric('request_duration_seconds', 'histogram',
+                      "Time spent in Swift and Keystone requests")
+        for operation in operations:
+            for bound, count in operation.latency.cumulative():
+                lines.append('%s_bucket{operation="%s",le="%s"} %d' % (
+                    name, label(operation.name),
+                    '+Inf' if bound == float('inf') else repr(bound), count))
+            lines.append('%s_sum{operation="%s"} %f' % (
+                name, label(operation.name), operation.latency.sum))
+            lines.append('%s_count{operation="%s"} %d' % (
+                name, label(operation.name), operation.latency.count))
+
+        name = metric('responses_total', 'counter',
+                      "Responses by operation and status")
+        for operation in operations:
+            for status, count in sorted(operation.statuses.items()):
+                lines.append('%s{operation="%s",status="%s"} %d' % (
+                    name, label(operation.name), label(status), count))
+
+        for key, help in (('errors', "Requests that failed"),
+                          ('retries', "Attempts repeated by urllib3"),
+                          ('bytes_sent', "Request body bytes"),
+                          ('bytes_received', "Response body bytes")):
+            name = metric(key + '_total', 'counter', help)
+            for operation in operations:
+                lines.append('%s{operation="%s"} %d' % (
+                    name, label(operation.name), getattr(operation, key)))
+
+        if session is not None:
+            stats = session.stats()
+            name = metric('connections_opened_total', 'counter',
+                          "Connections opened by the session's pools")
+            lines.append('%s %d' % (name, stats['connections']))
+            name = metric('connections_reused_total', 'counter',
+                          "Requests sent over an already open connection")
+            lines.append('%s %d' % (name, stats['reused']))
+
+            controller = session.controller
+            if controller is not None:
+                name = metric('concurrency_limit', 'gauge',
+                              "Requests the adaptive controller lets run")
+                lines.append('%s %d' % (name, controller.level))
+                name = metric('concurrency_backoffs_total', 'counter',
+                              "Times the adaptive controller backed off")
+                lines.append('%s %d' % (name, controller.backoffs))
+
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTrace(object):
+    """Session observer writing every RequestRecord as a JSON line"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.fp = open(path, 'a')
+
+    def __call__(self, record):
+        line = json.dumps(record.as_dict()) + '\n'
+        with self.lock:
+            if self.fp is not None:
+                self.fp.write(line)
+                self.fp.flush()
+
+    def close(self):
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+
+
+def _write_file(path, data):
+    """Replace path at once, a scraper never sees half a file"""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+    os.chmod(tmp, 0644)
+    os.rename(tmp, path)
+
+
+class Instrumentation(object):
+    """Metrics of a session's requests, exported when the program ends.
+
+    json_path receives the summary of Metrics as JSON ('-' for stderr),
+    prometheus_path the same metrics for a textfile collector, and
+    trace_path one JSON line per request as it completes.  Nothing is
+    recorded unless one of them is set or `enabled` is forced.
+    """
+
+    def __init__(self, json_path=None, prometheus_path=None,
+                 trace_path=None, enabled=False):
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.trace_path = trace_path
+        self.enabled = enabled or bool(json_path or prometheus_path or
+                                       trace_path)
+        self.metrics = Metrics()
+        self.trace = None
+
+    @classmethod
+    def from_config(cls, conf, json_path=None, prometheus_path=None,
+                    trace_path=None, enabled=False):
+        """Paths not given are read from the optional [metrics] section"""
+
+        return cls(
+            json_path=json_path or conf_get(conf, 'metrics', 'json'),
+            prometheus_path=prometheus_path or conf_get(conf, 'metrics',
+                                                        'prometheus'),
+            trace_path=trace_path or conf_get(conf, 'metrics', 'trace'),
+            enabled=enabled)
+
+    def attach(self, session):
+        if not self.enabled:
+            return
+        session.add_observer(self.metrics)
+        if self.trace_path:
+            self.trace = RequestTrace(self.trace_path)
+            session.add_observer(self.trace)
+
+    def export(self, session=None):
+        if self.trace is not None:
+            self.trace.close()
+
+        if self.json_path:
+            data = json.dumps(self.metrics.summary(session), indent=2) + '\n'
+            if self.json_path == '-':
+                sys.stderr.write(data)
+            else:
+                _write_file(self.json_path, data)
+
+        if self.prometheus_path:
+            _write_file(self.prometheus_path,
+                        self.metrics.prometheus(session))
@@ -0,0 +1,179 @@
+import threading
+
+from tc_object_storage.common import container_url, object_url, quote
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.workers import ThreadPool, imap_unordered
+
+DEFAULT_CONCURRENCY = 64
+
+
+def list_objects(client, container=None, prefix=None, delimiter=None,
+                 full=False):
+    return list(iter_listing(client, container, prefix=prefix,
+                             delimiter=delimiter, full=full))
+
+
+def head_object(client, container, object_name):
+    response = client.session.head(object_url(client, container, object_name),
+                                   headers=client.headers)
+    response.raise_for_status()
+    return response.headers
+
+
+def get_object(client, container, object_name):
+    """Return the body of a (small) object"""
+
+    response = client.session.get(object_url(client, container, object_name),
+                                  headers=client.headers)
+    response.raise_for_status()
+    return response.content
+
+
+def put_object(client, container, object_name, data, headers=None):
+    """Store data (a string or file-like object), return its ETag"""
+
+    request_headers = dict(client.headers)
+    request_headers['Content-Type'] = 'application/octet-stream'
+    if headers:
+        request_headers.update(headers)
+
+    response = client.session.put(object_url(client, container, object_name),
+                                  headers=request_headers, data=data)
+    response.raise_for_status()
+    return response.headers.get('ETag')
+
+
+def delete_object(client, container, object_name):
+    response = client.session.delete(
+        object_url(client, container, object_name), headers=client.headers)
+    response.raise_for_status()
+
+
+def copy_object(client, container, object_name, dest_container, dest_name,
+                flatten=False):
+    """Copy an object server side, the data never leaves the cluster.
+
+    A DLO or SLO manifest is copied as a manifest of the same segments;
+    with flatten set Swift concatenates the segments into a plain object
+    instead (limited to the cluster's maximum object size).
+    """
+
+    request_headers = dict(client.headers)
+    request_headers['X-Copy-From'] = '/' + quote(container) + '/' + \
+        quote(object_name)
+    request_headers['Content-Length'] = '0'
+
+    params = None if flatten else {'multipart-manifest': 'get'}
+    response = client.session.put(object_url(client, dest_container,
+                                             dest_name),
+                                  headers=request_headers, params=params)
+    response.raise_for_status()
+    return response.headers.get('ETag')
+
+
+def head_container(client, container):
+    response = client.session.head(container_url(client, container),
+                                   headers=client.headers)
+    response.raise_for_status()
+    return response.headers
+
+
+def create_container(client, container):
+    response = client.session.put(container_url(client, container),
+                                  headers=client.headers)
+    response.raise_for_status()
+
+
+def delete_container(client, container):
+    response = client.session.delete(container_url(client, container),
+                                     headers=client.headers)
+    response.raise_for_status()
+
+
+class PipelinedClient(object):
+    """Keep up to `concurrency` Swift requests in flight at once.
+
+    Every operation returns a workers.Future right away; the requests run
+    on a pool of `concurrency` threads sharing the client's pooled session,
+    whose per-host pool is grown to match.  Submitting more operations
+    than that blocks until one finishes.  map() streams a large number of
+    operations through the same bound and yields results as they complete;
+    it runs on threads of its own, so the pool is only started by the
+    first submit().
+    """
+
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY):
+        self.client = client
+        self.concurrency = concurrency
+        client.session.ensure_pool_size(concurrency)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.concurrency)
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, operation, *args, **kwargs):
+        return self.pool.submit(operation, self.client, *args, **kwargs)
+
+    def list(self, container=None, prefix=None, delimiter=None, full=False):
+        return self.submit(list_objects, container, prefix, delimiter, full)
+
+    def head(self, container, object_name):
+        return self.submit(head_object, container, object_name)
+
+    def get(self, container, object_name):
+        return self.submit(get_object, container, object_name)
+
+    def put(self, container, object_name, data, headers=None):
+        return self.submit(put_object, container, object_name, data, headers)
+
+    def delete(self, container, object_name):
+        return self.submit(delete_object, container, object_name)
+
+    def copy(self, container, object_name, dest_container, dest_name):
+        return self.submit(copy_object, container, object_name,
+                           dest_container, dest_name)
+
+    def head_container(self, container):
+        return self.submit(head_container, container)
+
+    def create_container(self, container):
+        return self.submit(create_container, container)
+
+    def delete_container(self, container):
+        return self.submit(delete_container, container)
+
+    def map(self, operation, arguments):
+        """Run operation(client, *args) for every args tuple of arguments.
+
+        arguments may be a lazy iterable; (args, result, exc_info) tuples
+        are yielded in completion order.
+        """
+
+        def call(args):
+            return operation(self.client, *args)
+
+        return imap_unordered(call, arguments, self.concurrency)
+
+    def head_all(self, container, prefix=None):
+        """HEAD every object under prefix while the listing is still read"""
+
+        names = ((container, name) for name in
+                 iter_listing(self.client, container, prefix=prefix))
+        return self.map(head_object, names)
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import time
+
+from tc_object_storage.bandwidth import transfer_throttle
+from tc_object_storage.common import TransferResult, container_url, \
+    object_url, quote, format_size
+from tc_object_storage.journal import Journal
+from tc_object_storage.workers import imap_unordered
+
+DEFAULT_SEGMENT_SIZE = 100 * 1024 * 1024
+DEFAULT_SEGMENT_WORKERS = 4
+MANIFEST_TYPES = ('dlo', 'slo')
+
+
+class UploadError(Exception):
+    """An object was not stored as sent (ETag mismatch or failed PUT)."""
+
+
+class SegmentError(UploadError):
+    """A segment of a large object was not stored as sent."""
+
+
+class FileSlice(object):
+    """File-like window over [offset, offset + length) of a local file.
+
+    The slice is read in blocks by httplib, so a segment is never held in
+    memory as a whole, and its MD5 is computed on the way out.  Seeking
+    back to 0 (done by urllib3 before a retry) restarts the digest.  Every
+    block read is paced by throttle, a bandwidth.TransferThrottle, if
+    given, and its size passed to progress, if given.
+    """
+
+    def __init__(self, filename, offset, length, throttle=None,
+                 progress=None):
+        self.fp = open(filename, 'rb')
+        self.offset = offset
+        self.length = length
+        self.throttle = throttle
+        self.progress = progress
+        self.seek(0)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+
+        data = self.fp.read(size)
+        if self.throttle is not None:
+            self.throttle.consume(len(data))
+        self.position += len(data)
+        self.md5.update(data)
+        if self.progress is not None:
+            self.progress(len(data))
+        return data
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=0):
+        if whence == 1:
+            position = self.position + position
+        elif whence == 2:
+            position = self.length + position
+
+        self.fp.seek(self.offset + position)
+        self.position = position
+        if position == 0:
+            self.md5 = hashlib.md5()
+
+    def hexdigest(self):
+        return self.md5.hexdigest()
+
+    def close(self):
+        self.fp.close()
+
+
+class Segment(object):
+    def __init__(self, index, name, offset, size):
+        self.index = index
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.etag = None
+
+
+class UploadResult(TransferResult):
+    def __init__(self, object_name, size, segments, seconds):
+        TransferResult.__init__(self, object_name, size, seconds)
+        self.segments = segments
+
+    def __str__(self):
+        return "%s: %s in %d segment(s), %.2f s, %s/s" % (
+            self.object_name, format_size(self.size), len(self.segments),
+            self.seconds, format_size(self.throughput))
+
+
+class SegmentedUploader(object):
+    """Upload a local file as a Swift large object.
+
+    The file is cut into segment_size pieces which are PUT concurrently by
+    `workers` threads into segment_container (by default
+    '<container>_segments'), each checked against the ETag Swift returns.
+    A DLO (X-Object-Manifest) or SLO (multipart-manifest=put) manifest is
+    written at container/object_name once every segment is stored.
+
+    With journal_dir set, stored segments are checkpointed in a Journal.
+    Running the same upload again after a failure only re-sends the
+    segments that are missing, or whose HEAD no longer shows the ETag and
+    size recorded for them.
+    """
+
+    def __init__(self, client, segment_size=DEFAULT_SEGMENT_SIZE,
+                 workers=DEFAULT_SEGMENT_WORKERS, manifest='dlo',
+                 segment_container=None, journal_dir=None):
+        if manifest not in MANIFEST_TYPES:
+            raise ValueError("manifest must be one of %s" %
+                             ', '.join(MANIFEST_TYPES))
+        if segment_size <= 0:
+            raise ValueError("segment size must be positive")
+
+        self.client = client
+        self.segment_size = segment_size
+        self.workers = workers
+        self.manifest = manifest
+        self.segment_container = segment_container
+        self.journal_dir = journal_dir
+
+    def _headers(self, extra=None):
+        headers = dict(self.client.headers)
+        headers['Content-Type'] = 'application/octet-stream'
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def segment_prefix(self, object_name, filename):
+        """Segments of the same file version always share this prefix"""
+
+        stat = os.stat(filename)
+        return '%s/%f/%d/%d/' % (object_name, stat.st_mtime, stat.st_size,
+                                 self.segment_size)
+
+    def plan(self, object_name, filename):
+        """Return the list of segments the file is cut into"""
+
+        size = os.path.getsize(filename)
+        prefix = self.segment_prefix(object_name, filename)
+
+        segments = []
+        offset = 0
+        while offset < size or not segments:
+            length = min(self.segment_size, size - offset)
+            name = prefix + '%08d' % len(segments)
+            segments.append(Segment(len(segments), name, offset, length))
+            offset += length
+        return segments
+
+    def upload_segment(self, container, filename, segment, throttle=None,
+                       progress=None):
+        url = object_url(self.client, container, segment.name)
+        body = FileSlice(filename, segment.offset, segment.size, throttle,
+                         progress)
+        try:
+            response = self.client.session.put(url, headers=self._headers(),
+                                               data=body)
+            response.raise_for_status()
+        finally:
+            body.close()
+
+        etag = response.headers.get('ETag', '').strip('"')
+        if etag != body.hexdigest():
+            raise SegmentError("segment %s: sent MD5 %s, Swift stored %s" %
+                               (segment.name, body.hexdigest(), etag))
+
+        segment.etag = etag
+        return segment
+
+    def is_stored(self, container, segment, etag):
+        """HEAD a journaled segment, True if it is still as recorded"""
+
+        response = self.client.session.head(
+            object_url(self.client, container, segment.name),
+            headers=self.client.headers)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return response.headers.get('ETag', '').strip('"') == etag and \
+            int(response.headers.get('Content-Length', -1)) == segment.size
+
+    def open_journal(self, container, object_name, filename,
+                     segment_container):
+        stat = os.stat(filename)
+        return Journal.open(
+            self.journal_dir, 'upload', os.path.abspath(filename),
+            '/' + container + '/' + object_name,
+            {'size': stat.st_size, 'mtime': stat.st_mtime,
+             'segment_size': self.segment_size,
+             'segment_container': segment_container})
+
+    def upload(self, container, object_name, filename, headers=None,
+               progress=None):
+        """Upload filename; headers (metadata, ...) go on the manifest
+
+        progress, if given, is called with the size of every block sent.
+        """
+
+        started = time.time()
+
+        segment_container = self.segment_container
+        if segment_container is None:
+            segment_container = container + '_segments'
+
+        response = self.client.session.put(
+            container_url(self.client, segment_container),
+            headers=self.client.headers)
+        response.raise_for_status()
+
+        segments = self.plan(object_name, filename)
+        throttle = transfer_throttle(self.client)
+
+        journal = None
+        if self.journal_dir is not None:
+            journal = self.open_journal(container, object_name, filename,
+                                        segment_container)
+
+        def upload(segment):
+            if journal is not None and journal.is_done(segment.index):
+                etag = journal.completed[segment.index]
+                if self.is_stored(segment_container, segment, etag):
+                    segment.etag = etag
+                    return segment
+
+            self.upload_segment(segment_container, filename, segment,
+                                throttle, progress)
+            if journal is not None:
+                journal.record(segment.index, segment.etag)
+            return segment
+
+        failures = []
+        try:
+            for segment, _, exc_info in imap_unordered(upload, segments,
+                                                       self.workers):
+                if exc_info is not None:
+                    failures.append((segment, exc_info[1]))
+
+            if failures:
+                raise SegmentError("%d of %d segment(s) failed, first: %s" %
+                                   (len(failures), len(segments),
+                                    failures[0][1]))
+
+            self.put_manifest(container, object_name, segment_container,
+                              segments, headers)
+        finally:
+            if journal is not None:
+                journal.close()
+
+        if journal is not None:
+            journal.finish()
+
+        size = sum(segment.size for segment in segments)
+        return UploadResult(object_name, size, segments,
+                            time.time() - started)
+
+    def put_manifest(self, container, object_name, segment_container,
+                     segments, headers=None):
+        url = object_url(self.client, container, object_name)
+
+        if self.manifest == 'slo':
+            manifest = [{'path': '/' + segment_container + '/' + segment.name,
+                         'etag': segment.etag,
+                         'size_bytes': segment.size}
+                        for segment in segments]
+            response = self.client.session.put(
+                url, headers=self._headers(headers),
+                params={'multipart-manifest': 'put'},
+                data=json.dumps(manifest))
+        else:
+            prefix = segments[0].name.rsplit('/', 1)[0] + '/'
+            headers = self._headers(headers)
+            headers['X-Object-Manifest'] = quote(segment_container) + '/' + \
+                quote(prefix)
+            response = self.client.session.put(url, headers=headers, data='')
+
+        response.raise_for_status()
+        return response
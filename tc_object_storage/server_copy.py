@@ -0,0 +1,215 @@
+import time
+import urllib
+
+import requests
+
+from tc_object_storage.common import format_size, object_url, split_path
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.pipeline import copy_object, create_container, \
+    delete_container, delete_object
+from tc_object_storage.workers import imap_unordered
+
+DEFAULT_COPY_WORKERS = 8
+
+
+class CopySummary(object):
+    def __init__(self, move=False):
+        self.move = move
+        self.copied = 0
+        self.bytes = 0
+        self.failures = []
+        self.started = time.time()
+        self.seconds = 0.0
+
+    @property
+    def processed(self):
+        return self.copied + len(self.failures)
+
+    def finish(self):
+        self.seconds = time.time() - self.started
+        return self
+
+    def __str__(self):
+        return "%s %d (%s), failed %d in %.2f s" % (
+            'moved' if self.move else 'copied', self.copied,
+            format_size(self.bytes), len(self.failures), self.seconds)
+
+
+class ServerSideCopier(object):
+    """Copy or move objects inside the cluster with X-Copy-From.
+
+    No data passes through the client: every object is one PUT with
+    X-Copy-From, `workers` of them running concurrently while the source
+    listing is still being read.  A move is a copy followed by a DELETE
+    of the source, only once the copy succeeded.
+
+    DLO and SLO manifests are copied as manifests (multipart-manifest=
+    get), so the copy refers to the same segments, and moving a manifest
+    deletes the manifest alone; segments are only copied or deleted when
+    they are objects of the copied prefix themselves.  A prefix move in
+    which a manifest and its segments would both be moved is refused, as
+    the moved manifest would refer to deleted segments.  With flatten
+    set, manifests are turned into plain objects instead and can be
+    moved with their segments: they are moved first, while all of their
+    segments are still there.  progress, if given, is called with the
+    running CopySummary after every object.
+    """
+
+    def __init__(self, client, workers=DEFAULT_COPY_WORKERS, flatten=False,
+                 progress=None):
+        self.client = client
+        self.workers = workers
+        self.flatten = flatten
+        self.progress = progress
+        client.session.ensure_pool_size(workers)
+
+    def copy_one(self, container, name, dest_container, dest_name,
+                 move=False):
+        copy_object(self.client, container, name, dest_container, dest_name,
+                    flatten=self.flatten)
+        if move:
+            try:
+                delete_object(self.client, container, name)
+            except requests.HTTPError as e:
+                """ Already gone: moved by someone else, the copy stands """
+                if e.response.status_code != 404:
+                    raise
+
+    def moved_segment(self, container, name, prefix):
+        """A segment of manifest name under container/prefix, or None"""
+
+        url = object_url(self.client, container, name)
+        response = self.client.session.head(url, headers=self.client.headers)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+
+        if 'X-Object-Manifest' in response.headers:
+            """ Header values and listed names are both utf-8 str """
+            segment_container, segment_prefix = split_path(
+                urllib.unquote(response.headers['X-Object-Manifest']))
+            if segment_container != container:
+                return None
+            if segment_prefix.startswith(prefix):
+                moved_prefix = segment_prefix
+            elif prefix.startswith(segment_prefix):
+                moved_prefix = prefix
+            else:
+                return None
+            for segment in iter_listing(self.client, container,
+                                        prefix=moved_prefix, page_size=2):
+                if segment != name:
+                    return segment
+            return None
+
+        if 'X-Static-Large-Object' in response.headers:
+            response = self.client.session.get(
+                url, headers=self.client.headers,
+                params={'multipart-manifest': 'get'})
+            response.raise_for_status()
+            for entry in response.json():
+                segment_container, segment = split_path(
+                    entry['name'].encode('utf-8'))
+                if segment_container == container and \
+                        segment.startswith(prefix):
+                    return segment
+        return None
+
+    def moved_manifests(self, container, prefix):
+        """[(entry, segment)] of the manifests moved with a segment
+
+        Only the objects that may be manifests are HEADed: empty ones
+        (DLO) and those listed with an slo_etag (SLO); the listing is
+        streamed, only the manifests found are kept.
+        """
+
+        def check(entry):
+            return self.moved_segment(container, entry['name'], prefix)
+
+        candidates = (entry for entry in iter_listing(
+            self.client, container, prefix=prefix, full=True)
+            if entry.get('bytes') == 0 or 'slo_etag' in entry)
+        manifests = []
+        for entry, segment, exc_info in imap_unordered(check, candidates,
+                                                       self.workers):
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            if segment is not None:
+                manifests.append((entry, segment))
+        manifests.sort(key=lambda manifest: manifest[0]['name'])
+        return manifests
+
+    def copy_objects(self, container, entries, dest_container, rename,
+                     move=False, summary=None):
+        """Copy the listing entries (lazy) to dest_container/rename(name)"""
+
+        if summary is None:
+            summary = CopySummary(move)
+
+        def copy(entry):
+            self.copy_one(container, entry['name'], dest_container,
+                          rename(entry['name']), move)
+
+        for entry, _, exc_info in imap_unordered(copy, entries,
+                                                 self.workers):
+            if exc_info is not None:
+                summary.failures.append((entry['name'], str(exc_info[1])))
+            else:
+                summary.copied += 1
+                summary.bytes += entry.get('bytes', 0)
+            if self.progress is not None:
+                self.progress(summary)
+
+        return summary.finish()
+
+    def copy_prefix(self, container, prefix, dest_container, dest_prefix,
+                    move=False):
+        """Copy every object under prefix, renamed to under dest_prefix"""
+
+        prefix = prefix or ''
+        dest_prefix = dest_prefix or ''
+        if container == dest_container and dest_prefix.startswith(prefix):
+            """ The listing being copied would grow with the copies """
+            raise ValueError("cannot copy /%s/%s into itself" %
+                             (container, prefix))
+
+        rename = lambda name: dest_prefix + name[len(prefix):]
+        manifests = []
+        if move:
+            """ Every manifest is checked before anything is moved """
+            manifests = self.moved_manifests(container, prefix)
+            if manifests and not self.flatten:
+                entry, segment = manifests[0]
+                raise ValueError(
+                    "cannot move /%s/%s with its segment /%s/%s, the moved "
+                    "manifest would lose its data; use --flatten" %
+                    (container, entry['name'], container, segment))
+
+        create_container(self.client, dest_container)
+        summary = CopySummary(move)
+        moved = set(entry['name'] for entry, _ in manifests)
+        if manifests:
+            """ Flattened while their segments are still there """
+            self.copy_objects(container, [entry for entry, _ in manifests],
+                              dest_container, rename, move, summary)
+            if summary.failures:
+                return summary
+
+        entries = iter_listing(self.client, container, prefix=prefix,
+                               full=True)
+        return self.copy_objects(
+            container, (entry for entry in entries
+                        if entry['name'] not in moved),
+            dest_container, rename, move, summary)
+
+    def copy_container(self, container, dest_container, move=False):
+        """Copy every object of container; a move deletes it afterwards"""
+
+        summary = self.copy_prefix(container, '', dest_container, '', move)
+        if move and not summary.failures:
+            try:
+                delete_container(self.client, container)
+            except requests.HTTPError as e:
+                """ Objects were added while moving, they stay behind """
+                summary.failures.append((container, str(e)))
+        return summary
@@ -0,0 +1,236 @@
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from tc_object_storage.common import conf_get
+from tc_object_storage.concurrency import THROTTLE_STATUSES
+from tc_object_storage.metrics import RequestRecord
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _rewind(body):
+    """Prepare body to be sent again, False if it cannot be"""
+
+    if body is None or isinstance(body, basestring):
+        return True
+    if not hasattr(body, 'seek'):
+        return False
+    body.seek(0)
+    return True
+
+
+class PooledSession(requests.Session):
+    """requests.Session with keep-alive connection pools and retries.
+
+    pool_connections is the number of hosts (Keystone, Swift, ...) whose
+    pools are kept, pool_maxsize the number of connections kept per host.
+    With pool_block set, no more than pool_maxsize connections are ever
+    opened to one host at a time.  Connection resets, 429 and 5xx
+    responses are retried max_retries times with exponential backoff, or
+    after the delay of their Retry-After header.
+
+    Observers added with add_observer() are called with a RequestRecord
+    after every request, on the thread that sent it.  A controller set
+    with set_controller() decides how many requests are in flight; 429
+    and 503 are then no longer retried by urllib3 but resent through the
+    controller, once it backed off and its Retry-After hold is over.  The
+    bandwidth.BandwidthLimiter in `bandwidth`, if any, paces the bodies
+    of uploads and downloads.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 keep_alive=True, pool_block=False):
+        requests.Session.__init__(self)
+
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.retry = Retry(total=max_retries,
+                           connect=max_retries,
+                           read=max_retries,
+                           backoff_factor=backoff_factor,
+                           status_forcelist=RETRY_STATUSES,
+                           raise_on_status=False)
+        self.observers = []
+        self.controller = None
+        self.bandwidth = None
+        self._mount_adapters()
+
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+    def _mount_adapters(self):
+        """ One adapter per scheme, each keeping its own pool per host """
+        for prefix in ('http://', 'https://'):
+            self.mount(prefix, HTTPAdapter(
+                pool_connections=self.pool_connections,
+                pool_maxsize=self.pool_maxsize,
+                max_retries=self.retry,
+                pool_block=self.pool_block))
+
+    def ensure_pool_size(self, pool_maxsize):
+        """Grow the per-host pools to keep pool_maxsize connections open.
+
+        Concurrent callers need one connection each; with smaller pools the
+        extra connections are closed after every request.  Open connections
+        of the replaced pools are dropped.
+        """
+
+        if pool_maxsize <= self.pool_maxsize:
+            return
+
+        for adapter in self.adapters.values():
+            adapter.close()
+        self.pool_maxsize = pool_maxsize
+        self._mount_adapters()
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def set_controller(self, controller):
+        """Gate every request on a concurrency.ConcurrencyController"""
+
+        self.controller = controller
+        self.add_observer(controller)
+        """ urllib3 retries any 429/503 with a Retry-After by default """
+        self.retry = self.retry.new(status_forcelist=[
+            status for status in RETRY_STATUSES
+            if status not in THROTTLE_STATUSES],
+            respect_retry_after_header=False)
+        for adapter in self.adapters.values():
+            adapter.close()
+        self._mount_adapters()
+        self.ensure_pool_size(controller.maximum)
+
+    def send(self, request, **kwargs):
+        if self.controller is None:
+            return self._send(request, **kwargs)
+
+        for attempt in range(self.max_retries + 1):
+            response = self._controlled_send(request, **kwargs)
+            if response.status_code not in THROTTLE_STATUSES or \
+                    attempt == self.max_retries or \
+                    not _rewind(request.body):
+                return response
+            response.content
+            response.close()
+            if 'Retry-After' not in response.headers:
+                """ No hold from the controller, urllib3's backoff instead """
+                time.sleep(self.backoff_factor * 2 ** attempt)
+
+    def _controlled_send(self, request, **kwargs):
+        controller = self.controller
+        controller.acquire()
+        try:
+            response = self._send(request, **kwargs)
+        except BaseException:
+            controller.release()
+            raise
+
+        if not kwargs.get('stream', False):
+            controller.release()
+            return response
+
+        """ A streamed body is still being transferred until closed """
+        close = response.close
+        released = []
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    controller.release()
+        response.close = close_and_release
+        return response
+
+    def _send(self, request, **kwargs):
+        if not self.observers:
+            return requests.Session.send(self, request, **kwargs)
+
+        """ A chunked body is counted as it is sent """
+        sent = None
+        if request.headers.get('Transfer-Encoding') == 'chunked':
+            sent = [0]
+            chunks = request.body
+
+            def counted():
+                for chunk in chunks:
+                    sent[0] += len(chunk)
+                    yield chunk
+            request.body = counted()
+
+        started = time.time()
+        try:
+            response = requests.Session.send(self, request, **kwargs)
+        except Exception:
+            exc_info = sys.exc_info()
+            self._notify(RequestRecord(request, None, started,
+                time.time() - started, bytes_sent=sent and sent[0],
+                error=exc_info[1]))
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        """ A resent request (TokenAuth) was recorded by its own send() """
+        first = response
+        if response.history and getattr(response.request, 'reauthenticated',
+                                        False):
+            first = response.history[0]
+        self._notify(RequestRecord(request, first, started,
+            time.time() - started, stream=kwargs.get('stream', False),
+            bytes_sent=sent and sent[0]))
+        return response
+
+    def _notify(self, record):
+        for observer in self.observers:
+            observer(record)
+
+    @classmethod
+    def from_config(cls, conf):
+        """Build a session from the optional [connection] section of setup.ini"""
+
+        return cls(
+            pool_connections=conf_get(conf, 'connection', 'pool_connections',
+                                      DEFAULT_POOL_CONNECTIONS, int),
+            pool_maxsize=conf_get(conf, 'connection', 'pool_maxsize',
+                                  DEFAULT_POOL_MAXSIZE, int),
+            max_retries=conf_get(conf, 'connection', 'max_retries',
+                                 DEFAULT_MAX_RETRIES, int),
+            backoff_factor=conf_get(conf, 'connection', 'backoff_factor',
+                                    DEFAULT_BACKOFF_FACTOR, float),
+            keep_alive=conf_get(conf, 'connection', 'keep_alive', True, bool),
+            pool_block=conf_get(conf, 'connection', 'pool_block', False, bool))
+
+    def stats(self):
+        """Return request/connection counters of the live host pools.
+
+        'reused' is the number of requests that were served over an already
+        open connection instead of paying a new TCP+TLS handshake.
+        """
+
+        stats = {'requests': 0, 'connections': 0, 'reused': 0, 'hosts': 0}
+        for adapter in self.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                if pool is None:
+                    continue
+                stats['hosts'] += 1
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
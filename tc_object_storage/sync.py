@@ -0,0 +1,240 @@
+import calendar
+import os
+import re
+import time
+
+from tc_object_storage.bulk import BulkDeleter
+from tc_object_storage.common import object_url, format_size
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.segments import SegmentedUploader, \
+    DEFAULT_SEGMENT_SIZE, DEFAULT_SEGMENT_WORKERS
+from tc_object_storage.upload import file_md5, upload_file
+from tc_object_storage.workers import imap_unordered
+
+DEFAULT_SYNC_WORKERS = 8
+MTIME_HEADER = 'X-Object-Meta-Mtime'
+
+LAST_MODIFIED_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})T'
+                              r'(\d{2}):(\d{2}):(\d{2})')
+
+
+def parse_last_modified(value):
+    """Convert a listing's '2016-01-01T00:00:00.000000' to epoch seconds.
+
+    Not time.strptime(): it is called from the sync threads, and the
+    first strptime() of a Python 2 process is not thread safe.
+    """
+
+    match = LAST_MODIFIED_RE.match(value)
+    if match is None:
+        raise ValueError("invalid last_modified: %r" % value)
+    return calendar.timegm(tuple(int(part) for part in match.groups()))
+
+
+class LocalFile(object):
+    __slots__ = ('name', 'path', 'size', 'mtime')
+
+    def __init__(self, name, path, size, mtime):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+
+def walk_local(local_dir):
+    """Return the files under local_dir sorted by their '/'-joined name"""
+
+    files = []
+    for root, dirs, filenames in os.walk(local_dir):
+        relative = os.path.relpath(root, local_dir)
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if relative == os.curdir:
+                name = filename
+            else:
+                name = '/'.join(relative.split(os.sep) + [filename])
+            files.append(LocalFile(name, path, stat.st_size, stat.st_mtime))
+
+    files.sort(key=lambda local: local.name)
+    return files
+
+
+def merge(local_files, remote_entries, prefix=''):
+    """Pair sorted local files with a sorted remote listing by name.
+
+    Yields (local, remote) where either side may be None.
+    """
+
+    remote_entries = iter(remote_entries)
+    remote = next(remote_entries, None)
+
+    for local in local_files:
+        while remote is not None and remote['name'][len(prefix):] < local.name:
+            yield None, remote
+            remote = next(remote_entries, None)
+
+        if remote is not None and remote['name'][len(prefix):] == local.name:
+            yield local, remote
+            remote = next(remote_entries, None)
+        else:
+            yield local, None
+
+    while remote is not None:
+        yield None, remote
+        remote = next(remote_entries, None)
+
+
+class SyncSummary(object):
+    def __init__(self):
+        self.uploaded = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.failures = []
+        self.bytes = 0
+        self.started = time.time()
+        self.seconds = 0.0
+
+    def __str__(self):
+        return "uploaded %d (%s), unchanged %d, deleted %d, failed %d " \
+               "in %.2f s" % (self.uploaded, format_size(self.bytes),
+                              self.unchanged, self.deleted,
+                              len(self.failures), self.seconds)
+
+
+class DirectorySync(object):
+    """Make container/prefix mirror a local directory tree.
+
+    Local files and the remote JSON listing are walked side by side in
+    name order, so the remote side is never held in memory.  A file is
+    uploaded when no object has its name, when the sizes differ, or when
+    its mtime is newer than the object's last_modified and its MD5 differs
+    from the listed ETag (with checksum set, MD5s are always compared).
+    Files above segment_size are uploaded as large objects and compared
+    via the X-Object-Meta-Mtime stored on every upload.  Uploads run on
+    `workers` threads; with delete set, objects without a local file are
+    removed afterwards.
+    """
+
+    def __init__(self, client, workers=DEFAULT_SYNC_WORKERS, delete=False,
+                 checksum=False, segment_size=DEFAULT_SEGMENT_SIZE,
+                 segment_workers=DEFAULT_SEGMENT_WORKERS, manifest='dlo',
+                 segment_container=None, index=None, progress=None,
+                 journal_dir=None):
+        self.client = client
+        self.workers = workers
+        self.delete = delete
+        self.checksum = checksum
+        self.uploader = SegmentedUploader(client, segment_size=segment_size,
+                                          workers=segment_workers,
+                                          manifest=manifest,
+                                          segment_container=segment_container,
+                                          journal_dir=journal_dir)
+        self.index = index
+        self.progress = progress
+
+    def is_large(self, local):
+        return local.size > self.uploader.segment_size
+
+    def is_unchanged(self, container, local, remote):
+        if remote is None:
+            return False
+
+        """ Manifests list with their own size, ask for the object's """
+        if self.is_large(local) or (remote['bytes'] == 0 and local.size > 0):
+            response = self.client.session.head(
+                object_url(self.client, container, remote['name']),
+                headers=self.client.headers)
+            if response.status_code == 404:
+                return False
+            response.raise_for_status()
+            return int(response.headers['Content-Length']) == local.size and \
+                response.headers.get(MTIME_HEADER) == '%f' % local.mtime
+
+        if remote['bytes'] != local.size:
+            return False
+        if not self.checksum and \
+                local.mtime <= parse_last_modified(remote['last_modified']):
+            return True
+        return file_md5(local.path) == remote['hash']
+
+    def sync_file(self, container, object_name, local, remote):
+        """Return the upload's result, or None if the file is unchanged"""
+
+        if self.is_unchanged(container, local, remote):
+            return None
+
+        headers = {MTIME_HEADER: '%f' % local.mtime}
+        if self.is_large(local):
+            return self.uploader.upload(container, object_name, local.path,
+                                        headers)
+        return upload_file(self.client, container, object_name, local.path,
+                           headers)
+
+    def _record(self, summary):
+        if self.progress is not None:
+            self.progress(summary)
+
+    def sync(self, local_dir, container, prefix=''):
+        summary = SyncSummary()
+        if prefix and not prefix.endswith('/'):
+            prefix = prefix + '/'
+
+        if self.index is not None:
+            self.index.refresh(container)
+            remote_entries = self.index.iter_objects(container, prefix)
+        else:
+            remote_entries = iter_listing(self.client, container,
+                                          prefix=prefix, full=True)
+        orphans = []
+        uploaded = []
+
+        def changes():
+            for local, remote in merge(walk_local(local_dir), remote_entries,
+                                       prefix):
+                if local is None:
+                    """ Zero byte 'folder/' markers are not orphans """
+                    if not remote['name'].endswith('/'):
+                        orphans.append(remote['name'])
+                else:
+                    yield local, remote
+
+        def sync(pair):
+            local, remote = pair
+            return self.sync_file(container, prefix + local.name, local,
+                                  remote)
+
+        for (local, _), result, exc_info in imap_unordered(sync, changes(),
+                                                           self.workers):
+            if exc_info is not None:
+                summary.failures.append((local.path, str(exc_info[1])))
+            elif result is not None:
+                summary.uploaded += 1
+                summary.bytes += local.size
+                uploaded.append(result)
+            else:
+                summary.unchanged += 1
+            self._record(summary)
+
+        if self.delete and orphans:
+            deleted = BulkDeleter(self.client, workers=self.workers) \
+                .delete_objects(container, orphans)
+            summary.deleted = deleted.deleted
+            summary.failures.extend(deleted.failures)
+            self._record(summary)
+
+        if self.index is not None and (uploaded or summary.deleted):
+            for result in uploaded:
+                self.index.record_upload(container, result.object_name,
+                                         result.size, result.etag)
+            if self.delete:
+                failed = set(name for name, _ in summary.failures)
+                self.index.record_delete(container, [name for name in orphans
+                                                     if name not in failed])
+            self.index.settle(container)
+
+        summary.seconds = time.time() - summary.started
+        return summary
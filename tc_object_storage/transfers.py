@@ -0,0 +1,178 @@
+import Queue
+import sys
+import threading
+import time
+
+from tc_object_storage.common import format_size
+
+DEFAULT_TRANSFER_WORKERS = 4
+
+
+class ActiveTransfer(object):
+    """A transfer in progress: its arguments and the bytes sent so far.
+
+    args are those of the queued upload, (container, object_name, ...);
+    sent() may be called from several threads (segment workers) at once.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.name = args[1]
+        self.bytes = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def sent(self, size):
+        with self.lock:
+            self.bytes += size
+
+    @property
+    def throughput(self):
+        seconds = time.time() - self.started
+        if seconds <= 0:
+            return 0.0
+        return self.bytes / seconds
+
+    def __str__(self):
+        return "%s %s at %s/s" % (self.name, format_size(self.bytes),
+                                  format_size(self.throughput))
+
+
+class TransferStatus(object):
+    """Snapshot of a TransferQueue, safe to read from any thread."""
+
+    def __init__(self, queued, active, done, failures, bytes, seconds, last):
+        self.queued = queued
+        self.active = active
+        self.done = done
+        self.failures = failures
+        self.bytes = bytes
+        self.seconds = seconds
+        self.last = last
+
+    @property
+    def throughput(self):
+        """Bytes per second over the time transfers were running"""
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / self.seconds
+
+    @property
+    def idle(self):
+        return self.queued == 0 and not self.active
+
+    def __str__(self):
+        total = self.done + len(self.failures) + len(self.active) + \
+            self.queued
+        text = "uploaded %d/%d, %s at %s/s" % (
+            self.done, total, format_size(self.bytes),
+            format_size(self.throughput))
+        if self.failures:
+            text += ", %d failed" % len(self.failures)
+        if self.active:
+            text += " | " + ", ".join(str(each) for each in self.active)
+        elif self.last is not None:
+            text += " | last: %s" % self.last
+        return text
+
+
+class TransferQueue(object):
+    """Run transfers on `workers` background threads.
+
+    enqueue() never blocks: the arguments are queued and
+    transfer(*args, progress=callable) is called on a worker thread, in
+    queue order, and must return a TransferResult; it reports the bytes
+    it sends to progress as it goes.  status() gives the progress, the
+    rate of every active transfer included, at any time, and
+    on_done(args, result, exc_info), if given, is called on the worker
+    thread after every transfer.  Aggregate throughput only counts the
+    time at least one transfer was running.
+    """
+
+    def __init__(self, transfer, workers=DEFAULT_TRANSFER_WORKERS,
+                 on_done=None):
+        self.transfer = transfer
+        self.on_done = on_done
+        self.lock = threading.Lock()
+        self.tasks = Queue.Queue()
+
+        self.queued = 0
+        self.active = {}
+        self.done = 0
+        self.failures = []
+        self.bytes = 0
+        self.seconds = 0.0
+        self.busy_since = None
+        self.last = None
+
+        self.threads = []
+        for _ in range(max(int(workers), 1)):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def enqueue(self, *args):
+        with self.lock:
+            self.queued += 1
+        self.tasks.put(args)
+
+    def _work(self):
+        while True:
+            args = self.tasks.get()
+            if args is None:
+                return
+
+            key = object()
+            active = ActiveTransfer(args)
+            with self.lock:
+                self.queued -= 1
+                if not self.active:
+                    self.busy_since = time.time()
+                self.active[key] = active
+
+            try:
+                result, exc_info = self.transfer(*args,
+                                                 progress=active.sent), None
+            except Exception:
+                result, exc_info = None, sys.exc_info()
+
+            with self.lock:
+                del self.active[key]
+                if exc_info is None:
+                    self.done += 1
+                    self.bytes += result.size
+                    self.last = result
+                else:
+                    self.failures.append((args, str(exc_info[1])))
+                if not self.active:
+                    self.seconds += time.time() - self.busy_since
+                    self.busy_since = None
+
+            if self.on_done is not None:
+                self.on_done(args, result, exc_info)
+
+    def status(self):
+        with self.lock:
+            seconds = self.seconds
+            if self.busy_since is not None:
+                seconds += time.time() - self.busy_since
+            active = sorted(self.active.values(),
+                            key=lambda each: each.started)
+            return TransferStatus(self.queued, active,
+                                  self.done, list(self.failures), self.bytes,
+                                  seconds, self.last)
+
+    def close(self):
+        """Let queued transfers finish, then stop the threads"""
+
+        for _ in self.threads:
+            self.tasks.put(None)
+
+    def join(self):
+        """Wait for the threads stopped by close() to end"""
+
+        for thread in self.threads:
+            """ A timeout keeps KeyboardInterrupt deliverable """
+            while thread.is_alive():
+                thread.join(1)
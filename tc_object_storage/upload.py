@@ -0,0 +1,117 @@
+import hashlib
+import mimetypes
+import os
+import time
+
+from tc_object_storage.bandwidth import transfer_throttle
+from tc_object_storage.common import TransferResult, object_url
+from tc_object_storage.segments import FileSlice, UploadError
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def guess_content_type(name):
+    """Content-Type for an object name, from its extension."""
+
+    content_type, encoding = mimetypes.guess_type(name)
+    if content_type is None or encoding is not None:
+        """ 'x.tar.gz' is stored as is, not as a transparently gzipped tar """
+        return 'application/octet-stream'
+    return content_type
+
+
+def file_md5(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    md5 = hashlib.md5()
+    fp = open(filename, 'rb')
+    try:
+        for chunk in iter(lambda: fp.read(chunk_size), ''):
+            md5.update(chunk)
+    finally:
+        fp.close()
+    return md5.hexdigest()
+
+
+def _request_headers(client, object_name, headers, content_type):
+    request_headers = dict(client.headers)
+    request_headers['Content-Type'] = content_type or \
+        guess_content_type(object_name)
+    if headers:
+        request_headers.update(headers)
+    return request_headers
+
+
+def _check_etag(object_name, response, md5):
+    etag = response.headers.get('ETag', '').strip('"')
+    if etag != md5:
+        raise UploadError("%s: sent MD5 %s, Swift stored %s" %
+                          (object_name, md5, etag))
+    return etag
+
+
+def upload_file(client, container, object_name, filename, headers=None,
+                content_type=None, send_etag=False, progress=None):
+    """PUT a local file as one object, streamed from disk.
+
+    The body is the raw file, read in blocks as it is sent, with its
+    Content-Length and a Content-Type guessed from the object name unless
+    given.  The MD5 computed while sending is checked against the ETag
+    Swift returns; with send_etag the file is hashed beforehand as well
+    and the ETag sent along, so Swift refuses (422) a body corrupted on
+    the way instead of storing it.  progress, if given, is called with
+    the size of every block sent.  Returns a TransferResult.
+    """
+
+    started = time.time()
+
+    request_headers = _request_headers(client, object_name, headers,
+                                       content_type)
+    if send_etag:
+        request_headers['ETag'] = file_md5(filename)
+
+    body = FileSlice(filename, 0, os.path.getsize(filename),
+                     transfer_throttle(client), progress)
+    try:
+        response = client.session.put(
+            object_url(client, container, object_name),
+            headers=request_headers, data=body)
+        response.raise_for_status()
+    finally:
+        body.close()
+
+    etag = _check_etag(object_name, response, body.hexdigest())
+    return TransferResult(object_name, len(body), time.time() - started,
+                          etag)
+
+
+def upload_stream(client, container, object_name, stream, headers=None,
+                  content_type=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """PUT whatever can be read from stream (stdin, a pipe) as one object.
+
+    The size is not known up front, so the body is sent with chunked
+    transfer encoding, chunk_size bytes at a time; a body that is sent
+    this way cannot be resent, so there are no retries.  The MD5 of the
+    data read is checked against the ETag Swift returns.  Returns a
+    TransferResult.
+    """
+
+    started = time.time()
+    md5 = hashlib.md5()
+    sent = [0]
+    throttle = transfer_throttle(client)
+
+    def chunks():
+        for chunk in iter(lambda: stream.read(chunk_size), ''):
+            if throttle is not None:
+                throttle.consume(len(chunk))
+            md5.update(chunk)
+            sent[0] += len(chunk)
+            yield chunk
+
+    response = client.session.put(
+        object_url(client, container, object_name),
+        headers=_request_headers(client, object_name, headers, content_type),
+        data=chunks())
+    response.raise_for_status()
+
+    etag = _check_etag(object_name, response, md5.hexdigest())
+    return TransferResult(object_name, sent[0], time.time() - started, etag)
@@ -0,0 +1,123 @@
+import requests
+
+from tc_object_storage.common import format_size
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.pipeline import head_object
+
+
+class FolderUsage(object):
+    """Objects and bytes under one pseudo-folder, subfolders included"""
+
+    def __init__(self, path, depth, name=None):
+        self.path = path
+        self.depth = depth
+        self.name = name
+        self.objects = 0
+        self.bytes = 0
+
+    def add(self, other):
+        self.objects += other.objects
+        self.bytes += other.bytes
+
+    def __str__(self):
+        return "%-12s %10d  %s" % (format_size(self.bytes), self.objects,
+                                   self.path or '/')
+
+
+def iter_usage(entries, prefix='', delimiter='/', max_depth=None):
+    """Total the JSON listing entries under prefix per pseudo-folder.
+
+    entries must come in listing (name) order, as Swift and the
+    ListingIndex return them: everything under a folder is then one run
+    of entries, so only the folders leading to the current name are ever
+    held, and a folder is yielded as soon as the listing has left it.
+    Like du, subfolders come before their parent and the total of prefix
+    itself comes last (depth 0).  Folders deeper than max_depth are
+    counted in their ancestor at max_depth instead of being yielded.
+
+    Sizes are those of the listing: a DLO manifest counts as 0 bytes,
+    its segments where they are stored; see manifest_sizes().
+    """
+
+    open_folders = [FolderUsage(prefix, 0)]
+
+    for entry in entries:
+        if 'subdir' in entry:
+            continue
+
+        folders = entry['name'][len(prefix):].split(delimiter)[:-1]
+        if max_depth is not None:
+            folders = folders[:max_depth]
+
+        """ Keep the open folders this name is still under """
+        depth = 0
+        while depth < len(folders) and depth + 1 < len(open_folders) and \
+                open_folders[depth + 1].name == folders[depth]:
+            depth += 1
+        while len(open_folders) > depth + 1:
+            folder = open_folders.pop()
+            open_folders[-1].add(folder)
+            yield folder
+
+        for name in folders[depth:]:
+            parent = open_folders[-1]
+            open_folders.append(FolderUsage(parent.path + name + delimiter,
+                                            parent.depth + 1, name))
+
+        open_folders[-1].objects += 1
+        open_folders[-1].bytes += entry.get('bytes', 0)
+
+    while len(open_folders) > 1:
+        folder = open_folders.pop()
+        open_folders[-1].add(folder)
+        yield folder
+    yield open_folders[0]
+
+
+def manifest_sizes(client, container, entries):
+    """Pass listing entries on, DLO manifests with their real size.
+
+    A DLO manifest is listed with its own size, 0 bytes.  Every empty
+    object is HEADed, one after the other, and a manifest is given the
+    Content-Length of its segments; segments listed under the same
+    prefix are then counted twice.  Listing order is kept.
+    """
+
+    for entry in entries:
+        if entry.get('bytes') == 0 and 'subdir' not in entry:
+            try:
+                headers = head_object(client, container, entry['name'])
+            except requests.HTTPError as e:
+                """ Deleted since it was listed """
+                if e.response.status_code != 404:
+                    raise
+                headers = {}
+            if 'X-Object-Manifest' in headers:
+                entry = dict(entry, bytes=int(headers['Content-Length']))
+        yield entry
+
+
+def container_usage(client, container, prefix='', delimiter='/',
+                    max_depth=None):
+    """iter_usage() over a streamed listing of container"""
+
+    entries = iter_listing(client, container, prefix=prefix, full=True)
+    return iter_usage(entries, prefix or '', delimiter, max_depth)
+
+
+def subfolder_usage(client, container, prefix='', delimiter='/',
+                    entries=None):
+    """Return {'folder/': FolderUsage} for the folders right below prefix
+
+    entries, the full listing under prefix, is read from container
+    unless given.
+    """
+
+    prefix = prefix or ''
+    if entries is None:
+        usage = container_usage(client, container, prefix, delimiter,
+                                max_depth=1)
+    else:
+        usage = iter_usage(entries, prefix, delimiter, max_depth=1)
+    return dict((folder.path[len(prefix):], folder) for folder in usage
+                if folder.depth == 1)
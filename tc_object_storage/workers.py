@@ -0,0 +1,216 @@
+import Queue
+import sys
+import threading
+import time
+
+_DONE = object()
+_FEED_ERROR = object()
+
+
+def _get(queue):
+    """Blocking Queue.get() that still lets KeyboardInterrupt through."""
+
+    while True:
+        try:
+            return queue.get(True, 1)
+        except Queue.Empty:
+            continue
+
+
+def _put(queue, item):
+    """Blocking Queue.put() that still lets KeyboardInterrupt through."""
+
+    while True:
+        try:
+            return queue.put(item, True, 1)
+        except Queue.Full:
+            continue
+
+
+def imap_unordered(func, iterable, workers, max_pending=None):
+    """Apply func to every item of iterable on a bounded pool of threads.
+
+    Items are pulled from iterable lazily, so at most max_pending of them
+    wait in memory at a time, and (item, result, exc_info) tuples are
+    yielded in completion order.  exc_info is None on success; errors
+    raised by the iterable itself are re-raised to the caller.
+    """
+
+    workers = max(int(workers), 1)
+    if max_pending is None:
+        max_pending = workers * 2
+
+    tasks = Queue.Queue(max_pending)
+    results = Queue.Queue()
+    stop = threading.Event()
+
+    def feed():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        tasks.put(item, True, 0.1)
+                        break
+                    except Queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        except Exception:
+            results.put((_FEED_ERROR, None, sys.exc_info()))
+        finally:
+            for _ in range(workers):
+                tasks.put(_DONE)
+
+    def work():
+        while True:
+            item = _get(tasks)
+            if item is _DONE:
+                results.put(_DONE)
+                return
+            if stop.is_set():
+                continue
+            try:
+                results.put((item, func(item), None))
+            except Exception:
+                results.put((item, None, sys.exc_info()))
+
+    threads = [threading.Thread(target=feed)]
+    threads.extend(threading.Thread(target=work) for _ in range(workers))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        finished = 0
+        while finished < workers:
+            entry = _get(results)
+            if entry is _DONE:
+                finished += 1
+                continue
+            if entry[0] is _FEED_ERROR:
+                exc_info = entry[2]
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield entry
+    finally:
+        stop.set()
+
+
+class RateLimiter(object):
+    """Spread calls to wait() so that at most `rate` pass per second.
+
+    Shared between threads; a rate of None or 0 means unlimited.
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = time.time()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + 1.0 / self.rate
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Future(object):
+    """Result of a call running on a ThreadPool."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done.is_set()
+
+    def _wait(self, timeout):
+        if timeout is None:
+            """ Event.wait() without timeout ignores KeyboardInterrupt """
+            while not self._done.wait(1):
+                pass
+        elif not self._done.wait(timeout):
+            raise RuntimeError("timed out waiting for the result")
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        return self._exc_info[1] if self._exc_info is not None else None
+
+    def add_done_callback(self, callback):
+        """Call callback(future) once the result is in"""
+
+        self._callbacks.append(callback)
+        if self.done():
+            callback(self)
+
+    def _finish(self, result, exc_info):
+        self._result = result
+        self._exc_info = exc_info
+        self._done.set()
+        for callback in self._callbacks:
+            callback(self)
+
+
+class ThreadPool(object):
+    """Run submitted calls on `workers` threads, at most that many at once.
+
+    submit() blocks while `workers` calls are already queued or running,
+    so a caller producing work faster than it completes is held back
+    instead of piling up an unbounded queue.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(int(workers), 1)
+        self.tasks = Queue.Queue()
+        self.slots = Queue.Queue(self.workers)
+        self.threads = []
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = _get(self.tasks)
+            if task is _DONE:
+                return
+
+            future, func, args, kwargs = task
+            try:
+                result, exc_info = func(*args, **kwargs), None
+            except Exception:
+                result, exc_info = None, sys.exc_info()
+            self.slots.get_nowait()
+            future._finish(result, exc_info)
+
+    def submit(self, func, *args, **kwargs):
+        _put(self.slots, None)
+        future = Future()
+        self.tasks.put((future, func, args, kwargs))
+        return future
+
+    def close(self):
+        """Let queued calls finish, then stop the threads"""
+
+        for _ in self.threads:
+            self.tasks.put(_DONE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
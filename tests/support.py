@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tc_object_storage.benchmark import BenchmarkClient
+from tc_object_storage.fake_swift import FakeSwift
+
+
+class SwiftTestCase(unittest.TestCase):
+    """A FakeSwift per test, a logged in client on it and a scratch dir"""
+
+    max_page_size = 10000
+
+    def setUp(self):
+        self.server = FakeSwift(max_page_size=self.max_page_size).start()
+        self.client = BenchmarkClient(self.server.url)
+        self.scratch = tempfile.mkdtemp(prefix='tc-object-storage-test-')
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.stop()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.scratch, name)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fp = open(path, 'wb')
+        try:
+            fp.write(data)
+        finally:
+            fp.close()
+        return path
+
+    def stored(self, container):
+        """{name: data} of the objects the server holds in container"""
+
+        return dict((name, stored.data) for name, stored in
+                    self.server.containers.get(container, {}).items())
@@ -0,0 +1,70 @@
+import StringIO
+import unittest
+
+import requests
+
+from tc_object_storage.concurrency import ConcurrencyController
+from tc_object_storage.pipeline import create_container, get_object, \
+    put_object
+from tc_object_storage.upload import upload_file, upload_stream
+
+from tests.support import SwiftTestCase
+
+
+class ReauthenticationTest(SwiftTestCase):
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.records = []
+        self.client.session.add_observer(self.records.append)
+
+    def revoke_tokens(self):
+        with self.server.lock:
+            self.server.tokens.clear()
+
+    def statuses(self, operation):
+        return [record.status for record in self.records
+                if record.operation == operation]
+
+    def test_request_is_resent_through_the_session(self):
+        self.revoke_tokens()
+        put_object(self.client, 'c1', 'obj', 'data')
+
+        self.assertEqual(self.stored('c1'), {'obj': 'data'})
+        self.assertEqual(self.statuses('auth'), [200])
+        self.assertEqual(sorted(self.statuses('object_put')), [201, 401])
+
+    def test_resent_request_passes_the_controller(self):
+        controller = ConcurrencyController(initial=1, maximum=1)
+        self.client.session.set_controller(controller)
+        self.revoke_tokens()
+
+        put_object(self.client, 'c1', 'obj', 'data')
+        self.assertEqual(self.stored('c1'), {'obj': 'data'})
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(sorted(self.statuses('object_put')), [201, 401])
+
+    def test_file_body_is_rewound(self):
+        path = self.write_file('file', 'x' * 100000)
+        self.revoke_tokens()
+
+        result = upload_file(self.client, 'c1', 'file', path)
+        self.assertEqual(result.size, 100000)
+        self.assertEqual(get_object(self.client, 'c1', 'file'), 'x' * 100000)
+
+    def test_generator_body_is_not_resent(self):
+        self.revoke_tokens()
+
+        with self.assertRaises(requests.HTTPError) as caught:
+            upload_stream(self.client, 'c1', 'piped',
+                          StringIO.StringIO('y' * 1000))
+        self.assertEqual(caught.exception.response.status_code, 401)
+        self.assertNotIn('piped', self.stored('c1'))
+
+        """ The next request still logs in again """
+        put_object(self.client, 'c1', 'obj', 'data')
+        self.assertEqual(self.stored('c1'), {'obj': 'data'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import ConfigParser
+import os
+import threading
+import time
+import unittest
+
+from tc_object_storage.bandwidth import BandwidthLimiter, Schedule, \
+    parse_rate
+from tc_object_storage.download import download_object
+from tc_object_storage.pipeline import create_container, put_object
+from tc_object_storage.upload import upload_file
+
+from tests.support import SwiftTestCase
+
+
+def local_time(hour, minute):
+    return time.mktime((2024, 1, 1, hour, minute, 0, 0, 0, -1))
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('0'), None)
+        self.assertEqual(parse_rate('unlimited'), None)
+        self.assertEqual(parse_rate(None), None)
+        self.assertEqual(parse_rate('2048'), 2048)
+
+    def test_rate_at(self):
+        schedule = Schedule.parse('08:00-18:00=2048, 22:00-06:30=off',
+                                  default=1024)
+
+        self.assertEqual(schedule.rate_at(local_time(12, 0)), 2048)
+        self.assertEqual(schedule.rate_at(local_time(18, 0)), 1024)
+        self.assertEqual(schedule.rate_at(local_time(23, 0)), None)
+        self.assertEqual(schedule.rate_at(local_time(6, 29)), None)
+        self.assertEqual(schedule.rate_at(local_time(6, 30)), 1024)
+
+    def test_invalid_period(self):
+        self.assertRaises(ValueError, Schedule.parse, '8-18=1M')
+
+    def test_from_config(self):
+        conf = ConfigParser.RawConfigParser()
+        self.assertIsNone(BandwidthLimiter.from_config(conf))
+
+        conf.add_section('bandwidth')
+        conf.set('bandwidth', 'transfer_limit', '4096')
+        conf.set('bandwidth', 'burst', '1024')
+        limiter = BandwidthLimiter.from_config(conf, rate=8192)
+
+        self.assertEqual(limiter.schedule.rate_at(), 8192)
+        self.assertEqual((limiter.transfer_rate, limiter.burst),
+                         (4096, 1024))
+
+
+class LimitedTransferTest(SwiftTestCase):
+
+    rate = 200000
+    burst = 20000
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.data = os.urandom(100000)
+
+    def limit(self, rate=None, transfer_rate=None):
+        self.client.session.bandwidth = BandwidthLimiter(
+            Schedule(default=rate), transfer_rate, self.burst)
+
+    def timed(self, func, *args, **kwargs):
+        started = time.time()
+        func(*args, **kwargs)
+        return time.time() - started
+
+    def test_upload(self):
+        filename = self.write_file('obj', self.data)
+        self.limit(self.rate)
+
+        elapsed = self.timed(upload_file, self.client, 'c1', 'obj', filename)
+
+        self.assertGreater(elapsed, 0.9 * (100000 - self.burst) / self.rate)
+        self.assertEqual(self.stored('c1'), {'obj': self.data})
+
+    def test_download(self):
+        put_object(self.client, 'c1', 'obj', self.data)
+        filename = os.path.join(self.scratch, 'obj')
+        self.limit(self.rate)
+
+        elapsed = self.timed(download_object, self.client, 'c1', 'obj',
+                             filename, chunk_size=4096)
+
+        self.assertGreater(elapsed, 0.9 * (100000 - self.burst) / self.rate)
+
+    def test_transfer_cap(self):
+        filename = self.write_file('obj', self.data)
+        self.limit(transfer_rate=self.rate)
+
+        elapsed = self.timed(upload_file, self.client, 'c1', 'obj', filename)
+
+        self.assertGreater(elapsed, 0.9 * (100000 - self.burst) / self.rate)
+
+    def test_unlimited_schedule_period(self):
+        filename = self.write_file('obj', self.data)
+        self.limit()
+
+        elapsed = self.timed(upload_file, self.client, 'c1', 'obj', filename)
+
+        self.assertLess(elapsed, 0.5 * 100000 / self.rate)
+
+
+class FairnessTest(unittest.TestCase):
+
+    def test_transfers_share_evenly(self):
+        """ One transfer with 4 streams, one with a single stream """
+
+        limiter = BandwidthLimiter(Schedule(default=400000), burst=8192)
+        throttles = [limiter.transfer(), limiter.transfer()]
+        sent = [0, 0]
+        lock = threading.Lock()
+        stop = time.time() + 1.0
+
+        def stream(index):
+            while time.time() < stop:
+                throttles[index].consume(4096)
+                with lock:
+                    sent[index] += 4096
+
+        threads = [threading.Thread(target=stream, args=(index,))
+                   for index in (0, 0, 0, 0, 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLess(sum(sent), 1.5 * 400000)
+        self.assertGreater(min(sent), 0.6 * max(sent))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from tc_object_storage.bulk import BulkDeleter
+from tc_object_storage.pipeline import create_container, put_object
+
+from tests.support import SwiftTestCase
+
+
+class BulkDeleteTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.names = ['a/%03d' % number for number in range(40)] + \
+            ['b/%03d' % number for number in range(10)]
+        for name in self.names:
+            put_object(self.client, 'c1', name, name)
+
+    def test_bulk_requests(self):
+        deleter = BulkDeleter(self.client, workers=4, batch_size=15)
+        before = self.server.requests.get('POST', 0)
+        summary = deleter.delete_objects('c1', self.names[:40] + ['missing'])
+
+        self.assertEqual((summary.deleted, summary.not_found,
+                          summary.failures), (40, 1, []))
+        self.assertEqual(self.server.requests['POST'] - before, 3)
+        self.assertEqual(sorted(self.stored('c1')), self.names[40:])
+
+    def test_one_delete_per_object(self):
+        deleter = BulkDeleter(self.client, workers=4, use_bulk=False)
+        before = self.server.requests.get('DELETE', 0)
+        summary = deleter.delete_objects('c1', ['b/000', 'b/001', 'missing'])
+
+        self.assertEqual((summary.deleted, summary.not_found), (2, 1))
+        self.assertEqual(self.server.requests['DELETE'] - before, 3)
+        self.assertEqual(len(self.stored('c1')), len(self.names) - 2)
+
+    def test_delete_prefix(self):
+        summary = BulkDeleter(self.client).delete_prefix('c1', 'a/')
+
+        self.assertEqual(summary.deleted, 40)
+        self.assertEqual(sorted(self.stored('c1')), self.names[40:])
+
+    def test_purge_container(self):
+        for use_bulk in (True, False):
+            create_container(self.client, 'c2')
+            for name in self.names:
+                put_object(self.client, 'c2', name, name)
+
+            summary = BulkDeleter(self.client, use_bulk=use_bulk) \
+                .purge_container('c2')
+
+            self.assertEqual((summary.deleted, summary.failures),
+                             (len(self.names), []))
+            self.assertNotIn('c2', self.server.containers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import imp
+import os
+import StringIO
+import sys
+import unittest
+
+from tc_object_storage.pipeline import create_container, put_object
+
+from tests.support import SwiftTestCase
+
+CLI_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'tc-object-storage-cli.py')
+
+cli = imp.load_source('tc_object_storage_cli', CLI_PATH)
+
+SETUP_INI = """[default]
+project_id = tenant
+username = user
+
+[object_storage]
+keystone_endpoint = %(url)s
+object_storage_endpoint = %(url)s
+password = secret
+
+[auth]
+token_cache = false
+
+[journal]
+dir = %(journals)s
+"""
+
+
+class Summary(object):
+
+    def __init__(self, failures):
+        self.failures = failures
+
+
+class CommandLineTest(SwiftTestCase):
+    """The CLI's main() against FakeSwift, with a setup.ini in scratch"""
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        for name in ('a/1', 'a/2', 'b/3'):
+            put_object(self.client, 'c1', name, name)
+
+        """ Written by hand: ConfigParser will not add a [default] """
+        filename = self.write_file('setup.ini', SETUP_INI % {
+            'url': self.server.url,
+            'journals': os.path.join(self.scratch, 'journals')})
+
+        self.saved = (cli.config_filename, sys.argv, sys.stdout, sys.stderr,
+                      os.getcwd())
+        cli.config_filename = filename
+        os.chdir(self.scratch)
+
+    def tearDown(self):
+        (cli.config_filename, sys.argv, sys.stdout, sys.stderr,
+         cwd) = self.saved
+        os.chdir(cwd)
+        SwiftTestCase.tearDown(self)
+
+    def main(self, *args):
+        """Exit status of the command line args, stderr kept in .errors"""
+
+        sys.argv = ['tc-object-storage-cli.py'] + list(args)
+        sys.stdout = StringIO.StringIO()
+        sys.stderr = self.errors = StringIO.StringIO()
+        try:
+            return cli.main()
+        finally:
+            sys.stdout, sys.stderr = self.saved[2:4]
+
+    def batch(self, *lines):
+        return self.main('batch', self.write_file('batch.txt',
+                                                  '\n'.join(lines) + '\n'))
+
+    def test_batch_succeeds(self):
+        self.write_file('upload.txt', 'uploaded')
+        self.write_file('tree/file', 'synced')
+
+        status = self.batch('# comment', 'mkdir /c2',
+                            'upload /c2/ upload.txt',
+                            'sync tree /c2/tree/',
+                            'copy -r /c1/a/ /c2/a/',
+                            'delete -r /c1/b/')
+
+        self.assertEqual(status, 0, self.errors.getvalue())
+        self.assertEqual(self.stored('c2'), {'upload.txt': 'uploaded',
+                                             'tree/file': 'synced',
+                                             'a/1': 'a/1', 'a/2': 'a/2'})
+        self.assertEqual(sorted(self.stored('c1')), ['a/1', 'a/2'])
+        self.assertIn('batch: 5 commands, 0 failed', self.errors.getvalue())
+
+        self.assertEqual(self.batch('purge /c2'), 0)
+        self.assertNotIn('c2', self.server.containers)
+
+    def test_failing_lines(self):
+        status = self.batch('delete /c1/missing',
+                            'frobnicate /c1',
+                            'delete -r /c1/a/')
+
+        errors = self.errors.getvalue()
+        self.assertEqual(status, 1)
+        self.assertIn('line 1: delete /c1/missing:', errors)
+        self.assertIn('line 2: frobnicate /c1:', errors)
+        self.assertIn('batch: 3 commands, 2 failed', errors)
+        self.assertEqual(sorted(self.stored('c1')), ['b/3'])
+
+    def test_single_command(self):
+        self.assertEqual(self.main('delete', '-r', '/c1/a/'), 0)
+        self.assertEqual(self.main('delete', '/c1/missing'), 1)
+        self.assertIn('error:', self.errors.getvalue())
+
+    def test_summary_failures(self):
+        """ delete -r, purge and sync fail when any of their objects did """
+
+        sys.argv = ['tc-object-storage-cli.py', 'journals', 'list']
+        client = cli.SwiftClient()
+        for command, method in (('delete -r /c1/a/', 'delete_objects'),
+                                ('purge /c1', 'purge_container'),
+                                ('sync . /c1/', 'sync_directory')):
+            for failures, status in (([], 0), ([('a/1', 'failed')], 1)):
+                setattr(client, method,
+                        lambda *args, **kwargs: Summary(failures))
+
+                args = client.batch_parser.parse_args(command.split())
+                self.assertEqual(args.func(args), status, command)
+
+
+if __name__ == '__main__':
+    unittest.main()
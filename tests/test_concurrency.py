@@ -0,0 +1,152 @@
+import unittest
+
+from tc_object_storage.concurrency import ConcurrencyController
+from tc_object_storage.pipeline import create_container, put_object
+from tc_object_storage.workers import imap_unordered
+
+from tests.support import SwiftTestCase
+
+
+class Record(object):
+    """The fields of a metrics.RequestRecord the controller reads"""
+
+    def __init__(self, seconds=0.02, status=200, retry_statuses=(),
+                 retry_after=None, size=1000, operation='object_put'):
+        self.operation = operation
+        self.seconds = seconds
+        self.status = status
+        self.retry_statuses = list(retry_statuses)
+        self.retry_after = retry_after
+        self.bytes_sent = size
+        self.bytes_received = 0
+
+
+class ControllerTest(unittest.TestCase):
+
+    def controller(self, **kwargs):
+        options = dict(initial=4, minimum=1, maximum=32, window=60.0)
+        options.update(kwargs)
+        return ConcurrencyController(**options)
+
+    def close_window(self, controller, *records):
+        """Feed records as one saturated window, the last one closes it"""
+
+        controller.saturated = True
+        for record in records[:-1]:
+            controller(record)
+        controller.window_started -= controller.window
+        controller(records[-1])
+
+    def reasons(self, controller):
+        return [reason for _, _, reason in controller.history[1:]]
+
+    def test_slow_start_then_additive_increase(self):
+        controller = self.controller()
+
+        self.close_window(controller, *[Record(size=1000)] * 10)
+        self.assertEqual(controller.level, 8)
+        self.close_window(controller, *[Record(size=2000)] * 10)
+        self.assertEqual(controller.level, 16)
+
+        """ Throughput no longer rises: one more request at a time """
+        self.close_window(controller, *[Record(size=2000)] * 10)
+        self.assertEqual(controller.level, 17)
+        self.assertEqual(self.reasons(controller),
+                         ['slow start', 'slow start', 'throughput'])
+
+    def test_unsaturated_window_keeps_the_limit(self):
+        controller = self.controller()
+
+        for record in [Record()] * 9:
+            controller(record)
+        controller.window_started -= controller.window
+        controller(Record())
+
+        self.assertEqual(controller.level, 4)
+
+    def test_throttled_backs_off_once_per_window(self):
+        controller = self.controller(initial=16)
+
+        controller(Record(status=429, retry_after='2'))
+        controller(Record(status=503))
+        controller(Record(retry_statuses=[429]))
+
+        self.assertEqual(controller.level, 8)
+        self.assertEqual((controller.throttled, controller.backoffs), (3, 1))
+        self.assertGreater(controller.hold_until - controller.last_decrease,
+                           1.5)
+
+    def test_failed_request_backs_off(self):
+        controller = self.controller(initial=16)
+
+        controller(Record(status=None))
+
+        self.assertEqual(controller.level, 8)
+        self.assertEqual(self.reasons(controller), ['error'])
+
+    def test_steady_latency_is_not_congestion(self):
+        """ A fast outlier sets no baseline the usual latency exceeds """
+
+        controller = self.controller()
+
+        self.close_window(controller, Record(seconds=0.004),
+                          *[Record(seconds=0.02)] * 20)
+        self.close_window(controller, *[Record(seconds=0.022)] * 20)
+
+        self.assertEqual(controller.backoffs, 0)
+        self.assertEqual(self.reasons(controller),
+                         ['slow start', 'throughput'])
+
+    def test_latency_rise_backs_off(self):
+        controller = self.controller(initial=16)
+
+        for record in [Record(seconds=0.02)] * 20:
+            controller(record)
+        controller.window_started -= controller.window
+        controller(Record(seconds=0.02))
+        self.close_window(controller, *[Record(seconds=0.06)] * 5)
+
+        self.assertEqual(controller.level, 8)
+        self.assertEqual(self.reasons(controller), ['latency'])
+
+
+class ThrottledSessionTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.records = []
+        self.client.session.add_observer(self.records.append)
+
+    def test_urllib3_leaves_throttling_to_the_controller(self):
+        self.assertIn(429, self.client.session.retry.status_forcelist)
+
+        controller = ConcurrencyController(initial=4, maximum=8)
+        self.client.session.set_controller(controller)
+
+        self.assertEqual(sorted(self.client.session.retry.status_forcelist),
+                         [500, 502, 504])
+
+    def test_throttled_requests_are_resent(self):
+        controller = ConcurrencyController(initial=4, maximum=8)
+        self.client.session.set_controller(controller)
+        self.server.latency = 0.05
+        self.server.max_in_flight = 2
+
+        names = ['obj%02d' % number for number in range(12)]
+        results = list(imap_unordered(
+            lambda name: put_object(self.client, 'c1', name, name),
+            names, 8))
+
+        self.assertEqual([exc_info for _, _, exc_info in results],
+                         [None] * len(names))
+        self.assertEqual(sorted(self.stored('c1')), names)
+        self.assertGreater(controller.throttled, 0)
+        self.assertLessEqual(controller.level, 2)
+        self.assertEqual(controller.in_flight, 0)
+        self.assertFalse(any(record.retry_statuses
+                             for record in self.records))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import unittest
+
+from tc_object_storage.download import DownloadError, ParallelDownloader, \
+    download_object
+from tc_object_storage.pipeline import create_container, put_object
+from tc_object_storage.segments import SegmentedUploader
+
+from tests.support import SwiftTestCase
+
+
+class DownloadTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.data = os.urandom(200000)
+        put_object(self.client, 'c1', 'obj', self.data)
+        self.filename = os.path.join(self.scratch, 'obj')
+
+    def read(self):
+        fp = open(self.filename, 'rb')
+        try:
+            return fp.read()
+        finally:
+            fp.close()
+
+    def test_download(self):
+        result = download_object(self.client, 'c1', 'obj', self.filename,
+                                 chunk_size=4096)
+
+        self.assertEqual(result.size, len(self.data))
+        self.assertEqual(self.read(), self.data)
+
+    def test_resume_dropped_connection(self):
+        self.server.cut_bodies = 2
+
+        result = download_object(self.client, 'c1', 'obj', self.filename)
+
+        self.assertEqual(result.size, len(self.data))
+        self.assertEqual(self.read(), self.data)
+        self.assertEqual(self.server.requests['GET'], 3)
+
+    def test_resume_partial_file(self):
+        self.write_file('obj', self.data[:70000])
+
+        result = download_object(self.client, 'c1', 'obj', self.filename,
+                                 resume=True)
+
+        self.assertEqual(result.size, len(self.data) - 70000)
+        self.assertEqual(self.read(), self.data)
+
+    def test_resume_complete_file(self):
+        self.write_file('obj', self.data)
+
+        result = download_object(self.client, 'c1', 'obj', self.filename,
+                                 resume=True)
+
+        self.assertEqual(result.size, 0)
+        self.assertEqual(self.read(), self.data)
+
+    def test_resume_corrupt_partial_file(self):
+        self.write_file('obj', 'x' * 70000)
+
+        self.assertRaises(DownloadError, download_object, self.client, 'c1',
+                          'obj', self.filename, resume=True)
+
+    def test_etag_mismatch(self):
+        self.server.containers['c1']['obj'].etag = 'd41d8cd98f00b204' \
+            'e9800998ecf8427e'
+
+        self.assertRaises(DownloadError, download_object, self.client, 'c1',
+                          'obj', self.filename)
+        download_object(self.client, 'c1', 'obj', self.filename,
+                        verify=False)
+        self.assertEqual(self.read(), self.data)
+
+
+class FailingDownloader(ParallelDownloader):
+    """Fails the parts at the offsets in `failing`, records the others"""
+
+    def __init__(self, *args, **kwargs):
+        self.failing = kwargs.pop('failing', ())
+        ParallelDownloader.__init__(self, *args, **kwargs)
+        self.fetched = []
+
+    def fetch(self, container, object_name, filename, part, *args):
+        if part.offset in self.failing:
+            raise IOError("connection lost")
+        self.fetched.append(part.offset)
+        return ParallelDownloader.fetch(self, container, object_name,
+                                        filename, part, *args)
+
+
+class ParallelDownloadTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.data = os.urandom(10500)
+        self.filename = os.path.join(self.scratch, 'out')
+        self.journal_dir = os.path.join(self.scratch, 'journals')
+
+    def read(self):
+        fp = open(self.filename, 'rb')
+        try:
+            return fp.read()
+        finally:
+            fp.close()
+
+    def downloader(self, failing=()):
+        return FailingDownloader(self.client, workers=4, range_size=1000,
+                                 journal_dir=self.journal_dir,
+                                 failing=failing)
+
+    def test_ranges(self):
+        put_object(self.client, 'c1', 'obj', self.data)
+        before = self.server.requests.get('GET', 0)
+
+        result = self.downloader().download('c1', 'obj', self.filename)
+
+        self.assertEqual(result.size, len(self.data))
+        self.assertEqual(self.read(), self.data)
+        self.assertEqual(self.server.requests['GET'] - before, 11)
+
+    def test_manifest_segments(self):
+        source = self.write_file('big.bin', self.data)
+        for manifest in ('dlo', 'slo'):
+            SegmentedUploader(self.client, segment_size=3000,
+                              manifest=manifest).upload('c1', manifest,
+                                                        source)
+
+            downloader = self.downloader()
+            result = downloader.download('c1', manifest, self.filename)
+
+            self.assertEqual(result.size, len(self.data))
+            self.assertEqual(sorted(downloader.fetched),
+                             [0, 3000, 6000, 9000])
+            self.assertEqual(self.read(), self.data)
+
+    def test_corrupt_range(self):
+        put_object(self.client, 'c1', 'obj', self.data)
+        self.server.containers['c1']['obj'].etag = '0' * 32
+
+        self.assertRaises(DownloadError, self.downloader().download, 'c1',
+                          'obj', self.filename)
+
+    def test_resume_failed_parts(self):
+        put_object(self.client, 'c1', 'obj', self.data)
+
+        first = self.downloader(failing=(2000, 9000))
+        self.assertRaises(DownloadError, first.download, 'c1', 'obj',
+                          self.filename)
+
+        second = self.downloader()
+        second.download('c1', 'obj', self.filename)
+
+        self.assertEqual(sorted(second.fetched), [2000, 9000])
+        self.assertEqual(self.read(), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import unittest
+
+from tc_object_storage.index import ListingIndex
+from tc_object_storage.pipeline import create_container, delete_object, \
+    put_object
+
+from tests.support import SwiftTestCase
+
+
+class ListingIndexTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        for name in ('a/1.txt', 'a/2.jpg', 'b/3.txt', 'caf\xc3\xa9.txt'):
+            put_object(self.client, 'c1', name, name)
+        self.index = ListingIndex(self.client,
+                                  os.path.join(self.scratch, 'index.sqlite'))
+
+    def tearDown(self):
+        self.index.close()
+        SwiftTestCase.tearDown(self)
+
+    def names(self, entries):
+        return [entry['name'] for entry in entries]
+
+    def listing_requests(self):
+        return self.server.requests.get('GET', 0)
+
+    def test_refresh_modes(self):
+        self.assertEqual(self.index.refresh('c1'), 'full')
+
+        before = self.listing_requests()
+        self.assertEqual(self.index.refresh('c1'), 'fresh')
+        self.assertEqual(self.listing_requests(), before)
+
+        put_object(self.client, 'c1', 'd/4.txt', 'new')
+        self.assertEqual(self.index.refresh('c1'), 'append')
+        self.assertEqual(self.listing_requests() - before, 1)
+
+        """ Not after the last name: the append listing misses it """
+        put_object(self.client, 'c1', 'a/0.txt', 'new')
+        self.assertEqual(self.index.refresh('c1'), 'full')
+
+        delete_object(self.client, 'c1', 'b/3.txt')
+        self.assertEqual(self.index.refresh('c1'), 'full')
+        self.assertEqual(self.names(self.index.iter_objects('c1')),
+                         sorted(self.stored('c1')))
+
+        self.assertEqual(self.index.refresh('c1', full=True), 'full')
+
+    def test_queries(self):
+        self.index.refresh('c1')
+
+        self.assertEqual(self.names(self.index.iter_objects('c1', 'a/')),
+                         ['a/1.txt', 'a/2.jpg'])
+        self.assertEqual(self.names(self.index.search('c1', '*.txt')),
+                         ['a/1.txt', 'b/3.txt', 'caf\xc3\xa9.txt'])
+        self.assertEqual(self.names(self.index.search('c1', 'caf\xc3\xa9*')),
+                         ['caf\xc3\xa9.txt'])
+        self.assertEqual(self.index.usage('c1', 'a/'), (2, 14))
+        self.assertEqual(self.index.usage('c1'), (4, 30))
+
+    def test_recorded_changes_settle(self):
+        self.index.refresh('c1')
+
+        put_object(self.client, 'c1', 'e/5.txt', '12345')
+        self.index.record_upload('c1', 'e/5.txt', 5, None)
+        self.assertTrue(self.index.settle('c1'))
+
+        before = self.listing_requests()
+        self.assertEqual(self.index.refresh('c1'), 'fresh')
+        self.assertEqual(self.listing_requests(), before)
+        self.assertEqual(self.index.usage('c1', 'e/'), (1, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import unittest
+
+from tc_object_storage.journal import Journal, list_journals
+from tc_object_storage.pipeline import create_container
+from tc_object_storage.segments import SegmentedUploader, SegmentError
+
+from tests.support import SwiftTestCase
+
+
+class InterruptedUploader(SegmentedUploader):
+    """Fails the segments in `failing`, records the ones it sends"""
+
+    def __init__(self, *args, **kwargs):
+        self.failing = kwargs.pop('failing', ())
+        SegmentedUploader.__init__(self, *args, **kwargs)
+        self.sent = []
+
+    def upload_segment(self, container, filename, segment, *args):
+        if segment.index in self.failing:
+            raise IOError("connection lost")
+        self.sent.append(segment.index)
+        return SegmentedUploader.upload_segment(self, container, filename,
+                                                segment, *args)
+
+
+class JournalResumeTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.journal_dir = os.path.join(self.scratch, 'journals')
+        self.data = os.urandom(10500)
+        self.filename = self.write_file('big.bin', self.data)
+
+    def uploader(self, failing=()):
+        return InterruptedUploader(self.client, segment_size=1000,
+                                   workers=4, manifest='slo',
+                                   journal_dir=self.journal_dir,
+                                   failing=failing)
+
+    def download(self):
+        response = self.client.session.get(
+            self.server.url + '/v1/AUTH_%s/c1/big.bin' %
+            self.server.tenant_id, headers=self.client.headers)
+        response.raise_for_status()
+        return response.content
+
+    def test_resume_sends_only_missing_segments(self):
+        first = self.uploader(failing=(3, 7, 10))
+        self.assertRaises(SegmentError, first.upload, 'c1', 'big.bin',
+                          self.filename)
+        self.assertEqual(sorted(first.sent), [0, 1, 2, 4, 5, 6, 8, 9])
+        self.assertNotIn('big.bin', self.stored('c1'))
+        self.assertEqual(len(list_journals(self.journal_dir)), 1)
+
+        second = self.uploader()
+        result = second.upload('c1', 'big.bin', self.filename)
+
+        self.assertEqual(sorted(second.sent), [3, 7, 10])
+        self.assertEqual(len(result.segments), 11)
+        self.assertEqual(self.download(), self.data)
+        self.assertEqual(list_journals(self.journal_dir), [])
+
+    def test_segment_lost_since_is_sent_again(self):
+        self.assertRaises(SegmentError, self.uploader(failing=(0,)).upload,
+                          'c1', 'big.bin', self.filename)
+        segments = self.server.containers['c1_segments']
+        lost = sorted(segments)[4]
+        del segments[lost]
+
+        second = self.uploader()
+        second.upload('c1', 'big.bin', self.filename)
+
+        self.assertEqual(sorted(second.sent), [0, 5])
+        self.assertEqual(self.download(), self.data)
+
+    def test_changed_file_starts_over(self):
+        self.assertRaises(SegmentError, self.uploader(failing=(0,)).upload,
+                          'c1', 'big.bin', self.filename)
+
+        self.data = os.urandom(10500)
+        self.write_file('big.bin', self.data)
+        os.utime(self.filename, (1, 1))
+
+        second = self.uploader()
+        second.upload('c1', 'big.bin', self.filename)
+
+        self.assertEqual(sorted(second.sent), range(11))
+        self.assertEqual(self.download(), self.data)
+
+    def test_torn_line_is_ignored(self):
+        journal = Journal.open(self.journal_dir, 'upload', 'a', 'b', {})
+        journal.record(0, 'etag0')
+        journal.fp.write('{"part": 1, "et')
+        journal.close()
+
+        journal = Journal.open(self.journal_dir, 'upload', 'a', 'b', {})
+        self.assertEqual(journal.completed, {0: 'etag0'})
+        journal.finish()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import requests
+
+from tc_object_storage.listing import iter_listing, iter_listing_pages
+from tc_object_storage.pipeline import create_container, put_object
+
+from tests.support import SwiftTestCase
+
+
+class ListingTest(SwiftTestCase):
+    max_page_size = 100
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.names = sorted('dir%d/obj%02d' % (number % 3, number)
+                            for number in range(25))
+        for name in self.names:
+            put_object(self.client, 'c1', name, 'x' * len(name))
+
+    def listing_requests(self):
+        return self.server.requests.get('GET', 0)
+
+    def test_pages_follow_the_marker(self):
+        pages = list(iter_listing_pages(self.client, 'c1', page_size=10))
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.names)
+
+    def test_short_page_ends_the_listing(self):
+        before = self.listing_requests()
+        names = list(iter_listing(self.client, 'c1', page_size=10))
+
+        self.assertEqual(names, self.names)
+        self.assertEqual(self.listing_requests() - before, 3)
+
+        before = self.listing_requests()
+        list(iter_listing(self.client, 'c1', page_size=100))
+        self.assertEqual(self.listing_requests() - before, 1)
+
+    def test_full_pages_need_one_empty_page(self):
+        before = self.listing_requests()
+        names = list(iter_listing(self.client, 'c1', prefix='dir1/',
+                                  page_size=4))
+
+        self.assertEqual(names, [name for name in self.names
+                                 if name.startswith('dir1/')])
+        self.assertEqual(len(names), 8)
+        self.assertEqual(self.listing_requests() - before, 3)
+
+    def test_full_listing_with_delimiter(self):
+        entries = list(iter_listing(self.client, 'c1', delimiter='/',
+                                    page_size=2, full=True))
+        self.assertEqual(entries, [{'subdir': 'dir0/'}, {'subdir': 'dir1/'},
+                                   {'subdir': 'dir2/'}])
+
+        entries = list(iter_listing(self.client, 'c1', prefix='dir2/',
+                                    page_size=3, full=True))
+        self.assertEqual([entry['name'] for entry in entries],
+                         [name for name in self.names
+                          if name.startswith('dir2/')])
+        self.assertEqual(set(entry['bytes'] for entry in entries), set([10]))
+
+    def test_limit_above_the_cluster_limit_is_refused(self):
+        with self.assertRaises(requests.HTTPError) as caught:
+            list(iter_listing(self.client, 'c1', page_size=1000))
+        self.assertEqual(caught.exception.response.status_code, 412)
+
+    def test_account_listing(self):
+        create_container(self.client, 'c2')
+        entries = list(iter_listing(self.client, page_size=1, full=True))
+        self.assertEqual([(entry['name'], entry['count'])
+                          for entry in entries], [('c1', 25), ('c2', 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
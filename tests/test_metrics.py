@@ -0,0 +1,163 @@
+import ConfigParser
+import json
+import os
+import unittest
+
+import requests
+
+from tc_object_storage.download import download_object
+from tc_object_storage.metrics import Histogram, Instrumentation, classify
+from tc_object_storage.pipeline import copy_object, create_container, \
+    delete_object, get_object, head_object, put_object
+
+from tests.support import SwiftTestCase
+
+
+def prepared(method, path, headers=None):
+    return requests.Request(method, 'http://swift/v1/AUTH_t' + path,
+                            headers=headers).prepare()
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def test_operations(self):
+        for request, operation in (
+                (prepared('GET', ''), 'account_get'),
+                (prepared('HEAD', '/c'), 'container_head'),
+                (prepared('PUT', '/c/'), 'container_put'),
+                (prepared('GET', '/c/o/p'), 'object_get'),
+                (prepared('GET', '/c/o', {'Range': 'bytes=0-9'}),
+                 'object_get_range'),
+                (prepared('PUT', '/c/o', {'X-Copy-From': '/c/p'}),
+                 'object_copy'),
+                (prepared('PUT', '/c/o?multipart-manifest=put'),
+                 'manifest_put'),
+                (prepared('PUT', '/c/o', {'X-Object-Manifest': 'c/o/'}),
+                 'manifest_put'),
+                (prepared('POST', '?bulk-delete'), 'bulk_delete'),
+                (requests.Request('POST', 'http://keystone/identity/v2.0/'
+                                  'tokens').prepare(), 'auth'),
+                (requests.Request('GET', 'http://swift/info').prepare(),
+                 'info')):
+            self.assertEqual(classify(request), operation, request.url)
+
+    def test_histogram(self):
+        histogram = Histogram((0.1, 1.0, float('inf')))
+        for value in (0.05, 0.05, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.cumulative()),
+                         [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.75), 1.0)
+        self.assertEqual(histogram.quantile(1.0), 2.0)
+        self.assertEqual((histogram.count, histogram.max), (4, 2.0))
+
+
+class InstrumentationTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        self.paths = dict((key, os.path.join(self.scratch, name))
+                          for key, name in (('json', 'metrics.json'),
+                                            ('prometheus', 'metrics.prom'),
+                                            ('trace', 'trace.jsonl')))
+        self.instrumentation = Instrumentation(
+            json_path=self.paths['json'],
+            prometheus_path=self.paths['prometheus'],
+            trace_path=self.paths['trace'])
+        self.instrumentation.attach(self.client.session)
+
+    def read(self, key):
+        fp = open(self.paths[key])
+        try:
+            return fp.read()
+        finally:
+            fp.close()
+
+    def requests_made(self):
+        create_container(self.client, 'c1')
+        put_object(self.client, 'c1', 'obj', 'x' * 1000)
+        self.assertEqual(get_object(self.client, 'c1', 'obj'), 'x' * 1000)
+        head_object(self.client, 'c1', 'obj')
+        copy_object(self.client, 'c1', 'obj', 'c1', 'copy')
+        download_object(self.client, 'c1', 'obj',
+                        os.path.join(self.scratch, 'obj'))
+        self.assertRaises(requests.HTTPError, delete_object, self.client,
+                          'c1', 'missing')
+
+    def test_json_summary(self):
+        self.requests_made()
+        self.instrumentation.export(self.client.session)
+
+        summary = json.loads(self.read('json'))
+        operations = summary['operations']
+        self.assertEqual(sorted(operations),
+                         ['container_put', 'object_copy', 'object_delete',
+                          'object_get', 'object_head', 'object_put'])
+        self.assertEqual(operations['object_put']['bytes_sent'], 1000)
+        self.assertEqual(operations['object_get']['requests'], 2)
+        self.assertEqual(operations['object_get']['bytes_received'], 2000)
+        self.assertEqual(operations['object_head']['bytes_received'], 0)
+        self.assertEqual(operations['object_delete']['statuses'],
+                         {'404': 1})
+        self.assertEqual(operations['object_delete']['errors'], 1)
+        self.assertEqual([error['status'] for error in
+                          summary['recent_errors']], [404])
+        """ The pool also served the login, before attach() """
+        self.assertEqual(summary['connections']['requests'], 8)
+
+    def test_prometheus(self):
+        self.requests_made()
+        self.instrumentation.export(self.client.session)
+
+        lines = self.read('prometheus').splitlines()
+        self.assertIn('tc_object_storage_request_duration_seconds_bucket'
+                      '{operation="object_get",le="+Inf"} 2', lines)
+        self.assertIn('tc_object_storage_request_duration_seconds_count'
+                      '{operation="object_get"} 2', lines)
+        self.assertIn('tc_object_storage_responses_total'
+                      '{operation="object_delete",status="404"} 1', lines)
+        self.assertIn('tc_object_storage_bytes_sent_total'
+                      '{operation="object_put"} 1000', lines)
+        self.assertIn('# TYPE tc_object_storage_errors_total counter', lines)
+        self.assertIn('tc_object_storage_connections_opened_total 1', lines)
+
+    def test_trace(self):
+        self.requests_made()
+        self.instrumentation.export()
+
+        records = [json.loads(line) for line in
+                   self.read('trace').splitlines()]
+        self.assertEqual(len(records), 7)
+        self.assertEqual([record['status'] for record in records
+                          if record['operation'] == 'object_delete'], [404])
+        self.assertEqual(records[0]['operation'], 'container_put')
+        self.assertIsNone(self.instrumentation.trace.fp)
+
+    def test_disabled(self):
+        instrumentation = Instrumentation()
+        instrumentation.attach(self.client.session)
+        create_container(self.client, 'c2')
+        instrumentation.export()
+
+        self.assertFalse(instrumentation.enabled)
+        self.assertEqual(instrumentation.metrics.operations, {})
+
+    def test_from_config(self):
+        conf = ConfigParser.RawConfigParser()
+        conf.add_section('metrics')
+        conf.set('metrics', 'json', 'from-config.json')
+        conf.set('metrics', 'prometheus', 'from-config.prom')
+
+        instrumentation = Instrumentation.from_config(
+            conf, json_path='given.json')
+        self.assertEqual((instrumentation.json_path,
+                          instrumentation.prometheus_path,
+                          instrumentation.trace_path),
+                         ('given.json', 'from-config.prom', None))
+        self.assertTrue(instrumentation.enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from tc_object_storage.pipeline import PipelinedClient, create_container, \
+    put_object
+
+from tests.support import SwiftTestCase
+
+
+class PipelinedClientTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        for number in range(20):
+            put_object(self.client, 'c1', 'obj%02d' % number, 'x' * number)
+
+    def test_head_all_starts_no_pool(self):
+        with PipelinedClient(self.client, 64) as pipeline:
+            sizes = dict((name, int(headers['Content-Length']))
+                         for (_, name), headers, _ in
+                         pipeline.head_all('c1'))
+            self.assertIsNone(pipeline._pool)
+
+        self.assertEqual(sizes, dict(('obj%02d' % number, number)
+                                     for number in range(20)))
+
+    def test_submit_and_close(self):
+        with PipelinedClient(self.client, 4) as pipeline:
+            futures = [pipeline.get('c1', 'obj%02d' % number)
+                       for number in range(20)]
+            self.assertEqual([future.result() for future in futures],
+                             ['x' * number for number in range(20)])
+            pool = pipeline.pool
+
+        for thread in pool.threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import unittest
+
+from tc_object_storage.pipeline import create_container, put_object
+from tc_object_storage.segments import SegmentedUploader
+from tc_object_storage.server_copy import ServerSideCopier
+
+from tests.support import SwiftTestCase
+
+
+class ServerSideCopyTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.data = os.urandom(5500)
+        self.filename = self.write_file('big.bin', self.data)
+        put_object(self.client, 'c1', 'dir/small', 'small')
+
+    def upload(self, manifest, segment_container='c1', name='dir/big.bin'):
+        """name, its segments under name + '/' of segment_container"""
+        SegmentedUploader(self.client, segment_size=1000, manifest=manifest,
+                          segment_container=segment_container).upload(
+            'c1', name, self.filename)
+
+    def heads(self):
+        return self.server.requests.get('HEAD', 0)
+
+    def download(self, container, name):
+        response = self.client.session.get(
+            self.server.url + '/v1/AUTH_%s/%s/%s' % (
+                self.server.tenant_id, container, name),
+            headers=self.client.headers)
+        response.raise_for_status()
+        return response.content
+
+    def test_copy_manifest_with_its_segments(self):
+        for manifest in ('dlo', 'slo'):
+            self.upload(manifest)
+            summary = ServerSideCopier(self.client).copy_prefix(
+                'c1', 'dir/', 'c2', 'copy/')
+
+            self.assertEqual(summary.failures, [])
+            self.assertEqual(summary.copied, len(self.stored('c1')))
+            self.assertEqual(self.download('c2', 'copy/big.bin'), self.data)
+            self.assertEqual(self.download('c1', 'dir/big.bin'), self.data)
+
+    def test_move_manifest_with_its_segments_is_refused(self):
+        for manifest in ('dlo', 'slo'):
+            self.upload(manifest)
+            before = self.stored('c1')
+
+            copier = ServerSideCopier(self.client)
+            self.assertRaises(ValueError, copier.copy_prefix, 'c1', 'dir/',
+                              'c2', '', move=True)
+            self.assertRaises(ValueError, copier.copy_container, 'c1', 'c2',
+                              move=True)
+
+            self.assertEqual(self.stored('c1'), before)
+            self.assertNotIn('c2', self.server.containers)
+            self.assertEqual(self.download('c1', 'dir/big.bin'), self.data)
+
+    def test_move_flattened(self):
+        for manifest in ('dlo', 'slo'):
+            self.upload(manifest)
+            count = len(self.stored('c1'))
+
+            summary = ServerSideCopier(self.client, flatten=True).copy_prefix(
+                'c1', 'dir/', 'c2', '', move=True)
+
+            self.assertEqual(summary.failures, [])
+            self.assertEqual(summary.copied, count)
+            self.assertEqual(self.stored('c1'), {})
+            self.assertEqual(self.stored('c2')['big.bin'], self.data)
+            self.assertEqual(self.stored('c2')['small'], 'small')
+            put_object(self.client, 'c1', 'dir/small', 'small')
+
+    def test_move_manifest_without_its_segments(self):
+        for manifest in ('dlo', 'slo'):
+            self.upload(manifest, segment_container='segs')
+
+            before = self.heads()
+            summary = ServerSideCopier(self.client).copy_prefix(
+                'c1', 'dir/', 'c2', '', move=True)
+
+            """ dir/small is not empty, nor listed as an SLO """
+            self.assertEqual(self.heads() - before, 1)
+            self.assertEqual(summary.copied, 2)
+            self.assertEqual(self.stored('c1'), {})
+            self.assertEqual(self.download('c2', 'big.bin'), self.data)
+            put_object(self.client, 'c1', 'dir/small', 'small')
+
+    def test_move_non_ascii_names(self):
+        name = 'dir/caf\xc3\xa9 \xe2\x82\xac.bin'
+        for manifest in ('dlo', 'slo'):
+            self.upload(manifest, name=name)
+            copier = ServerSideCopier(self.client)
+            self.assertRaises(ValueError, copier.copy_prefix, 'c1', 'dir/',
+                              'c2', '', move=True)
+
+            self.upload(manifest, segment_container='segs', name=name)
+            for segment in list(self.stored('c1')):
+                if segment.startswith(name + '/'):
+                    del self.server.containers['c1'][segment]
+
+            summary = copier.copy_prefix('c1', 'dir/', 'c2', '', move=True)
+
+            self.assertEqual(summary.failures, [])
+            self.assertEqual(self.stored('c1'), {})
+            self.assertEqual(self.download('c2', name[len('dir/'):]),
+                             self.data)
+            put_object(self.client, 'c1', 'dir/small', 'small')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from tc_object_storage.pipeline import create_container
+from tc_object_storage.sync import DirectorySync, parse_last_modified
+
+from tests.support import SwiftTestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ParseLastModifiedTest(unittest.TestCase):
+    def test_listing_timestamp(self):
+        self.assertEqual(parse_last_modified('2016-01-01T00:00:01.123456'),
+                         1451606401)
+
+    def test_threads_of_a_fresh_interpreter(self):
+        """ Nothing may have parsed a date in the process beforehand """
+        script = '\n'.join([
+            'import sys, threading',
+            'from tc_object_storage.sync import parse_last_modified',
+            'errors = []',
+            'def parse():',
+            '    try:',
+            '        parse_last_modified("2016-01-01T00:00:00.000000")',
+            '    except Exception as e:',
+            '        errors.append(e)',
+            'threads = [threading.Thread(target=parse) for _ in range(16)]',
+            'for thread in threads: thread.start()',
+            'for thread in threads: thread.join()',
+            'sys.exit(1 if errors else 0)'])
+        for _ in range(5):
+            self.assertEqual(subprocess.call([sys.executable, '-c', script],
+                                             cwd=ROOT), 0)
+
+
+class DirectorySyncTest(SwiftTestCase):
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.files = dict(('dir/f%02d' % number, 'data %02d' % number)
+                          for number in range(20))
+        for name, data in self.files.items():
+            self.write_file(os.path.join('src', name), data)
+        self.source = os.path.join(self.scratch, 'src')
+
+    def sync(self, **options):
+        return DirectorySync(self.client, workers=8, **options) \
+            .sync(self.source, 'c1', 'mirror')
+
+    def test_uploads_then_skips_unchanged(self):
+        summary = self.sync()
+        self.assertEqual((summary.uploaded, summary.failures), (20, []))
+        self.assertEqual(self.stored('c1'), dict(
+            ('mirror/' + name, data) for name, data in self.files.items()))
+
+        summary = self.sync()
+        self.assertEqual((summary.uploaded, summary.unchanged,
+                          summary.failures), (0, 20, []))
+
+    def test_changed_mtime_is_compared_by_content(self):
+        self.sync()
+
+        """ Newer than the objects: same size, so the MD5 decides """
+        later = time.time() + 3600
+        for name in self.files:
+            os.utime(os.path.join(self.source, name), (later, later))
+        self.write_file('src/dir/f03', 'DATA 03')
+
+        summary = self.sync()
+        self.assertEqual((summary.uploaded, summary.unchanged,
+                          summary.failures), (1, 19, []))
+        self.assertEqual(self.stored('c1')['mirror/dir/f03'], 'DATA 03')
+
+    def test_delete_orphans(self):
+        self.sync()
+        os.remove(os.path.join(self.source, 'dir/f00'))
+
+        summary = self.sync(delete=True)
+        self.assertEqual(summary.deleted, 1)
+        self.assertNotIn('mirror/dir/f00', self.stored('c1'))
+
+    def test_large_files_use_the_segment_container(self):
+        self.write_file('src/large', 'x' * 2500)
+
+        summary = self.sync(segment_size=1000, segment_container='segs')
+        self.assertEqual(summary.failures, [])
+        self.assertEqual(len(self.stored('segs')), 3)
+        self.assertNotIn('c1_segments', self.server.containers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+
+from tc_object_storage.pipeline import create_container
+from tc_object_storage.transfers import TransferQueue
+from tc_object_storage.upload import upload_file
+
+from tests.support import SwiftTestCase
+
+
+class TransferQueueTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        self.server.latency = 0.05
+        self.files = dict(('file%d' % number, os.urandom(50000))
+                          for number in range(8))
+        for name, data in self.files.items():
+            self.write_file(name, data)
+
+    def transfer(self, container, object_name, filename, progress=None):
+        return upload_file(self.client, container, object_name, filename,
+                           progress=progress)
+
+    def test_close_finishes_queued_transfers(self):
+        sent = []
+
+        def transfer(*args, **kwargs):
+            progress = kwargs['progress']
+            kwargs['progress'] = lambda size: (sent.append(size),
+                                               progress(size))
+            return self.transfer(*args, **kwargs)
+
+        queue = TransferQueue(transfer, workers=2)
+        for name in sorted(self.files):
+            queue.enqueue('c1', name, os.path.join(self.scratch, name))
+        queue.close()
+        queue.join()
+
+        status = queue.status()
+        self.assertTrue(status.idle)
+        self.assertEqual((status.done, status.failures), (8, []))
+        self.assertEqual(status.bytes, 8 * 50000)
+        self.assertEqual(sum(sent), 8 * 50000)
+        self.assertEqual(self.stored('c1'), self.files)
+        self.assertFalse(any(thread.is_alive() for thread in queue.threads))
+
+    def test_failures_are_kept(self):
+        queue = TransferQueue(self.transfer, workers=2)
+        queue.enqueue('c1', 'missing', os.path.join(self.scratch, 'nothing'))
+        queue.enqueue('c1', 'file0', os.path.join(self.scratch, 'file0'))
+        queue.close()
+        queue.join()
+
+        status = queue.status()
+        self.assertEqual(status.done, 1)
+        self.assertEqual([args[1] for args, _ in status.failures],
+                         ['missing'])
+        self.assertIn('1 failed', str(status))
+
+
+if __name__ == '__main__':
+    unittest.main()
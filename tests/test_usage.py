@@ -0,0 +1,79 @@
+import os
+import unittest
+
+from tc_object_storage.listing import iter_listing
+from tc_object_storage.listing_cache import ListingCache
+from tc_object_storage.pipeline import create_container, put_object
+from tc_object_storage.segments import SegmentedUploader
+from tc_object_storage.usage import container_usage, manifest_sizes, \
+    subfolder_usage
+
+from tests.support import SwiftTestCase
+
+
+class UsageTest(SwiftTestCase):
+
+    def setUp(self):
+        SwiftTestCase.setUp(self)
+        create_container(self.client, 'c1')
+        for name in ('a/x/1', 'a/x/2', 'a/y/3', 'b/4', 'top'):
+            put_object(self.client, 'c1', name, 'x' * 10)
+        filename = self.write_file('big.bin', os.urandom(2500))
+        SegmentedUploader(self.client, segment_size=1000,
+                          segment_container='segs').upload(
+            'c1', 'a/big.bin', filename)
+
+    def usage(self, entries=None, prefix=''):
+        if entries is None:
+            return dict((folder.path, (folder.objects, folder.bytes))
+                        for folder in container_usage(self.client, 'c1',
+                                                      prefix))
+        return dict((name, (folder.objects, folder.bytes)) for name, folder
+                    in subfolder_usage(self.client, 'c1', prefix,
+                                       entries=entries).items())
+
+    def test_listed_sizes(self):
+        self.assertEqual(self.usage(), {'a/x/': (2, 20), 'a/y/': (1, 10),
+                                        'a/': (4, 30), 'b/': (1, 10),
+                                        '': (6, 50)})
+
+    def test_manifest_sizes(self):
+        entries = manifest_sizes(self.client, 'c1', iter_listing(
+            self.client, 'c1', full=True))
+
+        self.assertEqual(self.usage(entries), {'a/': (4, 2530),
+                                               'b/': (1, 10)})
+
+    def test_cached_full_listing(self):
+        cache = ListingCache(cache_dir=os.path.join(self.scratch, 'cache'))
+        fetch = lambda: iter([list(iter_listing(self.client, 'c1',
+                                                full=True))])
+        entries = [entry for page in cache.pages('c1', None, None, fetch,
+                                                 full=True)
+                   for entry in page]
+
+        self.assertIsNone(cache.get('c1'))
+        cached = ListingCache(cache_dir=cache.cache_dir).get('c1', full=True)
+        self.assertEqual(cached, entries)
+        self.assertTrue(all(isinstance(entry['name'], str)
+                            for entry in cached))
+        self.assertEqual(self.usage(cached, 'a/'), {'x/': (2, 20),
+                                                    'y/': (1, 10)})
+
+        cache.invalidate('c1', 'a/x/3')
+        self.assertIsNone(cache.get('c1', full=True))
+
+    def test_listing_too_large_to_cache(self):
+        cache = ListingCache(max_entries=3)
+        fetch = lambda: iter([['1', '2'], ['3', '4'], ['5']])
+
+        self.assertEqual(list(cache.pages('c1', None, None, fetch)),
+                         [['1', '2'], ['3', '4'], ['5']])
+        self.assertIsNone(cache.get('c1'))
+
+        list(cache.pages('c1', 'a/', None, lambda: iter([['a/1', 'a/2']])))
+        self.assertEqual(cache.get('c1', 'a/'), ['a/1', 'a/2'])
+
+
+if __name__ == '__main__':
+    unittest.main()